@@ -0,0 +1,156 @@
+"""
+Бенчмарки розбору, форматування та порівняння графіків
+
+Запускається офлайн на синтетичних відповідях API (payload_generator),
+міряє час і пам'ять кожної функції та порівнює з збереженими базовими
+результатами, щоб регресії продуктивності було видно одразу.
+
+Приклади:
+    python benchmark.py                   # всі регіони, 12 груп, 2 дні
+    python benchmark.py --days 4 --save   # зберегти результати як базові
+    python benchmark.py --threshold 0.3   # регресія - повільніше на 30%+
+"""
+
+import argparse
+import copy
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+from payload_generator import generate_payload, mutate_payload
+from schedule_model import Schedule
+from schedule_diff import diff_schedules
+from stream_parse import parse_filtered
+
+BASELINE_FILE = 'benchmark_baseline.json'
+
+
+def measure(func, repeat, number):
+    """Повертає (медіана, мінімум) часу одного виклику та пік пам'яті (байти)"""
+    func()  # прогрів
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        timings.append((time.perf_counter() - start) / number)
+
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return statistics.median(timings), min(timings), peak
+
+
+def build_cases(payload, region, queues):
+    """Повертає список (назва, функція, кількість викликів на замір)"""
+    # telegram_bot імпортуємо тут: він тягне python-telegram-bot
+    from telegram_bot import format_schedule_for_telegram, get_today_schedule_data, get_upcoming_outages
+
+    raw = json.dumps(payload, ensure_ascii=False, indent=2)
+    schedule = Schedule.from_data(payload)
+
+    changed_payload = copy.deepcopy(payload)
+    mutate_payload(changed_payload, random.Random(1), changes=len(queues))
+    changed = Schedule.from_data(changed_payload)
+    dates = list(schedule.queue(region, queues[0]))
+
+    def format_all(data):
+        return lambda: [format_schedule_for_telegram(data, queue, region=region) for queue in queues]
+
+    return [
+        ('json.loads (відповідь API)', lambda: json.loads(raw), 5),
+        ('json.dumps indent=2 (запис у файл)', lambda: json.dumps(payload, ensure_ascii=False, indent=2), 5),
+        ('parse_filtered (одна група)', lambda: parse_filtered(raw, {region: {queues[0]}}), 5),
+        ('Schedule.from_data', lambda: Schedule.from_data(payload), 5),
+        ('format_schedule_for_telegram (модель)', format_all(schedule), 20),
+        ('format_schedule_for_telegram (сирі дані)', format_all(payload), 5),
+        ('get_today_schedule_data', lambda: [get_today_schedule_data(schedule, q, region=region) for q in queues], 200),
+        ('get_upcoming_outages', lambda: [get_upcoming_outages(schedule, q, 15, region=region) for q in queues], 200),
+        ('diff_schedules', lambda: [
+            diff_schedules(schedule.queue(region, q), changed.queue(region, q), dates) for q in queues
+        ], 200),
+    ]
+
+
+def run(args):
+    payload = generate_payload(regions=args.regions, queues=args.queues, days=args.days, seed=args.seed)
+    region = payload['regions'][0]['cpu']
+    queues = list(payload['regions'][0]['schedule'])
+    size = len(json.dumps(payload, ensure_ascii=False).encode('utf-8'))
+
+    print(f'📦 Відповідь: {len(payload["regions"])} регіонів × {len(queues)} груп × {args.days} дн., '
+          f'{size / 1024:.0f} КБ')
+    print(f'{"Функція":<45}{"медіана":>12}{"мін.":>12}{"пік пам.":>12}')
+    print('─' * 81)
+
+    results = {}
+    for name, func, number in build_cases(payload, region, queues):
+        median, best, peak = measure(func, args.repeat, number)
+        results[name] = {'median': median, 'min': best, 'peak': peak}
+        print(f'{name:<45}{median * 1000:>10.3f}мс{best * 1000:>10.3f}мс{peak / 1024:>10.1f}КБ')
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Порівнює з базовими результатами, повертає кількість регресій"""
+    regressions = 0
+    print(f'\n📊 Порівняння з базовими результатами (поріг {threshold:.0%})')
+
+    for name, result in results.items():
+        base = baseline.get(name)
+        if not base:
+            print(f'  ➕ {name}: немає базового значення')
+            continue
+
+        ratio = result['median'] / base['median'] if base['median'] else 1
+        if ratio > 1 + threshold:
+            regressions += 1
+            print(f'  ❌ {name}: {ratio:.2f}× повільніше')
+        elif ratio < 1 - threshold:
+            print(f'  🚀 {name}: {1 / ratio:.2f}× швидше')
+        else:
+            print(f'  ✓ {name}: {ratio:.2f}×')
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бенчмарки обробки графіків відключень')
+    parser.add_argument('--regions', type=int, default=None, help='кількість регіонів (за замовчуванням - всі)')
+    parser.add_argument('--queues', type=int, default=None, help='кількість груп (за замовчуванням - 12)')
+    parser.add_argument('--days', type=int, default=2, help='кількість днів у графіку')
+    parser.add_argument('--repeat', type=int, default=7, help='кількість замірів кожної функції')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора даних')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='файл базових результатів')
+    parser.add_argument('--save', action='store_true', help='зберегти результати як базові')
+    parser.add_argument('--threshold', type=float, default=0.2, help='допустиме сповільнення (частка)')
+    args = parser.parse_args()
+
+    results = run(args)
+
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f'\n💾 Базові результати збережено у {args.baseline}')
+        return 0
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.threshold):
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Годинник бота, який можна підмінити
+
+Вся логіка часу (попередження, щоденні повідомлення, ліміти відправки,
+TTL знімку) бере час через clock.now() і clock.monotonic(), а не напряму
+з datetime.now() / time.monotonic(). За замовчуванням це системний
+годинник; replay.py підставляє VirtualClock і прокручує добу роботи
+бота за секунди.
+
+Віртуальний час рухає event loop (VirtualTimeLoop): коли всі задачі
+чекають (asyncio.sleep, wait_for, call_later), loop не блокується, а
+одразу переводить годинник на найближчий таймер. Тому asyncio.sleep
+у коді бота підміняти не потрібно. Реальний мережевий ввід-вивід під
+віртуальним часом не підтримується - replay працює з фейковим ботом.
+"""
+
+import asyncio
+import selectors
+import time
+from datetime import datetime, timedelta, timezone
+
+
+class Clock:
+    """Системний годинник"""
+
+    def now(self, tz=None):
+        return datetime.now(tz)
+
+    def monotonic(self):
+        return time.monotonic()
+
+
+class VirtualClock(Clock):
+    """Віртуальний годинник: стоїть, поки його не переведе VirtualTimeLoop
+
+    start - початковий час; naive час (і now() без tz) - місцевий час
+    пояса local_zone (None - пояс системи), щоб результат не залежав
+    від налаштувань машини, на якій запускається replay.
+    """
+
+    def __init__(self, start, local_zone=None):
+        self.local_zone = local_zone
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=local_zone) if local_zone is not None else start.astimezone()
+        self.start = start.astimezone(timezone.utc)
+        self.elapsed = 0.0
+
+    def now(self, tz=None):
+        current = self.start + timedelta(seconds=self.elapsed)
+        if tz is None:
+            return current.astimezone(self.local_zone).replace(tzinfo=None)
+        return current.astimezone(tz)
+
+    def monotonic(self):
+        return self.elapsed
+
+    def advance(self, seconds):
+        if seconds > 0:
+            self.elapsed += seconds
+
+
+class _VirtualSelector:
+    """Селектор, що замість очікування переводить віртуальний годинник"""
+
+    def __init__(self, selector, clock):
+        self._selector = selector
+        self._clock = clock
+
+    def select(self, timeout=None):
+        events = self._selector.select(0)
+        if events:
+            return events
+        if timeout is None:
+            # Таймерів немає - чекаємо на реальну подію (наприклад, з іншого потоку)
+            return self._selector.select(None)
+        self._clock.advance(timeout)
+        return []
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class VirtualTimeLoop(asyncio.SelectorEventLoop):
+    """Event loop, чий час (loop.time()) - це VirtualClock"""
+
+    def __init__(self, clock):
+        super().__init__(selectors.DefaultSelector())
+        self.clock = clock
+        self._selector = _VirtualSelector(self._selector, clock)
+
+    def time(self):
+        return self.clock.monotonic()
+
+
+_clock = Clock()
+
+
+def get_clock():
+    return _clock
+
+
+def set_clock(clock):
+    """Підміняє годинник для всього процесу; повертає попередній"""
+    global _clock
+    previous, _clock = _clock, clock
+    return previous
+
+
+def now(tz=None):
+    """Поточний час (naive місцевий, або в поясі tz)"""
+    return _clock.now(tz)
+
+
+def monotonic():
+    """Монотонний час у секундах (для інтервалів і лімітів)"""
+    return _clock.monotonic()
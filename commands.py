@@ -0,0 +1,369 @@
+"""
+Команди бота та inline-запити
+
+Відповіді будуються з останнього знімку графіку в пам'яті (ScheduleCache.peek)
+без запитів до API, а відформатовані графіки беруться з RenderCache.
+Оновлення отримуються через long polling (get_updates) або передаються
+ззовні в handle_update (webhook.WebhookReceiver).
+
+Команди:
+    /start [група]  - підписатися на групу (за замовчуванням - основну)
+    /stop           - відписатися від усіх груп
+    /group 3.1      - змінити групу
+    /today          - графік на сьогодні
+    /tomorrow       - графік на завтра
+    /next           - найближче відключення
+    /common [групи] - коли світло є в усіх групах чату (або вказаних) одночасно
+    /digest 7:30 21:00 [Europe/Kyiv] - час щоденних повідомлень
+"""
+
+import asyncio
+import logging
+import re
+from datetime import timedelta
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent
+from telegram.error import TelegramError
+from telegram.helpers import escape_markdown
+
+import clock
+from schedule_model import MINUTES_PER_DAY, STATUS_OUTAGE, format_minutes, get_region_name
+from slot_matrix import SLOT_MINUTES, SlotMatrix
+from render_cache import stamp_updated
+from digest_scheduler import parse_clock, format_clock
+from metrics import TELEGRAM_UPDATES
+
+logger = logging.getLogger(__name__)
+
+LONG_POLL_SECONDS = 30
+POLL_ERROR_BACKOFF_SECONDS = 5
+INLINE_CACHE_SECONDS = 60
+QUEUE_PATTERN = re.compile(r'^\d{1,2}\.\d$')
+
+HELP_TEXT = (
+    '🤖 *Команди бота*\n\n'
+    '/today - графік на сьогодні\n'
+    '/tomorrow - графік на завтра\n'
+    '/next - найближче відключення\n'
+    '/common 1.1 3.2 - коли світло є в усіх групах одночасно\n'
+    '/group 3.1 - змінити групу\n'
+    '/digest 7:30 21:00 - час ранкового і вечірнього графіку\n'
+    '/stop - відписатися від повідомлень'
+)
+
+
+def format_duration(minutes):
+    hours, minutes = divmod(int(minutes), 60)
+    if hours and minutes:
+        return f'{hours} год {minutes} хв'
+    if hours:
+        return f'{hours} год'
+    return f'{minutes} хв'
+
+
+def format_next_outage(schedule, region, queue, now=None):
+    """Текст про поточне або найближче відключення групи (сьогодні чи завтра)"""
+    now = now or clock.now()
+    header = f'⏭️ *Найближче відключення*\n📍 {get_region_name(region)}, Група {queue}\n\n'
+    minute = now.hour * 60 + now.minute
+
+    today = schedule.day(region, queue, now.strftime('%Y-%m-%d'))
+    if today is not None:
+        for start, end, status in today.intervals():
+            if status == STATUS_OUTAGE and start <= minute < end:
+                return header + (f'⚠️ Зараз можливе відключення до `{format_minutes(end)}` '
+                                 f'(ще {format_duration(end - minute)})')
+
+    for offset, label in ((0, 'сьогодні'), (1, 'завтра')):
+        day = schedule.day(region, queue, (now + timedelta(days=offset)).strftime('%Y-%m-%d'))
+        if day is None:
+            continue
+        start = day.next_outage_after(minute if offset == 0 else -1)
+        if start is None:
+            continue
+        # Відключення, що продовжується з попереднього дня, не є новим
+        if offset == 1 and start == 0 and today is not None and today.ends_with_outage():
+            start = day.next_outage_after(0)
+            if start is None:
+                continue
+        end = day.interval_end(start)
+        until = start + offset * 24 * 60 - minute
+        return header + (f'🕐 {label} `{format_minutes(start)} - {format_minutes(end)}` '
+                         f'(через {format_duration(until)})')
+
+    return header + '💡 Відключень у відомому графіку немає'
+
+
+def _format_window(start, end, from_minute):
+    """Вікно у хвилинах від початку сьогоднішньої доби -> `HH:MM - HH:MM`"""
+    day = start // MINUTES_PER_DAY
+    start_text = 'зараз' if start <= from_minute else format_minutes(start - day * MINUTES_PER_DAY)
+    end -= day * MINUTES_PER_DAY
+    if end > MINUTES_PER_DAY:
+        return f'`{start_text}` - завтра `{format_minutes(end - MINUTES_PER_DAY)}`'
+    return f'`{start_text} - {format_minutes(end)}`'
+
+
+def format_common_power(matrix, keys, now=None):
+    """Текст про вікна сьогодні і завтра, коли світло є в усіх групах keys одночасно"""
+    now = now or clock.now()
+    dates = [(now + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in (0, 1)]
+    minute = now.hour * 60 + now.minute
+    from_slot = minute // SLOT_MINUTES
+
+    regions = {}
+    for region, queue in keys:
+        regions.setdefault(region, []).append(queue)
+    header = '🤝 *Світло в усіх групах одночасно*\n' + ''.join(
+        f'📍 {get_region_name(region)}, групи {", ".join(queues)}\n' for region, queues in regions.items()
+    ) + '\n'
+
+    lines = []
+    current_day = None
+    for start, end in matrix.windows(keys, dates, from_slot=from_slot):
+        day = start // MINUTES_PER_DAY
+        if day != current_day:
+            current_day = day
+            lines.append('📅 *Сьогодні*' if day == 0 else '📅 *Завтра*')
+        lines.append(f'🟢 {_format_window(start, end, minute)} ({format_duration(end - max(start, minute))})')
+    if not lines:
+        lines.append('🔴 Спільних вікон зі світлом у відомому графіку немає')
+
+    longest = matrix.longest_window(keys, dates, from_slot=from_slot)
+    if longest is not None and len(lines) > 2:
+        start, end = longest
+        lines.append(f'\n⏱️ Найдовше: {"сьогодні" if start < MINUTES_PER_DAY else "завтра"} '
+                     f'{_format_window(start, end, minute)}')
+
+    outage_slots = bin(matrix.union(keys, dates, STATUS_OUTAGE) >> from_slot).count('1')
+    if outage_slots:
+        lines.append(f'🔴 Хоча б одна група без світла: {format_duration(outage_slots * SLOT_MINUTES)}')
+    if any(matrix.schedule.day(region, queue, dates[1]) is None for region, queue in keys):
+        lines.append('❔ Графік на завтра ще не опубліковано')
+    return header + '\n'.join(lines)
+
+
+class BotCommands:
+    """Обробник команд і inline-запитів на основі знімку графіку"""
+
+    def __init__(self, bot, cache, registry, delivery, render_cache, region, queue,
+                 long_poll_timeout=LONG_POLL_SECONDS, digests=None):
+        self.bot = bot
+        self.cache = cache
+        self.registry = registry
+        self.delivery = delivery
+        self.render_cache = render_cache
+        self.region = region
+        self.queue = queue
+        self.long_poll_timeout = long_poll_timeout
+        self.digests = digests  # DigestScheduler (None - час повідомлень не налаштовується)
+
+        self.subscribed = asyncio.Event()  # Встановлюється після першої підписки через /start
+        self._matrix = None  # SlotMatrix останнього знімку
+        self.offset = None
+        self._task = None
+        self.handled = 0
+
+    def start(self):
+        """Запускає long polling оновлень (викликати всередині event loop)"""
+        if self._task is None:
+            self._task = asyncio.ensure_future(self.poll_updates())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def poll_updates(self):
+        # getUpdates не працює, поки зареєстровано webhook (наприклад, з минулого запуску)
+        try:
+            await self.bot.delete_webhook()
+        except TelegramError as e:
+            logger.warning(f'⚠️ Не вдалося видалити webhook: {e}')
+
+        while True:
+            try:
+                updates = await self.bot.get_updates(
+                    offset=self.offset,
+                    timeout=self.long_poll_timeout,
+                    allowed_updates=['message', 'inline_query']
+                )
+            except TelegramError as e:
+                logger.warning(f'⚠️ Помилка отримання оновлень: {e}')
+                await asyncio.sleep(POLL_ERROR_BACKOFF_SECONDS)
+                continue
+
+            for update in updates:
+                self.offset = update.update_id + 1
+                TELEGRAM_UPDATES.inc(source='polling', result='accepted')
+                await self.handle_update(update)
+
+    async def handle_update(self, update):
+        try:
+            if update.inline_query is not None:
+                await self.handle_inline_query(update.inline_query)
+            elif update.message is not None and update.message.text:
+                self.handle_message(update.message)
+        except Exception as e:
+            logger.error(f'❌ Помилка обробки оновлення {update.update_id}: {e}')
+
+    def _chat_queues(self, chat_id):
+        """Групи чату (регіон, група); для непідписаного чату - основна група"""
+        return sorted(self.registry.queues_for(chat_id)) or [(self.region, self.queue)]
+
+    def _known_queue(self, region, queue):
+        schedule = self.cache.peek()
+        if schedule is not None and schedule.region(region):
+            return schedule.queue(region, queue) is not None
+        return bool(QUEUE_PATTERN.match(queue))
+
+    def _username(self):
+        """Ім'я бота; None, поки get_me() ще не завершився"""
+        try:
+            return self.bot.username
+        except RuntimeError:
+            return None
+
+    def handle_message(self, message):
+        parts = message.text.split()
+        command, _, mention = parts[0].partition('@')
+        command = command.lower()
+        username = self._username()
+        if mention and username is not None and mention.lower() != username.lower():
+            # Команда іншому боту в груповому чаті
+            return
+        argument = parts[1] if len(parts) > 1 else None
+        chat_id = str(message.chat.id)
+        self.handled += 1
+
+        if command == '/start':
+            reply = self.subscribe(chat_id, argument or self.queue)
+        elif command == '/stop':
+            self.registry.unsubscribe(chat_id)
+            self.registry.save()
+            reply = '🔕 Ви відписались від повідомлень. /start - підписатися знову'
+        elif command == '/group':
+            reply = self.subscribe(chat_id, argument, replace=True) if argument else '❓ Вкажіть групу: /group 3.1'
+        elif command in ('/today', '/tomorrow'):
+            reply = self.render_days(chat_id, tomorrow=command == '/tomorrow')
+        elif command == '/next':
+            schedule = self.cache.peek()
+            if schedule is None:
+                reply = '⏳ Графік ще завантажується, спробуйте за хвилину'
+            else:
+                reply = '\n\n'.join(
+                    format_next_outage(schedule, region, queue) for region, queue in self._chat_queues(chat_id)
+                )
+        elif command == '/common':
+            reply = self.common_power(chat_id, parts[1:])
+        elif command == '/digest' and self.digests is not None:
+            reply = self.configure_digests(chat_id, parts[1:])
+        elif command.startswith('/') or message.chat.type == 'private':
+            reply = HELP_TEXT
+        else:
+            return
+
+        self.delivery.send_message(chat_id, reply)
+
+    def subscribe(self, chat_id, queue, replace=False):
+        region = self.region
+        if not self._known_queue(region, queue):
+            return f'⚠️ Група {escape_markdown(queue)} не знайдена'
+
+        if replace:
+            self.registry.unsubscribe(chat_id)
+        self.registry.subscribe(chat_id, region, queue)
+        self.registry.save()
+        self.subscribed.set()
+        logger.info(f'➕ Чат {chat_id} підписано на групу {queue}')
+        return (f'✅ Підписку оформлено: {get_region_name(region)}, Група {queue}\n\n'
+                f'Надсилатиму зміни графіку та попередження про відключення.\n\n' + HELP_TEXT)
+
+    def common_power(self, chat_id, queues):
+        """/common [групи] - спільні вікна зі світлом для груп чату або вказаних груп"""
+        schedule = self.cache.peek()
+        if schedule is None:
+            return '⏳ Графік ще завантажується, спробуйте за хвилину'
+
+        if queues:
+            unknown = [queue for queue in queues if schedule.queue(self.region, queue) is None]
+            if unknown:
+                return f'⚠️ Група {escape_markdown(", ".join(unknown))} не знайдена'
+            keys = [(self.region, queue) for queue in dict.fromkeys(queues)]
+        else:
+            keys = self._chat_queues(chat_id)
+
+        # Маски будуються один раз на знімок і спільні для всіх чатів
+        if self._matrix is None or self._matrix.schedule is not schedule:
+            self._matrix = SlotMatrix(schedule)
+        return format_common_power(self._matrix, keys)
+
+    def configure_digests(self, chat_id, arguments):
+        """/digest [ранок [вечір [часовий пояс]]] - показує або змінює час щоденних повідомлень"""
+        if arguments:
+            try:
+                times = [parse_clock(argument) for argument in arguments[:2]]
+                timezone_name = arguments[2] if len(arguments) > 2 else None
+                self.digests.configure(
+                    chat_id,
+                    morning=times[0],
+                    evening=times[1] if len(times) > 1 else None,
+                    timezone_name=timezone_name
+                )
+            except ValueError as e:
+                # Помилка містить введений текст - екрануємо його
+                return f'⚠️ {escape_markdown(str(e))}\nПриклад: /digest 7:30 21:00 Europe/Kyiv'
+
+        settings = self.digests.settings(chat_id)
+        return (f'🗓️ *Щоденні повідомлення*\n\n'
+                f'🌅 {format_clock(settings["morning"])} - графік на сьогодні\n'
+                f'🌙 {format_clock(settings["evening"])} - графік на завтра\n'
+                f'🌍 `{settings["timezone"]}`')
+
+    def render_days(self, chat_id, tomorrow=False):
+        schedule = self.cache.peek()
+        if schedule is None:
+            return '⏳ Графік ще завантажується, спробуйте за хвилину'
+
+        offset = 1 if tomorrow else 0
+        date = (clock.now() + timedelta(days=offset)).strftime('%Y-%m-%d')
+        variant = 'tomorrow' if tomorrow else 'today'
+        text = '\n'.join(
+            self.render_cache.get(schedule, region, queue, date, variant)
+            for region, queue in self._chat_queues(chat_id)
+        )
+        # Час останньої перевірки знімку, а не першого рендеру тексту з кешу
+        return stamp_updated(text, self.cache.updated_at)
+
+    async def handle_inline_query(self, inline_query):
+        """Inline-запит "@бот 3.1": графіки групи на сьогодні і завтра"""
+        schedule = self.cache.peek()
+        query = inline_query.query.strip()
+        queue = query.split()[0] if query else None
+        if queue is None:
+            keys = self._chat_queues(str(inline_query.from_user.id))
+        else:
+            keys = [(self.region, queue)]
+
+        results = []
+        if schedule is not None:
+            now = clock.now()
+            for region, group in keys:
+                if schedule.queue(region, group) is None:
+                    continue
+                for offset, variant, title in ((0, 'today', 'сьогодні'), (1, 'tomorrow', 'завтра')):
+                    date = (now + timedelta(days=offset)).strftime('%Y-%m-%d')
+                    if schedule.day(region, group, date) is None:
+                        continue
+                    text = stamp_updated(self.render_cache.get(schedule, region, group, date, variant),
+                                         self.cache.updated_at)
+                    results.append(InlineQueryResultArticle(
+                        id=f'{region}:{group}:{date}',
+                        title=f'Група {group}: графік на {title}',
+                        description=get_region_name(region),
+                        input_message_content=InputTextMessageContent(text, parse_mode='Markdown')
+                    ))
+
+        self.handled += 1
+        await self.bot.answer_inline_query(inline_query.id, results, cache_time=INLINE_CACHE_SECONDS)
@@ -0,0 +1,344 @@
+"""
+Черга відправки повідомлень у Telegram з обмеженням швидкості
+
+Telegram дозволяє ~30 повідомлень на секунду загалом, ~1 на секунду в
+один чат та ~20 на хвилину в групу. Повідомлення ставляться в чергу і
+відправляються пулом воркерів з дотриманням цих лімітів; на 429
+(RetryAfter) повідомлення не губиться, а повторюється після паузи.
+Пауза зупиняє лише чат, що отримав 429; всю відправку - тільки якщо 429
+одночасно приходять від кількох чатів (глобальний ліміт бота).
+"""
+
+import asyncio
+import logging
+from collections import deque
+from datetime import timedelta
+
+from telegram.error import RetryAfter, TimedOut, NetworkError, TelegramError
+
+import clock
+from metrics import TELEGRAM_REQUEST_SECONDS, TELEGRAM_MESSAGES, DELIVERY_LATENCY
+
+logger = logging.getLogger(__name__)
+
+GLOBAL_MESSAGES_PER_SECOND = 30
+CHAT_MESSAGES_PER_SECOND = 1
+GROUP_MESSAGES_PER_MINUTE = 20
+DEFAULT_WORKERS = 8
+MAX_ATTEMPTS = 5  # Спроби при помилках мережі (429 їх не витрачає)
+MAX_FLOOD_WAIT_SECONDS = 60 * 60  # Скільки повідомлення може сумарно чекати через 429
+GLOBAL_FLOOD_CHATS = 3  # 429 від стількох різних чатів ...
+GLOBAL_FLOOD_WINDOW_SECONDS = 5  # ... за стільки секунд - глобальний ліміт
+MAX_IDLE_BUCKETS = 10000
+BACKOFF_BASE_SECONDS = 1
+TOKEN_EPSILON = 1e-9  # Похибка округлення: інакше затримка 1e-14 с не минає у віртуальному часі
+
+
+class TokenBucket:
+    """Відро токенів: rate токенів за секунду, не більше capacity"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = clock.monotonic()
+
+    def _refill(self):
+        now = clock.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self):
+        """Скільки секунд чекати до появи одного токена (без списання)"""
+        self._refill()
+        if self.tokens >= 1 - TOKEN_EPSILON:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def reserve(self):
+        """Резервує токен і повертає, скільки секунд треба зачекати до його використання
+
+        Токени можуть піти в мінус - наступні резерви отримують більшу
+        затримку, тому одночасні воркери не перевищують швидкість.
+        """
+        self._refill()
+        self.tokens -= 1
+        if self.tokens >= -TOKEN_EPSILON:
+            return 0
+        return -self.tokens / self.rate
+
+    def pause(self, seconds):
+        """Забирає токени так, щоб наступний з'явився не раніше ніж через seconds"""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - seconds * self.rate)
+
+    def is_full(self):
+        self._refill()
+        return self.tokens >= self.capacity
+
+
+class Delivery:
+    """Одне повідомлення в черзі та його метрики доставки"""
+
+    def __init__(self, chat_id, method, kwargs, future):
+        self.chat_id = chat_id
+        self.method = method
+        self.kwargs = kwargs
+        self.future = future
+        self.attempts = 0
+        self.flood_wait = 0.0  # Сумарна пауза через 429 (секунди)
+        self.enqueued_at = clock.monotonic()
+        self.sent_at = None
+        self.last_error = None
+
+    @property
+    def latency(self):
+        """Час від постановки в чергу до успішної відправки (секунди)"""
+        if self.sent_at is None:
+            return None
+        return self.sent_at - self.enqueued_at
+
+
+def _consume_exception(future):
+    """Позначає виключення як прочитане, якщо результат ніхто не чекає"""
+    if not future.cancelled():
+        future.exception()
+
+
+def _retry_after_seconds(error):
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+def is_group_chat(chat_id):
+    """Групи та канали в Telegram мають від'ємний chat_id"""
+    return str(chat_id).startswith('-')
+
+
+class DeliveryQueue:
+    """Черга відправки з воркерами, лімітами Telegram та повторними спробами
+
+    Повідомлення одного чату відправляються строго по черзі (не більше
+    одного в процесі відправки), різні чати обробляються паралельно.
+    """
+
+    def __init__(self, bot, workers=DEFAULT_WORKERS, global_rate=GLOBAL_MESSAGES_PER_SECOND,
+                 max_attempts=MAX_ATTEMPTS):
+        self.bot = bot
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+
+        self._chat_buckets = {}
+        self._floods = deque()      # (час, chat_id) останніх 429
+        self._pending = {}          # chat_id -> deque[Delivery]
+        self._ready = asyncio.Queue()
+        self._tasks = []
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+        self.stats = {
+            'queued': 0,
+            'sent': 0,
+            'failed': 0,
+            'retries': 0,
+            'rate_limited': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0
+        }
+
+    def start(self):
+        """Запускає воркери (викликати всередині event loop)"""
+        if not self._tasks:
+            self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout=10):
+        """Дочікується відправки черги (не довше timeout секунд) та зупиняє воркери"""
+        try:
+            await asyncio.wait_for(self.drain(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f'⚠️ Не відправлено {self.pending_count()} повідомлень при зупинці')
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def drain(self):
+        """Чекає, поки черга спорожніє"""
+        await self._idle.wait()
+
+    def pending_count(self):
+        return sum(len(queue) for queue in self._pending.values())
+
+    def submit(self, chat_id, method, **kwargs):
+        """Ставить виклик методу Bot у чергу, повертає Future з результатом"""
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+
+        chat_id = str(chat_id)
+        delivery = Delivery(chat_id, method, kwargs, future)
+        self.stats['queued'] += 1
+        self._idle.clear()
+
+        queue = self._pending.get(chat_id)
+        if queue is None:
+            # Чат не в обробці - додаємо його в чергу готових
+            self._pending[chat_id] = deque([delivery])
+            self._ready.put_nowait(chat_id)
+        else:
+            queue.append(delivery)
+
+        return future
+
+    def send_message(self, chat_id, text, parse_mode='Markdown', **kwargs):
+        """Ставить повідомлення в чергу відправки"""
+        return self.submit(chat_id, 'send_message', text=text, parse_mode=parse_mode, **kwargs)
+
+    def edit_message(self, chat_id, message_id, text, parse_mode='Markdown', **kwargs):
+        """Ставить редагування повідомлення в чергу (ліміти ті самі, що й для відправки)"""
+        return self.submit(chat_id, 'edit_message_text', message_id=message_id, text=text,
+                           parse_mode=parse_mode, **kwargs)
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if is_group_chat(chat_id):
+                bucket = TokenBucket(GROUP_MESSAGES_PER_MINUTE / 60, GROUP_MESSAGES_PER_MINUTE)
+            else:
+                bucket = TokenBucket(CHAT_MESSAGES_PER_SECOND, CHAT_MESSAGES_PER_SECOND)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _prune_buckets(self):
+        """Видаляє відра чатів без черги, які вже повністю відновились"""
+        for chat_id, bucket in list(self._chat_buckets.items()):
+            if chat_id not in self._pending and bucket.is_full():
+                del self._chat_buckets[chat_id]
+
+    def _is_global_flood(self, chat_id):
+        """Запам'ятовує 429 чату; True, якщо недавно їх отримали кілька різних чатів"""
+        now = clock.monotonic()
+        self._floods.append((now, chat_id))
+        while now - self._floods[0][0] > GLOBAL_FLOOD_WINDOW_SECONDS:
+            self._floods.popleft()
+        return len({chat for _, chat in self._floods}) >= GLOBAL_FLOOD_CHATS
+
+    def _requeue_later(self, chat_id, delay):
+        asyncio.get_running_loop().call_later(delay, self._ready.put_nowait, chat_id)
+
+    def _finish(self, chat_id):
+        """Знімає відправлене повідомлення з голови черги чату"""
+        queue = self._pending[chat_id]
+        queue.popleft()
+
+        if queue:
+            self._ready.put_nowait(chat_id)
+            return
+
+        del self._pending[chat_id]
+        if len(self._chat_buckets) > MAX_IDLE_BUCKETS:
+            self._prune_buckets()
+        if not self._pending:
+            self._idle.set()
+
+    async def _worker(self):
+        while True:
+            chat_id = await self._ready.get()
+            delivery = self._pending[chat_id][0]
+
+            # Ліміт чату - не займаємо воркер, а повертаємо чат у чергу пізніше
+            chat_delay = self._chat_bucket(chat_id).delay()
+            if chat_delay > 0:
+                self._requeue_later(chat_id, chat_delay)
+                continue
+
+            global_delay = self.global_bucket.reserve()
+            if global_delay > 0:
+                await asyncio.sleep(global_delay)
+
+            self._chat_bucket(chat_id).reserve()
+            await self._attempt(delivery)
+
+    async def _attempt(self, delivery):
+        chat_id = delivery.chat_id
+        delivery.attempts += 1
+        started = clock.monotonic()
+
+        try:
+            result = await getattr(self.bot, delivery.method)(chat_id=chat_id, **delivery.kwargs)
+        except RetryAfter as e:
+            TELEGRAM_REQUEST_SECONDS.observe(clock.monotonic() - started, method=delivery.method, outcome='429')
+            TELEGRAM_MESSAGES.inc(result='rate_limited')
+            retry_after = _retry_after_seconds(e)
+            self.stats['rate_limited'] += 1
+            # Flood-wait одного чату не зупиняє інші чати
+            self._chat_bucket(chat_id).pause(retry_after)
+            if self._is_global_flood(chat_id):
+                self.global_bucket.pause(retry_after)
+            # 429 не витрачає спроби: обмежено лише сумарне очікування
+            delivery.attempts -= 1
+            delivery.flood_wait += retry_after
+            if delivery.flood_wait <= MAX_FLOOD_WAIT_SECONDS:
+                self.stats['retries'] += 1
+                logger.warning(f'⏳ Flood control (чат {chat_id}): повтор через {retry_after:.0f} с')
+                self._requeue_later(chat_id, retry_after)
+                return
+            # Чат відповідає 429 вже понад годину - не тримаємо його чергу безкінечно
+            self._fail(delivery, e)
+            return
+        except (TimedOut, NetworkError) as e:
+            TELEGRAM_REQUEST_SECONDS.observe(clock.monotonic() - started, method=delivery.method, outcome='network')
+            delivery.last_error = e
+            if delivery.attempts < self.max_attempts:
+                TELEGRAM_MESSAGES.inc(result='retry')
+                backoff = BACKOFF_BASE_SECONDS * 2 ** (delivery.attempts - 1)
+                self.stats['retries'] += 1
+                logger.warning(f'🔁 Помилка мережі (чат {chat_id}): {e}, повтор через {backoff} с')
+                self._requeue_later(chat_id, backoff)
+                return
+            self._fail(delivery, e)
+            return
+        except TelegramError as e:
+            TELEGRAM_REQUEST_SECONDS.observe(clock.monotonic() - started, method=delivery.method, outcome='error')
+            self._fail(delivery, e)
+            return
+        except Exception as e:
+            self._fail(delivery, e)
+            return
+
+        delivery.sent_at = clock.monotonic()
+        latency = delivery.latency
+        TELEGRAM_REQUEST_SECONDS.observe(delivery.sent_at - started, method=delivery.method, outcome='ok')
+        TELEGRAM_MESSAGES.inc(result='sent')
+        DELIVERY_LATENCY.observe(latency)
+        self.stats['sent'] += 1
+        self.stats['latency_total'] += latency
+        self.stats['latency_max'] = max(self.stats['latency_max'], latency)
+        logger.debug(f'📨 {delivery.method} → {chat_id}: {latency:.2f} с, спроб: {delivery.attempts}')
+
+        if not delivery.future.done():
+            delivery.future.set_result(result)
+        self._finish(chat_id)
+
+    def _fail(self, delivery, error):
+        delivery.last_error = error
+        self.stats['failed'] += 1
+        TELEGRAM_MESSAGES.inc(result='failed')
+        logger.error(f'❌ Помилка Telegram (чат {delivery.chat_id}, спроб: {delivery.attempts}): {error}')
+
+        if not delivery.future.done():
+            delivery.future.set_exception(error)
+        self._finish(delivery.chat_id)
+
+    def log_stats(self):
+        """Пише в лог зведені метрики доставки"""
+        sent = self.stats['sent']
+        average = self.stats['latency_total'] / sent if sent else 0
+        logger.info(
+            f'📬 Доставка: відправлено {sent}, помилок {self.stats["failed"]}, '
+            f'повторів {self.stats["retries"]}, 429: {self.stats["rate_limited"]}, '
+            f'в черзі {self.pending_count()}, затримка сер. {average:.2f} с / макс. {self.stats["latency_max"]:.2f} с'
+        )
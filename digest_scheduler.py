@@ -0,0 +1,326 @@
+"""
+Планувальник щоденних повідомлень
+
+Ранкове повідомлення - графік на сьогодні, вечірнє - графік на завтра.
+Кожен чат може мати власний час повідомлень і часовий пояс. Для кожного
+чату в купі зберігається точний час наступного повідомлення, і задача
+спить до найближчого з них (як WarningScheduler), тож відправка не
+залежить від того, коли прокинувся цикл опитування.
+
+Якщо графіку на завтра ще немає, вечірнє повідомлення не втрачається:
+чат чекає, і повідомлення відправляється, щойно новий знімок містить
+графік (on_snapshot), але не пізніше початку доби, на яку він складений.
+
+Дати графіків - за київським часом (SCHEDULE_TIMEZONE): ранкове
+повідомлення показує київську добу, що триває в момент відправки,
+вечірнє - наступну. Для чатів в інших поясах це може бути не та дата,
+що в чаті.
+"""
+
+import asyncio
+import heapq
+import logging
+import re
+from datetime import datetime, time, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import clock
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TIMEZONE = 'Europe/Kyiv'
+SCHEDULE_TIMEZONE = 'Europe/Kyiv'  # Дати графіків - за київським часом, незалежно від поясу чату
+KINDS = ('morning', 'evening')
+# Ранкове повідомлення, пропущене (наприклад, під час перезапуску), ще
+# відправляється, якщо запізнення менше; вечірнє - до кінця доби
+MORNING_CATCH_UP_SECONDS = 3600
+# Найдовший сон між перевірками: захищає від зсуву системного годинника
+MAX_SLEEP_SECONDS = 30
+
+_CLOCK = re.compile(r'^(\d{1,2})(?::(\d{2}))?$')
+
+
+def parse_clock(text):
+    """'7', '7:30' або '07:30' -> (година, хвилина); ValueError, якщо формат інший"""
+    match = _CLOCK.match(text.strip())
+    if not match:
+        raise ValueError(f'некоректний час: {text}')
+    hour, minute = int(match.group(1)), int(match.group(2) or 0)
+    if hour > 23 or minute > 59:
+        raise ValueError(f'некоректний час: {text}')
+    return hour, minute
+
+
+def format_clock(at):
+    return f'{at[0]:02d}:{at[1]:02d}'
+
+
+def get_timezone(name):
+    """ZoneInfo за назвою (наприклад, Europe/Kyiv); ValueError, якщо пояс невідомий"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        raise ValueError(f'невідомий часовий пояс: {name}')
+
+
+class DigestScheduler:
+    """Купа (час повідомлення, чат, вид) з налаштуваннями по чатах
+
+    send(kind, chat_id, date, keys) відправляє чату графік на дату date
+    (keys=None - всі групи чату) і повертає множину груп, графіку яких
+    на цю дату ще немає. Повертається лише після доставки повідомлення
+    (або виняток, якщо воно не доставлене), тому відправки йдуть окремими
+    задачами і не затримують планування. Ранкове повідомлення з відсутніми
+    групами не повторюється, вечірнє - чекає на графік до початку його доби.
+    """
+
+    def __init__(self, send, morning, evening, timezone_name=DEFAULT_TIMEZONE, store=None):
+        self.send = send
+        self.defaults = {'morning': morning, 'evening': evening, 'timezone': timezone_name}
+        self.store = store
+
+        self._settings = {}   # chat_id -> {'morning': (h, m), 'evening': (h, m), 'timezone': назва}
+        self._sent = {}       # (chat_id, вид) -> дата (YYYY-MM-DD за часом чату)
+        self._waiting = {}    # chat_id -> (дата графіку, дата повідомлення, групи, кінець очікування)
+        self._heap = []       # (fire_at, chat_id, вид)
+        self._entries = {}    # (chat_id, вид) -> fire_at (актуальні записи купи)
+        self._busy = set()    # (chat_id, вид), що саме відправляються
+        self._sending = set() # задачі відправки
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self, timeout=10):
+        """Зупиняє планування і дочікується відправок (не довше timeout секунд)"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+        if self._sending:
+            _, pending = await asyncio.wait(set(self._sending), timeout=timeout)
+            if pending:
+                logger.warning(f'⚠️ Не дочекався відправки {len(pending)} щоденних повідомлень при зупинці')
+                for task in pending:
+                    task.cancel()
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    def restore(self, sent, settings):
+        """Відновлює відправлені повідомлення {(чат, вид): дата} і налаштування чатів"""
+        self._sent.update({key: date for key, date in sent.items() if key[1] in KINDS})
+        for chat_id, (morning, evening, timezone_name) in settings.items():
+            chat = self._settings[chat_id] = {}
+            if morning:
+                chat['morning'] = parse_clock(morning)
+            if evening:
+                chat['evening'] = parse_clock(evening)
+            if timezone_name:
+                chat['timezone'] = timezone_name
+
+    def settings(self, chat_id):
+        """Налаштування чату з урахуванням значень за замовчуванням"""
+        return {**self.defaults, **self._settings.get(str(chat_id), {})}
+
+    def configure(self, chat_id, morning=None, evening=None, timezone_name=None):
+        """Змінює час повідомлень чату; ValueError, якщо часовий пояс невідомий"""
+        chat_id = str(chat_id)
+        if timezone_name is not None:
+            get_timezone(timezone_name)
+
+        chat = self._settings.setdefault(chat_id, {})
+        for name, value in (('morning', morning), ('evening', evening), ('timezone', timezone_name)):
+            if value is not None:
+                chat[name] = value
+
+        if self.store is not None:
+            self.store.save_chat_settings(
+                chat_id,
+                format_clock(chat['morning']) if 'morning' in chat else None,
+                format_clock(chat['evening']) if 'evening' in chat else None,
+                chat.get('timezone')
+            )
+
+        for kind in KINDS:
+            self._push(chat_id, kind)
+
+    def sync(self, chat_ids):
+        """Планує повідомлення для нових чатів і забуває відписані"""
+        chat_ids = {str(chat_id) for chat_id in chat_ids}
+
+        for key in [key for key in self._entries if key[0] not in chat_ids]:
+            del self._entries[key]
+        for chat_id in [chat_id for chat_id in self._waiting if chat_id not in chat_ids]:
+            del self._waiting[chat_id]
+
+        added = 0
+        for chat_id in chat_ids:
+            for kind in KINDS:
+                if (chat_id, kind) not in self._entries:
+                    self._push(chat_id, kind)
+                    added += 1
+
+        if added:
+            logger.info(f'🗓️ Щоденні повідомлення: заплановано {len(self._entries)} (+{added})')
+        return added
+
+    def next_fire_time(self):
+        """Найближчий запланований час повідомлення (UTC, або None)"""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _next_fire(self, chat_id, kind, now, catch_up=True):
+        """Повертає (час повідомлення в UTC, дата за часом чату)
+
+        catch_up=False - сьогоднішній час, що вже минув, переноситься на завтра
+        (після відправки), інакше пропущене повідомлення ще наздоганяється.
+        """
+        settings = self.settings(chat_id)
+        zone = get_timezone(settings['timezone'])
+        hour, minute = settings[kind]
+        local_now = now.astimezone(zone)
+
+        day = local_now.date()
+        fire_at = datetime.combine(day, time(hour, minute), tzinfo=zone)
+        late = (local_now - fire_at).total_seconds()
+        if kind == 'morning':
+            catch_up = catch_up and late <= MORNING_CATCH_UP_SECONDS
+        else:
+            # Вечірнє повідомлення, що чекає на графік, вже відправлене
+            catch_up = catch_up and chat_id not in self._waiting
+        done = self._sent.get((chat_id, kind)) == day.isoformat() or (chat_id, kind) in self._busy
+        if done or (late >= 0 and not catch_up):
+            day += timedelta(days=1)
+            fire_at = datetime.combine(day, time(hour, minute), tzinfo=zone)
+        return fire_at.astimezone(timezone.utc), day
+
+    def _push(self, chat_id, kind, catch_up=True):
+        fire_at, _ = self._next_fire(chat_id, kind, clock.now(timezone.utc), catch_up)
+        earliest = self.next_fire_time()
+        self._entries[(chat_id, kind)] = fire_at
+        heapq.heappush(self._heap, (fire_at, chat_id, kind))
+        if earliest is None or fire_at < earliest:
+            self._wakeup.set()
+
+    def _drop_stale(self):
+        while self._heap:
+            fire_at, chat_id, kind = self._heap[0]
+            if self._entries.get((chat_id, kind)) == fire_at:
+                return
+            heapq.heappop(self._heap)
+
+    def _spawn(self, chat_id, kind, coro):
+        """Запускає відправку окремою задачею; поки вона йде, повідомлення не повторюється"""
+        key = (chat_id, kind)
+        self._busy.add(key)
+        task = asyncio.ensure_future(coro)
+        self._sending.add(task)
+
+        def done(task):
+            self._sending.discard(task)
+            self._busy.discard(key)
+        task.add_done_callback(done)
+
+    def _mark_sent(self, chat_id, kind, day):
+        self._sent[(chat_id, kind)] = day
+        if self.store is not None:
+            self.store.mark_digest([chat_id], kind, day)
+
+    async def on_snapshot(self, schedule):
+        """Новий знімок: відправляє вечірні повідомлення, що чекали на графік на завтра
+
+        Returns:
+            Кількість чатів, яким відправляється повідомлення
+        """
+        now = clock.now(timezone.utc)
+        sent = 0
+        for chat_id, (date, day, keys, deadline) in list(self._waiting.items()):
+            if now >= deadline:
+                del self._waiting[chat_id]
+                logger.info(f'ℹ️ Графік на {date} так і не опубліковано (чат {chat_id})')
+                continue
+            if (chat_id, 'evening') in self._busy:
+                continue
+
+            ready = {key for key in keys if schedule.day(key[0], key[1], date) is not None}
+            if not ready:
+                continue
+            self._spawn(chat_id, 'evening', self._send_waiting(chat_id, ready))
+            sent += 1
+
+        if sent:
+            logger.info(f'🌙 Графік на завтра опубліковано - відправляю чатам: {sent}')
+        return sent
+
+    async def _send_waiting(self, chat_id, ready):
+        """Відправляє вечірнє повідомлення, що чекало, для груп ready"""
+        date, day, keys, deadline = self._waiting[chat_id]
+        try:
+            missing = await self.send('evening', chat_id, date, ready)
+        except Exception as e:
+            logger.error(f'❌ Помилка відправки графіку на завтра (чат {chat_id}): {e}')
+            return
+
+        if chat_id not in self._waiting:
+            # Чат відписався, поки повідомлення відправлялось
+            return
+        keys = (keys - ready) | set(missing)
+        if keys:
+            self._waiting[chat_id] = (date, day, keys, deadline)
+        else:
+            del self._waiting[chat_id]
+            self._mark_sent(chat_id, 'evening', day)
+
+    async def _run(self):
+        while True:
+            self._drop_stale()
+
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            fire_at, chat_id, kind = self._heap[0]
+            delay = (fire_at - clock.now(timezone.utc)).total_seconds()
+
+            if delay <= 0:
+                heapq.heappop(self._heap)
+                del self._entries[(chat_id, kind)]
+                self._spawn(chat_id, kind, self._fire(chat_id, kind, fire_at))
+                self._push(chat_id, kind, catch_up=False)
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, MAX_SLEEP_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _fire(self, chat_id, kind, fire_at):
+        zone = get_timezone(self.settings(chat_id)['timezone'])
+        day = fire_at.astimezone(zone).date()
+        # Дата чату - ключ відправки; графік береться за датою в поясі графіків
+        schedule_day = fire_at.astimezone(get_timezone(SCHEDULE_TIMEZONE)).date()
+        date = schedule_day + timedelta(days=1) if kind == 'evening' else schedule_day
+
+        try:
+            missing = await self.send(kind, chat_id, date.isoformat(), None)
+        except Exception as e:
+            logger.error(f'❌ Помилка відправки щоденного повідомлення (чат {chat_id}): {e}')
+            return
+
+        if kind == 'evening' and missing:
+            # Чекаємо на графік, поки не почалась доба, на яку він складений
+            deadline = datetime.combine(
+                date, time(0), tzinfo=get_timezone(SCHEDULE_TIMEZONE)
+            ).astimezone(timezone.utc)
+            self._waiting[chat_id] = (date.isoformat(), day.isoformat(), set(missing), deadline)
+            logger.info(f'⏳ Графік на завтра ще не опубліковано (чат {chat_id}, груп: {len(missing)}), чекаю')
+            return
+
+        self._mark_sent(chat_id, kind, day.isoformat())
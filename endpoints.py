@@ -0,0 +1,232 @@
+"""
+Вибір endpoint API графіку: стан кожного endpoint, circuit breaker, hedging
+
+- для кожного endpoint ведеться історія затримок (p95) і помилок;
+- після кількох помилок поспіль endpoint "розмикається" і не
+  використовується до кінця паузи, після чого дозволяється один пробний запит;
+- якщо перший endpoint не відповів за свій p95, паралельно запускається
+  наступний (hedged request) - перемагає перша успішна відповідь;
+- відповідь приймається лише після перевірки структури даних.
+"""
+
+import asyncio
+import logging
+from collections import deque
+
+import clock
+from metrics import FETCH_SECONDS, HEDGED_REQUESTS
+
+logger = logging.getLogger(__name__)
+
+FAILURE_THRESHOLD = 3  # Помилок поспіль до розмикання
+OPEN_SECONDS = 60  # Пауза розімкненого endpoint (подвоюється при невдалій пробі)
+MAX_OPEN_SECONDS = 600
+LATENCY_WINDOW = 50  # Скільки останніх затримок враховується в p95
+HEDGE_DEFAULT_SECONDS = 2.0  # Затримка hedging, поки немає історії
+HEDGE_MIN_SECONDS = 0.3
+HEDGE_MAX_SECONDS = 5.0
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class SchemaError(ValueError):
+    """Відповідь API не у форматі {'regions': [{'cpu', 'schedule'}]}"""
+
+
+def validate_payload(data):
+    """Перевіряє структуру відповіді API (без розбору графіків)"""
+    if not isinstance(data, dict):
+        raise SchemaError('відповідь не є об\'єктом')
+    regions = data.get('regions')
+    if not isinstance(regions, list) or not regions:
+        raise SchemaError('немає списку regions')
+    for region in regions:
+        if not isinstance(region, dict) or not isinstance(region.get('cpu'), str):
+            raise SchemaError('регіон без cpu')
+        if not isinstance(region.get('schedule'), dict):
+            raise SchemaError(f'регіон {region["cpu"]} без schedule')
+    return data
+
+
+class Endpoint:
+    """Один endpoint API зі станом здоров'я та circuit breaker"""
+
+    def __init__(self, name, url):
+        self.name = name
+        self.url = url
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.open_seconds = OPEN_SECONDS
+        self.opened_at = None
+        self.trial_in_flight = False
+        self.consecutive_losses = 0
+        self.demoted_until = 0
+
+        self.requests = 0
+        self.failures = 0
+        self.wins = 0
+        self.losses = 0
+
+    def p95(self):
+        """95-й перцентиль затримки успішних запитів (None - немає історії)"""
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def hedge_delay(self):
+        delay = self.p95()
+        if delay is None:
+            return HEDGE_DEFAULT_SECONDS
+        return min(max(delay, HEDGE_MIN_SECONDS), HEDGE_MAX_SECONDS)
+
+    def available(self, now=None):
+        """Чи можна зараз надіслати запит на цей endpoint"""
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            now = clock.monotonic() if now is None else now
+            if now - self.opened_at < self.open_seconds:
+                return False
+            self.state = HALF_OPEN
+            logger.info(f'🔌 Endpoint {self.name}: пробний запит після паузи')
+        return not self.trial_in_flight
+
+    def record_start(self):
+        self.requests += 1
+        if self.state == HALF_OPEN:
+            self.trial_in_flight = True
+
+    def record_success(self, latency):
+        self.latencies.append(latency)
+        self.wins += 1
+        self.consecutive_failures = 0
+        self.consecutive_losses = 0
+        self.trial_in_flight = False
+        if self.state != CLOSED:
+            logger.info(f'✅ Endpoint {self.name} знову доступний')
+            self.state = CLOSED
+            self.open_seconds = OPEN_SECONDS
+
+    def record_failure(self):
+        self.failures += 1
+        self.consecutive_failures += 1
+        self.trial_in_flight = False
+
+        if self.state == HALF_OPEN:
+            self.open_seconds = min(self.open_seconds * 2, MAX_OPEN_SECONDS)
+            self._open()
+        elif self.state == CLOSED and self.consecutive_failures >= FAILURE_THRESHOLD:
+            self._open()
+
+    def record_loss(self):
+        """Інший endpoint відповів раніше; повільний endpoint тимчасово стає другим"""
+        self.losses += 1
+        self.consecutive_losses += 1
+        if self.consecutive_losses >= FAILURE_THRESHOLD:
+            self.demoted_until = clock.monotonic() + OPEN_SECONDS
+
+    def is_demoted(self, now):
+        return now < self.demoted_until
+
+    def record_cancel(self):
+        """Запит скасовано - не помилка"""
+        self.trial_in_flight = False
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_at = clock.monotonic()
+        logger.warning(f'🔌 Endpoint {self.name} вимкнено на {self.open_seconds} с '
+                       f'(помилок поспіль: {self.consecutive_failures})')
+
+
+class EndpointPool:
+    """Виконує запит через доступні endpoint з hedging"""
+
+    def __init__(self, endpoints):
+        self.endpoints = list(endpoints)
+        self.hedges = 0
+
+    def candidates(self):
+        """Доступні endpoint у порядку пріоритету; якщо всі вимкнені - всі
+
+        Endpoint, що кілька разів поспіль програв hedging, на час паузи
+        запитується другим - тоді затримка дорівнює одному RTT швидшого.
+        """
+        now = clock.monotonic()
+        available = [endpoint for endpoint in self.endpoints if endpoint.available(now)]
+        return sorted(available or self.endpoints, key=lambda endpoint: endpoint.is_demoted(now))
+
+    async def fetch(self, request):
+        """Виконує request(endpoint) і повертає (endpoint, результат) першого успішного
+
+        Наступний endpoint запускається, якщо попередній не відповів за
+        свій p95 або завершився помилкою. Якщо всі endpoint невдалі,
+        піднімається остання помилка.
+        """
+        candidates = self.candidates()
+        pending = {}
+        last_error = None
+        launched = 0
+
+        def launch():
+            nonlocal launched
+            endpoint = candidates[launched]
+            launched += 1
+            endpoint.record_start()
+            task = asyncio.ensure_future(request(endpoint))
+            pending[task] = (endpoint, clock.monotonic())
+            return endpoint
+
+        try:
+            hedge_after = launch().hedge_delay()
+            while pending:
+                timeout = hedge_after if launched < len(candidates) else None
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    endpoint = launch()
+                    self.hedges += 1
+                    HEDGED_REQUESTS.inc()
+                    logger.info(f'⏩ Hedged запит: {endpoint.name}')
+                    hedge_after = endpoint.hedge_delay()
+                    continue
+
+                for task in done:
+                    endpoint, started = pending.pop(task)
+                    elapsed = clock.monotonic() - started
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        FETCH_SECONDS.observe(elapsed, endpoint=endpoint.name, outcome='error')
+                        endpoint.record_failure()
+                        last_error = e
+                        logger.warning(f'❌ Endpoint {endpoint.name}: {e!r}')
+                    else:
+                        FETCH_SECONDS.observe(elapsed, endpoint=endpoint.name, outcome='ok')
+                        endpoint.record_success(elapsed)
+                        for loser, loser_started in pending.values():
+                            FETCH_SECONDS.observe(clock.monotonic() - loser_started, endpoint=loser.name, outcome='lost')
+                            loser.record_loss()
+                        return endpoint, result
+
+                # Помилка раніше за p95 - наступний endpoint запускаємо одразу
+                if not pending and launched < len(candidates):
+                    hedge_after = launch().hedge_delay()
+
+            raise last_error
+        finally:
+            for task, (endpoint, _) in pending.items():
+                task.cancel()
+                endpoint.record_cancel()
+
+    def log_stats(self):
+        for endpoint in self.endpoints:
+            p95 = endpoint.p95()
+            p95_text = f'{p95 * 1000:.0f} мс' if p95 is not None else '—'
+            logger.info(f'🌐 {endpoint.name}: {endpoint.state}, запитів {endpoint.requests}, '
+                        f'помилок {endpoint.failures}, програно hedging {endpoint.losses}, p95 {p95_text}')
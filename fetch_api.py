@@ -3,27 +3,77 @@
 Використовує офіційний API endpoint
 """
 
-import requests
+import asyncio
+import httpx
 import json
 from datetime import datetime
 import time
+import os
 
-def fetch_schedule_from_api(region='kyiv', queue='2.2'):
-    """Отримує графік через API svitlo.live"""
+from schedule_model import as_schedule, format_minutes, get_region_name
+from endpoints import Endpoint, EndpointPool, SchemaError, validate_payload
+from stream_parse import parse_filtered
+from metrics import NOT_MODIFIED, PAYLOAD_BYTES, PARSE_SECONDS, ENDPOINT_OPEN
+from profiling import span
+
+# API endpoint (офіційний Cloudflare Worker proxy)
+API_URL = os.getenv('SVITLO_API_URL', 'https://svitlo-proxy.svitlo-proxy.workers.dev')
+# Альтернативний endpoint (прямий API svitlo.live)
+ALT_API_URL = os.getenv('SVITLO_ALT_API_URL', 'https://svitlo.live/api/asistant.php')
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'application/json',
+    'Content-Type': 'application/json'
+}
+
+STATUS_LABELS = {
+    0: '❓ Дані недоступні',
+    1: '💡 Світло Є',
+    2: '⚠️ Можливе відключення'
+}
+
+REQUEST_TIMEOUT = 10  # Дедлайн одного запиту (секунди)
+CONNECT_TIMEOUT = 5
+
+# Спільний асинхронний HTTP клієнт (keep-alive пул з'єднань)
+_async_client = None
+# Стан endpoint (circuit breaker, p95) живе між запитами
+_endpoint_pool = None
+
+
+def save_and_print_schedule(data, queue):
+    """Виводить отримані дані, зберігає їх у файл та форматує графік"""
     
-    # API endpoint (офіційний Cloudflare Worker proxy)
-    api_url = 'https://svitlo-proxy.svitlo-proxy.workers.dev'
+    print(f'📊 Дані отримано:')
+    print(json.dumps(data, ensure_ascii=False, indent=2))
+    
+    # Зберігаємо у файл
+    with open('schedule_api.json', 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+    print('\n💾 Графік збережено у файл schedule_api.json')
+    
+    # Форматуємо для читабельності
+    format_schedule(data, queue)
+
+
+def fetch_schedule_from_api(region='kyiv', queue='2.2', quiet=False):
+    """Отримує графік через API svitlo.live
+    
+    quiet - без виводу та запису всієї відповіді: розбирається лише
+    графік потрібної групи, виводиться тільки відформатований графік.
+    """
+    # requests потрібен лише синхронному клієнту - бот стартує без нього
+    import requests
+    
+    api_url = API_URL
     
     print('🔄 Початок отримання графіку через API...')
     print(f'⏰ Час запиту: {datetime.now().strftime("%Y-%m-%d %H:%M:%S")}')
     print(f'🌐 API URL: {api_url}')
     print(f'📍 Регіон: {region}, Група: {queue}')
     
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-        'Accept': 'application/json',
-        'Content-Type': 'application/json'
-    }
+    headers = HEADERS
     
     # Параметри запиту
     params = {
@@ -32,44 +82,51 @@ def fetch_schedule_from_api(region='kyiv', queue='2.2'):
     }
     
     try:
-        response = requests.get(api_url, headers=headers, params=params, timeout=10)
+        response = requests.get(api_url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
         response.raise_for_status()
         
         print(f'✅ Статус відповіді: {response.status_code}')
         
         # Парсимо JSON
-        data = response.json()
-        
-        print(f'📊 Дані отримано:')
-        print(json.dumps(data, ensure_ascii=False, indent=2))
+        if quiet:
+            data = parse_filtered(response.text, {region: {queue}})
+            format_schedule(data, queue, region)
+            return data
         
-        # Зберігаємо у файл
-        with open('schedule_api.json', 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        print('\n💾 Графік збережено у файл schedule_api.json')
+        data = validate_payload(response.json())
         
-        # Форматуємо для читабельності
-        format_schedule(data, queue)
+        save_and_print_schedule(data, queue)
         
         return data
         
-    except requests.exceptions.RequestException as e:
+    except json.JSONDecodeError as e:
+        # Спершу: JSONDecodeError з requests - теж RequestException
+        print(f'❌ Помилка парсингу JSON: {e}')
+        print(f'📄 Відповідь сервера: {response.text[:500]}')
+        return None
+    except (requests.exceptions.RequestException, SchemaError) as e:
         print(f'❌ Помилка запиту: {e}')
         
         # Спробуємо альтернативний endpoint
         print('\n🔄 Спроба використати прямий API svitlo.live...')
         try:
-            alt_url = 'https://svitlo.live/api/asistant.php'
-            response = requests.get(alt_url, headers=headers, params=params, timeout=10)
-            data = response.json()
+            alt_url = ALT_API_URL
+            response = requests.get(alt_url, headers=headers, params=params, timeout=REQUEST_TIMEOUT)
+            response.raise_for_status()
             print('✅ Альтернативний API спрацював!')
+            if quiet:
+                data = parse_filtered(response.text, {region: {queue}})
+                format_schedule(data, queue, region)
+                return data
+            data = validate_payload(response.json())
             print(json.dumps(data, ensure_ascii=False, indent=2))
             return data
         except Exception as e2:
             print(f'❌ Альтернативний API теж не спрацював: {e2}')
         
         return None
-    except json.JSONDecodeError as e:
+    except ValueError as e:
+        # parse_filtered: обрізаний або некоректний JSON
         print(f'❌ Помилка парсингу JSON: {e}')
         print(f'📄 Відповідь сервера: {response.text[:500]}')
         return None
@@ -78,69 +135,179 @@ def fetch_schedule_from_api(region='kyiv', queue='2.2'):
         return None
 
 
-def format_schedule(data, queue):
+def get_async_client():
+    """Повертає спільний httpx.AsyncClient з пулом keep-alive з'єднань"""
+    global _async_client
+    
+    if _async_client is None or _async_client.is_closed:
+        _async_client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=httpx.Timeout(REQUEST_TIMEOUT, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=10, max_keepalive_connections=5, keepalive_expiry=300)
+        )
+    return _async_client
+
+
+async def close_async_client():
+    """Закриває спільний HTTP клієнт (викликати при зупинці бота)"""
+    global _async_client
+    
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+
+def get_endpoint_pool():
+    """Повертає спільний пул endpoint (основний proxy, потім прямий API)"""
+    global _endpoint_pool
+    
+    if _endpoint_pool is None:
+        _endpoint_pool = EndpointPool([
+            Endpoint('proxy', API_URL),
+            Endpoint('svitlo.live', ALT_API_URL)
+        ])
+        for endpoint in _endpoint_pool.endpoints:
+            ENDPOINT_OPEN.set_function(lambda e=endpoint: int(e.state == 'open'), endpoint=endpoint.name)
+    return _endpoint_pool
+
+
+class FetchResult:
+    """Результат умовного запиту графіку"""
+    
+    def __init__(self, data=None, etag=None, last_modified=None, not_modified=False):
+        self.data = data
+        self.etag = etag
+        self.last_modified = last_modified
+        self.not_modified = not_modified
+
+
+async def _get_conditional_async(client, url, params, timeout, etag=None, last_modified=None, wanted=None):
+    """Виконує GET запит з жорстким дедлайном та валідаторами кешу
+    
+    wanted - {регіон: набір груп}: розбирати тільки ці графіки
+    """
+    headers = {}
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    
+    response = await asyncio.wait_for(
+        client.get(url, params=params, headers=headers),
+        timeout=timeout
+    )
+    
+    # 304 - дані не змінились з моменту останнього запиту
+    if response.status_code == 304:
+        NOT_MODIFIED.inc()
+        return FetchResult(etag=etag, last_modified=last_modified, not_modified=True)
+    
+    response.raise_for_status()
+    PAYLOAD_BYTES.observe(len(response.content))
+    if wanted is not None:
+        with PARSE_SECONDS.time(stage='filtered'), span('parse'):
+            data = parse_filtered(response.text, wanted)
+    else:
+        with PARSE_SECONDS.time(stage='json'), span('parse'):
+            data = validate_payload(response.json())
+    return FetchResult(
+        data=data,
+        etag=response.headers.get('ETag'),
+        last_modified=response.headers.get('Last-Modified')
+    )
+
+
+async def fetch_schedule_conditional_async(region='kyiv', queue='2.2', etag=None, last_modified=None,
+                                           timeout=REQUEST_TIMEOUT, wanted=None):
+    """Асинхронно отримує графік з ревалідацією (If-None-Match / If-Modified-Since)
+    
+    Не блокує event loop: використовує спільний пул з'єднань, кожен запит
+    обмежений дедлайном timeout секунд. Endpoint обираються пулом з circuit
+    breaker: якщо основний не відповів за свій p95, паралельно запитується
+    резервний. Скасування задачі, що чекає на результат, перериває запит
+    (CancelledError не перехоплюється). Якщо передано wanted
+    ({регіон: набір груп}), з відповіді розбираються тільки ці графіки.
+    
+    Returns:
+        FetchResult або None, якщо жоден endpoint не відповів
+    """
+    
+    client = get_async_client()
+    params = {
+        'region': region,
+        'queue': queue
+    }
+    print(f'🔄 Асинхронний запит графіку ({region}, група {queue})...')
+    
+    def request(endpoint):
+        return _get_conditional_async(client, endpoint.url, params, timeout, etag, last_modified, wanted)
+    
+    try:
+        endpoint, result = await get_endpoint_pool().fetch(request)
+    except (httpx.HTTPError, asyncio.TimeoutError, ValueError) as e:
+        print(f'❌ Жоден endpoint не відповів: {e!r}')
+        return None
+    
+    if endpoint.url != API_URL:
+        print(f'✅ Відповів резервний endpoint {endpoint.name}')
+    
+    if result.not_modified:
+        print('✓ Графік не змінився (304 Not Modified)')
+        return result
+    
+    # Без повного виводу і запису schedule_api.json - історію веде архів графіків
+    regions = result.data.get('regions') if isinstance(result.data, dict) else None
+    print(f'✅ Дані отримано: регіонів {len(regions) if isinstance(regions, list) else 0}')
+    
+    return result
+
+
+async def fetch_schedule_from_api_async(region='kyiv', queue='2.2', timeout=REQUEST_TIMEOUT):
+    """Асинхронно отримує графік через API svitlo.live
+    
+    Args:
+        region: регіон
+        queue: номер групи
+        timeout: дедлайн для кожного endpoint (секунди)
+    """
+    result = await fetch_schedule_conditional_async(region, queue, timeout=timeout)
+    return result.data if result else None
+
+
+def format_schedule(data, queue, region='kyiv'):
     """Форматує графік для зручного читання"""
     
     print(f'\n{"="*60}')
-    print(f'⚡ ГРАФІК ВІДКЛЮЧЕНЬ ДЛЯ ГРУПИ {queue} (КИЇВ)')
+    print(f'⚡ ГРАФІК ВІДКЛЮЧЕНЬ ДЛЯ ГРУПИ {queue} ({get_region_name(region).upper()})')
     print(f'{"="*60}')
     
-    if not isinstance(data, dict) or 'regions' not in data:
+    schedule = as_schedule(data)
+    if schedule is None:
         print('⚠️ Дані не в очікуваному форматі')
         return
     
-    # Шукаємо Київ у регіонах
-    kyiv_data = None
-    for region in data['regions']:
-        if region.get('cpu') == 'kyiv':
-            kyiv_data = region
-            break
-    
-    if not kyiv_data or not kyiv_data.get('schedule'):
-        print('⚠️ Дані для Києва не знайдено')
+    queues = schedule.region(region)
+    if not queues:
+        print(f'⚠️ Дані для регіону {get_region_name(region)} не знайдено')
         return
     
-    schedule = kyiv_data['schedule']
-    
     # Перевіряємо чи є наша група
-    if queue in schedule:
-        group_schedule = schedule[queue]
-        
-        for date, times in group_schedule.items():
+    if queue in queues:
+        for date, day in queues[queue].items():
             print(f'\n📅 {date}:')
             
-            # Групуємо інтервали за статусом
-            current_status = None
-            start_time = None
-            
-            sorted_times = sorted(times.items())
-            
-            for time, status in sorted_times:
-                # 0 - дані недоступні, 1 - світло є, 2 - можливе відключення
-                status_text = {
-                    0: '❓ Дані недоступні',
-                    1: '💡 Світло Є',
-                    2: '⚠️ Можливе відключення'
-                }.get(status, 'Невідомо')
-                
-                if status != current_status:
-                    if current_status is not None and start_time is not None:
-                        print(f'  {start_time} - {time}: {prev_status_text}')
-                    start_time = time
-                    current_status = status
-                    prev_status_text = status_text
-            
-            # Додаємо останній інтервал
-            if start_time:
-                print(f'  {start_time} - 24:00: {prev_status_text}')
+            # 0 - дані недоступні, 1 - світло є, 2 - можливе відключення
+            for start, end, status in day.intervals():
+                status_text = STATUS_LABELS.get(status, 'Невідомо')
+                print(f'  {format_minutes(start)} - {format_minutes(end)}: {status_text}')
     else:
         print(f'⚠️ Група {queue} не знайдена в даних')
-        print(f'Доступні групи: {", ".join(schedule.keys())}')
+        print(f'Доступні групи: {", ".join(queues.keys())}')
     
     print(f'{"="*60}\n')
 
 
-def monitor_schedule_api(region='kyiv', queue='2.2', interval_minutes=10):
+def monitor_schedule_api(region='kyiv', queue='2.2', interval_minutes=10, quiet=False):
     """Постійно моніторить графік через API"""
     
     print(f'⚙️ Запуск моніторингу через API')
@@ -151,7 +318,7 @@ def monitor_schedule_api(region='kyiv', queue='2.2', interval_minutes=10):
     try:
         while True:
             print('=' * 60)
-            fetch_schedule_from_api(region, queue)
+            fetch_schedule_from_api(region, queue, quiet)
             print('=' * 60)
             print(f'\n⏳ Наступне оновлення через {interval_minutes} хвилин...\n')
             time.sleep(interval_minutes * 60)
@@ -166,15 +333,19 @@ if __name__ == '__main__':
     region = 'kyiv'
     queue = '2.2'
     
-    if len(sys.argv) > 1:
-        if sys.argv[1] == 'monitor':
-            interval = int(sys.argv[2]) if len(sys.argv) > 2 else 10
-            monitor_schedule_api(region, queue, interval)
+    # --quiet: тільки графік групи, без виводу і запису всієї відповіді
+    quiet = '--quiet' in sys.argv
+    args = [arg for arg in sys.argv[1:] if arg != '--quiet']
+    
+    if args:
+        if args[0] == 'monitor':
+            interval = int(args[1]) if len(args) > 1 else 10
+            monitor_schedule_api(region, queue, interval, quiet)
         else:
             # Використовуємо перший аргумент як групу
-            queue = sys.argv[1]
-            if len(sys.argv) > 2:
-                region = sys.argv[2]
+            queue = args[0]
+            if len(args) > 1:
+                region = args[1]
     
     # Одноразовий запуск
-    fetch_schedule_from_api(region, queue)
+    fetch_schedule_from_api(region, queue, quiet)
@@ -0,0 +1,171 @@
+"""
+"Живі" повідомлення з графіком
+
+Замість нового повідомлення на кожну зміну бот тримає в кожному чаті одне
+закріплене повідомлення на групу і дату та редагує його (editMessageText),
+коли змінився графік цього дня. Окремі короткі повідомлення надсилаються
+лише про суттєві зміни (send_schedule_update) та перед відключеннями.
+
+message_id і хеш показаного графіку зберігаються в StateStore, тому після
+перезапуску бот продовжує редагувати ті самі повідомлення.
+"""
+
+import logging
+from functools import partial
+
+from telegram.error import BadRequest
+
+from render_cache import stamp_updated
+
+logger = logging.getLogger(__name__)
+
+LIVE_VARIANT = 'live'
+
+
+def _error_text(error):
+    return str(error).lower()
+
+
+class LiveMessages:
+    """message_id закріплених повідомлень по (чат, регіон, група, дата)
+
+    На кожен ключ одночасно виконується не більше однієї операції
+    (відправка або редагування); зміни, що прийшли під час неї,
+    застосовуються одним редагуванням після її завершення.
+    """
+
+    def __init__(self, delivery, renders, store=None, pin=True):
+        self.delivery = delivery
+        self.renders = renders
+        self.store = store
+        self.pin = pin
+
+        self._messages = {}  # key -> (message_id, хеш графіку в повідомленні)
+        self._inflight = {}  # key -> хеш, що зараз відправляється
+        self._latest = {}    # key -> (хеш, текст), що надійшли під час відправки
+
+        self.stats = {'sent': 0, 'edited': 0, 'unchanged': 0, 'failed': 0}
+
+    def __len__(self):
+        return len(self._messages)
+
+    def restore(self, messages):
+        """Відновлює {(чат, регіон, група, дата): (message_id, хеш)} після перезапуску"""
+        self._messages.update(messages)
+
+    def refresh(self, schedule, registry, dates, updated_at=None):
+        """Приводить повідомлення всіх підписників у відповідність до знімку
+
+        Редагуються тільки повідомлення, де показаний графік відрізняється
+        від поточного; нові підписники отримують нове повідомлення.
+        updated_at - час отримання знімку для рядка "Оновлено" (None - зараз).
+
+        Returns:
+            Кількість поставлених у чергу відправок і редагувань
+        """
+        submitted = 0
+        for region, queue in registry.keys():
+            days = schedule.queue(region, queue)
+            if not days:
+                continue
+            for date in dates:
+                day = days.get(date)
+                if day is None:
+                    continue
+                text = None
+                for chat_id in registry.chats_for(region, queue):
+                    key = (chat_id, region, queue, date)
+                    if key in self._inflight:
+                        if self._inflight[key] != day.digest:
+                            text = text or self._render(schedule, region, queue, date, updated_at)
+                            self._latest[key] = (day.digest, text)
+                        continue
+                    entry = self._messages.get(key)
+                    if entry is not None and entry[1] == day.digest:
+                        self.stats['unchanged'] += 1
+                        continue
+                    text = text or self._render(schedule, region, queue, date, updated_at)
+                    self._submit(key, day.digest, text)
+                    submitted += 1
+        return submitted
+
+    def _render(self, schedule, region, queue, date, updated_at):
+        return stamp_updated(self.renders.get(schedule, region, queue, date, LIVE_VARIANT), updated_at)
+
+    def expire(self, today):
+        """Відкріплює і забуває повідомлення за дати до today (YYYY-MM-DD)"""
+        expired = [key for key in self._messages if key[3] < today]
+        for key in expired:
+            message_id, _ = self._messages.pop(key)
+            if self.pin:
+                self.delivery.submit(key[0], 'unpin_chat_message', message_id=message_id)
+            if self.store is not None:
+                self.store.delete_live_message(*key)
+        return len(expired)
+
+    def _submit(self, key, digest, text):
+        chat_id = key[0]
+        self._inflight[key] = digest
+        entry = self._messages.get(key)
+        if entry is None:
+            future = self.delivery.send_message(chat_id, text, disable_notification=True)
+            future.add_done_callback(partial(self._on_sent, key, digest))
+        else:
+            future = self.delivery.edit_message(chat_id, entry[0], text)
+            future.add_done_callback(partial(self._on_edited, key, digest, text))
+
+    def _remember(self, key, message_id, digest):
+        self._messages[key] = (message_id, digest)
+        if self.store is not None:
+            self.store.save_live_message(*key, message_id, digest)
+
+    def _done(self, key, digest):
+        """Завершує операцію ключа і застосовує зміни, що надійшли під час неї"""
+        self._inflight.pop(key, None)
+        latest = self._latest.pop(key, None)
+        if latest is not None and latest[0] != digest:
+            self._submit(key, *latest)
+
+    def _on_sent(self, key, digest, future):
+        if future.cancelled() or future.exception() is not None:
+            self.stats['failed'] += 1
+            self._inflight.pop(key, None)
+            self._latest.pop(key, None)
+            return
+
+        message = future.result()
+        self.stats['sent'] += 1
+        self._remember(key, message.message_id, digest)
+        if self.pin:
+            self.delivery.submit(key[0], 'pin_chat_message', message_id=message.message_id,
+                                 disable_notification=True)
+        self._done(key, digest)
+
+    def _on_edited(self, key, digest, text, future):
+        if future.cancelled():
+            self._inflight.pop(key, None)
+            return
+
+        error = future.exception()
+        entry = self._messages.get(key)
+        if error is None or isinstance(error, BadRequest) and 'not modified' in _error_text(error):
+            self.stats['edited'] += 1
+            if entry is not None:
+                self._remember(key, entry[0], digest)
+        elif isinstance(error, BadRequest) and 'not found' in _error_text(error):
+            # Повідомлення видалили в чаті - надсилаємо нове
+            logger.info(f'ℹ️ Живе повідомлення видалено (чат {key[0]}), надсилаю нове')
+            self._messages.pop(key, None)
+            if self.store is not None:
+                self.store.delete_live_message(*key)
+            self._submit(key, digest, text)
+            return
+        else:
+            self.stats['failed'] += 1
+        self._done(key, digest)
+
+    def log_stats(self):
+        logger.info(
+            f'📌 Живі повідомлення: {len(self._messages)}, нових {self.stats["sent"]}, '
+            f'редагувань {self.stats["edited"]}, без змін {self.stats["unchanged"]}, помилок {self.stats["failed"]}'
+        )
@@ -0,0 +1,253 @@
+"""
+Метрики бота у форматі Prometheus
+
+Лічильники, гістограми та значення (gauge) з мітками. Оновлення метрики -
+кілька операцій зі словником, тому їх можна викликати в гарячому коді.
+Текст для Prometheus формується лише при запиті /metrics.
+
+Запуск ендпоінту:
+    server = await serve_metrics('127.0.0.1', 9108)
+"""
+
+import asyncio
+import logging
+import time
+from bisect import bisect_left
+
+from mini_http import serve, Response
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+LAG_CHECK_SECONDS = 1.0
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.values = {}
+
+    def _key(self, labels):
+        if not self.labels:
+            return ()
+        return tuple(labels.get(name, '') for name in self.labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, value in sorted(self.values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, key)} {_format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    """Лічильник, що тільки зростає"""
+
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Значення, що може зростати і зменшуватись (або обчислюється при запиті)"""
+
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, labels=()):
+        super().__init__(name, documentation, labels)
+        self._functions = {}
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+    def set_function(self, function, **labels):
+        """Значення обчислюється function() при кожному запиті /metrics"""
+        self._functions[self._key(labels)] = function
+
+    def render(self):
+        for key, function in self._functions.items():
+            try:
+                value = function()
+            except Exception as e:
+                logger.debug(f'Метрика {self.name}: {e}')
+                continue
+            if value is None:
+                self.values.pop(key, None)
+            else:
+                self.values[key] = value
+        return super().render()
+
+
+class Histogram(Metric):
+    """Розподіл значень по кошиках (кумулятивних при виводі)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self.values.get(key)
+        if state is None:
+            # [лічильники кошиків + кошик +Inf, сума]
+            state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def time(self, **labels):
+        """Контекстний менеджер: записує тривалість блоку"""
+        return _Timer(self, labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for key, (counts, total) in sorted(self.values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}')
+            labels = _format_labels(self.labels, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+class Registry:
+    """Набір метрик процесу"""
+
+    def __init__(self):
+        self.metrics = {}
+
+    def _get_or_create(self, cls, name, documentation, **kwargs):
+        metric = self.metrics.get(name)
+        if metric is None:
+            metric = self.metrics[name] = cls(name, documentation, **kwargs)
+        return metric
+
+    def counter(self, name, documentation, labels=()):
+        return self._get_or_create(Counter, name, documentation, labels=labels)
+
+    def gauge(self, name, documentation, labels=()):
+        return self._get_or_create(Gauge, name, documentation, labels=labels)
+
+    def histogram(self, name, documentation, labels=(), buckets=LATENCY_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labels=labels, buckets=buckets)
+
+    def render(self):
+        lines = []
+        for metric in self.metrics.values():
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+# Запити до API
+FETCH_SECONDS = REGISTRY.histogram(
+    'svitlo_fetch_seconds', 'Тривалість запиту до endpoint API', labels=('endpoint', 'outcome'))
+HEDGED_REQUESTS = REGISTRY.counter('svitlo_hedged_requests_total', 'Запити до резервного endpoint через hedging')
+NOT_MODIFIED = REGISTRY.counter('svitlo_not_modified_total', 'Відповіді 304 Not Modified')
+PAYLOAD_BYTES = REGISTRY.histogram('svitlo_payload_bytes', 'Розмір відповіді API (байти)', buckets=BYTES_BUCKETS)
+PARSE_SECONDS = REGISTRY.histogram('svitlo_parse_seconds', 'Тривалість розбору відповіді API', labels=('stage',))
+ENDPOINT_OPEN = REGISTRY.gauge('svitlo_endpoint_open', '1 - endpoint вимкнено circuit breaker', labels=('endpoint',))
+SCHEDULE_AGE = REGISTRY.gauge('svitlo_schedule_age_seconds', 'Вік останнього підтвердженого знімку графіку')
+
+# Зміни графіку
+SCHEDULE_CHANGES = REGISTRY.counter(
+    'svitlo_schedule_changes_total', 'Зміни графіку груп', labels=('kind',))
+WINDOW_CHANGES = REGISTRY.counter(
+    'svitlo_window_changes_total', 'Змінені вікна відключень', labels=('change',))
+
+# Telegram
+TELEGRAM_REQUEST_SECONDS = REGISTRY.histogram(
+    'telegram_request_seconds', 'Тривалість виклику Bot API', labels=('method', 'outcome'))
+TELEGRAM_MESSAGES = REGISTRY.counter('telegram_messages_total', 'Результати доставки', labels=('result',))
+DELIVERY_LATENCY = REGISTRY.histogram(
+    'telegram_delivery_seconds', 'Час від постановки в чергу до відправки',
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300))
+DELIVERY_PENDING = REGISTRY.gauge('telegram_delivery_pending', 'Повідомлень у черзі відправки')
+TELEGRAM_UPDATES = REGISTRY.counter(
+    'telegram_updates_total', 'Отримані оновлення Telegram', labels=('source', 'result'))
+UPDATE_QUEUE_DEPTH = REGISTRY.gauge('telegram_update_queue_depth', 'Оновлень webhook у черзі обробки')
+
+# Попередження та цикл
+WARNING_LATENESS = REGISTRY.histogram(
+    'svitlo_warning_lateness_seconds', 'Запізнення попередження відносно запланованого часу',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30))
+LOOP_ITERATION_SECONDS = REGISTRY.histogram('svitlo_loop_iteration_seconds', 'Тривалість циклу опитування')
+LOOP_OVERSLEEP_SECONDS = REGISTRY.histogram(
+    'svitlo_loop_oversleep_seconds', 'Запізнення пробудження циклу відносно запланованого')
+EVENT_LOOP_LAG = REGISTRY.histogram(
+    'svitlo_event_loop_lag_seconds', 'Затримка event loop (запізнення таймера)',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5))
+
+
+async def monitor_event_loop_lag(interval=LAG_CHECK_SECONDS):
+    """Фонова задача: наскільки запізнюються таймери event loop"""
+    loop = asyncio.get_running_loop()
+    while True:
+        started = loop.time()
+        await asyncio.sleep(interval)
+        EVENT_LOOP_LAG.observe(max(0.0, loop.time() - started - interval))
+
+
+async def serve_metrics(host='127.0.0.1', port=9108, registry=REGISTRY, debug=None):
+    """Запускає HTTP ендпоінт /metrics
+
+    debug - обробник запитів /debug/... (наприклад, Profiler.handle_request)
+    """
+
+    async def handler(request):
+        if debug is not None and request.path.startswith('/debug/'):
+            return await debug(request)
+        if request.path != '/metrics':
+            return Response(404, 'not found', 'text/plain')
+        return Response(200, registry.render(), 'text/plain; version=0.0.4; charset=utf-8')
+
+    server = await serve(handler, host, port)
+    logger.info(f'📈 Метрики: http://{host}:{port}/metrics')
+    return server
@@ -0,0 +1,146 @@
+"""
+Мінімальний асинхронний HTTP/1.1 сервер на asyncio
+
+Без зовнішніх залежностей: розбір запиту, keep-alive, Content-Length.
+Використовується тестовим сервером API, ендпоінтом метрик та webhook.
+"""
+
+import asyncio
+import json
+import logging
+from urllib.parse import urlsplit, parse_qsl
+
+logger = logging.getLogger(__name__)
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 10 * 1024 * 1024
+
+REASONS = {
+    200: 'OK',
+    202: 'Accepted',
+    204: 'No Content',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    401: 'Unauthorized',
+    403: 'Forbidden',
+    404: 'Not Found',
+    409: 'Conflict',
+    413: 'Payload Too Large',
+    429: 'Too Many Requests',
+    500: 'Internal Server Error',
+    502: 'Bad Gateway',
+    503: 'Service Unavailable',
+}
+
+
+class Request:
+    """Розібраний HTTP запит"""
+
+    def __init__(self, method, target, headers, body):
+        self.method = method
+        self.target = target
+        parts = urlsplit(target)
+        self.path = parts.path
+        self.query = dict(parse_qsl(parts.query))
+        self.headers = headers  # ключі в нижньому регістрі
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body.decode('utf-8'))
+
+    def form(self):
+        """Параметри з тіла application/x-www-form-urlencoded або JSON"""
+        if not self.body:
+            return {}
+        if self.headers.get('content-type', '').startswith('application/json'):
+            return self.json()
+        return dict(parse_qsl(self.body.decode('utf-8')))
+
+
+class Response:
+    """HTTP відповідь"""
+
+    def __init__(self, status=200, body=b'', content_type='application/json', headers=None):
+        self.status = status
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+        self.headers = dict(headers or {})
+        if content_type and status != 304:
+            self.headers.setdefault('Content-Type', content_type)
+
+
+def json_response(data, status=200, headers=None):
+    return Response(status, json.dumps(data, ensure_ascii=False), headers=headers)
+
+
+async def read_request(reader):
+    """Читає один запит з потоку (None - з'єднання закрите)"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except (asyncio.IncompleteReadError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise ValueError('заголовки завеликі')
+
+    lines = head.decode('latin-1').split('\r\n')
+    method, target, _ = lines[0].split(' ', 2)
+
+    headers = {}
+    for line in lines[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+
+    length = int(headers.get('content-length', 0) or 0)
+    if length > MAX_BODY_BYTES:
+        raise ValueError('тіло запиту завелике')
+    body = await reader.readexactly(length) if length else b''
+
+    return Request(method, target, headers, body)
+
+
+def write_response(writer, response, keep_alive=True):
+    reason = REASONS.get(response.status, 'Unknown')
+    headers = dict(response.headers)
+    headers['Content-Length'] = str(len(response.body))
+    headers['Connection'] = 'keep-alive' if keep_alive else 'close'
+
+    head = f'HTTP/1.1 {response.status} {reason}\r\n'
+    head += ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+    writer.write(head.encode('latin-1') + b'\r\n' + response.body)
+
+
+async def serve(handler, host='127.0.0.1', port=8080):
+    """Запускає сервер; handler(request) -> Response
+
+    Returns:
+        asyncio.Server (зупинка: server.close(); await server.wait_closed())
+    """
+
+    async def on_connection(reader, writer):
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except ValueError as e:
+                    write_response(writer, Response(400, str(e), 'text/plain'), keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                try:
+                    response = await handler(request)
+                except Exception as e:
+                    logger.error(f'❌ Помилка обробки {request.method} {request.path}: {e}')
+                    response = Response(500, 'internal error', 'text/plain')
+
+                keep_alive = request.headers.get('connection', '').lower() != 'close'
+                write_response(writer, response, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(on_connection, host, port, limit=MAX_HEADER_BYTES)
@@ -0,0 +1,260 @@
+"""
+Локальний тестовий сервер API svitlo.live та Telegram Bot API
+
+Імітує обидва endpoint графіку (proxy та asistant.php) і Telegram Bot API,
+щоб навантажувальні та аварійні сценарії бота можна було перевіряти
+офлайн на одній машині. Підтримує інжекцію затримок, помилок 5xx,
+обрізаного JSON, 429 від Telegram та зміни графіку за таймлайном.
+
+Запуск:
+    python mock_server.py --port 8081 --latency 200 --error-rate 0.1
+    python mock_server.py --payload schedule_api.json --timeline timeline.json
+
+Бот налаштовується на сервер через змінні оточення:
+    SVITLO_API_URL=http://127.0.0.1:8081/
+    SVITLO_ALT_API_URL=http://127.0.0.1:8081/api/asistant.php
+    TELEGRAM_BASE_URL=http://127.0.0.1:8081/bot
+
+Таймлайн - JSON список подій з часом від старту сервера (секунди):
+    [{"at": 60, "mutate": 3},
+     {"at": 120, "endpoint": "primary", "error_rate": 1.0},
+     {"at": 300, "endpoint": "primary", "error_rate": 0, "latency_ms": 2000},
+     {"at": 400, "telegram_429_rate": 0.2}]
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from collections import Counter
+
+from mini_http import serve, Response, json_response
+from payload_generator import generate_payload, mutate_payload
+
+logger = logging.getLogger(__name__)
+
+ALT_API_PATH = '/api/asistant.php'
+
+
+class FaultConfig:
+    """Налаштування збоїв для одного endpoint"""
+
+    def __init__(self, latency_ms=0, jitter_ms=0, error_rate=0.0, truncate_rate=0.0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+
+    def update(self, event):
+        for name in ('latency_ms', 'jitter_ms', 'error_rate', 'truncate_rate'):
+            if name in event:
+                setattr(self, name, event[name])
+
+
+class MockUpstream:
+    """Стан тестового сервера: поточна відповідь API, збої, статистика"""
+
+    def __init__(self, payload, primary, fallback, telegram_429_rate=0.0, retry_after=1, seed=0):
+        self.rng = random.Random(seed)
+        self.faults = {'primary': primary, 'fallback': fallback}
+        self.telegram_429_rate = telegram_429_rate
+        self.retry_after = retry_after
+
+        self.stats = Counter()
+        self.messages_by_chat = Counter()
+        self.message_id = 0
+        self.started = time.monotonic()
+        self.set_payload(payload)
+
+    def set_payload(self, payload):
+        self.payload = payload
+        self.body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.etag = '"' + hashlib.blake2b(self.body, digest_size=8).hexdigest() + '"'
+
+    def mutate(self, changes):
+        changed = mutate_payload(self.payload, self.rng, changes)
+        self.set_payload(self.payload)
+        self.stats['mutations'] += len(changed)
+        logger.info(f'🔀 Графік змінено: {changed}')
+
+    async def handle(self, request):
+        if request.path.startswith('/bot'):
+            return await self.handle_telegram(request)
+        if request.path == ALT_API_PATH:
+            return await self.handle_schedule(request, 'fallback')
+        if request.path == '/stats':
+            return json_response(self.snapshot_stats())
+        if request.path in ('/', ''):
+            return await self.handle_schedule(request, 'primary')
+        return Response(404, 'not found', 'text/plain')
+
+    async def handle_schedule(self, request, endpoint):
+        fault = self.faults[endpoint]
+        self.stats[f'{endpoint}_requests'] += 1
+
+        delay = fault.latency_ms + self.rng.uniform(0, fault.jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+
+        if self.rng.random() < fault.error_rate:
+            self.stats[f'{endpoint}_errors'] += 1
+            return Response(self.rng.choice((500, 502, 503)), 'upstream error', 'text/plain')
+
+        if request.headers.get('if-none-match') == self.etag:
+            self.stats[f'{endpoint}_not_modified'] += 1
+            return Response(304, headers={'ETag': self.etag})
+
+        body = self.body
+        if self.rng.random() < fault.truncate_rate:
+            self.stats[f'{endpoint}_truncated'] += 1
+            body = body[:self.rng.randrange(1, len(body))]
+
+        self.stats[f'{endpoint}_bytes'] += len(body)
+        return Response(200, body, headers={'ETag': self.etag})
+
+    async def handle_telegram(self, request):
+        # /bot<token>/<method>
+        method = request.path.rsplit('/', 1)[-1]
+        params = request.form()
+        self.stats[f'telegram_{method}'] += 1
+
+        if method in ('sendMessage', 'editMessageText') and self.rng.random() < self.telegram_429_rate:
+            self.stats['telegram_429'] += 1
+            return json_response({
+                'ok': False,
+                'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after}
+            }, status=429)
+
+        if method == 'getMe':
+            result = {'id': 1, 'is_bot': True, 'first_name': 'Mock', 'username': 'mock_light_bot'}
+        elif method == 'getUpdates':
+            # Нових оновлень немає: імітуємо long polling, але не довше секунди
+            await asyncio.sleep(min(float(params.get('timeout', 0) or 0), 1))
+            result = []
+        elif method in ('sendMessage', 'editMessageText'):
+            chat_id = params.get('chat_id', '0')
+            self.messages_by_chat[chat_id] += 1
+            if method == 'sendMessage':
+                self.message_id += 1
+            result = {
+                'message_id': int(params.get('message_id', self.message_id)),
+                'date': int(time.time()),
+                'chat': {'id': int(chat_id), 'type': 'group' if chat_id.startswith('-') else 'private'},
+                'text': params.get('text', '')
+            }
+        else:
+            result = True
+
+        return json_response({'ok': True, 'result': result})
+
+    def snapshot_stats(self):
+        return {
+            'uptime': round(time.monotonic() - self.started, 1),
+            'counters': dict(self.stats),
+            'chats': len(self.messages_by_chat),
+            'messages': sum(self.messages_by_chat.values())
+        }
+
+    async def run_timeline(self, events):
+        """Застосовує події таймлайну у вказаний час"""
+        for event in sorted(events, key=lambda e: e.get('at', 0)):
+            delay = event.get('at', 0) - (time.monotonic() - self.started)
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            logger.info(f'⏱️ Подія таймлайну: {event}')
+            if event.get('mutate'):
+                self.mutate(int(event['mutate']))
+            if 'telegram_429_rate' in event:
+                self.telegram_429_rate = event['telegram_429_rate']
+            endpoints = [event['endpoint']] if 'endpoint' in event else list(self.faults)
+            for endpoint in endpoints:
+                self.faults[endpoint].update(event)
+
+
+def write_subscriptions(path, chats, seed=0):
+    """Створює файл підписок з chats фейковими чатами (для навантаження)"""
+    rng = random.Random(seed)
+    payload = generate_payload(regions=1)
+    queues = list(payload['regions'][0]['schedule'])
+    data = {'chats': {str(100000 + i): [['kyiv', rng.choice(queues)]] for i in range(chats)}}
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(data, f)
+
+
+async def main_async(args):
+    if args.payload:
+        with open(args.payload, 'r', encoding='utf-8') as f:
+            payload = json.load(f)
+    else:
+        payload = generate_payload(regions=args.regions, days=args.days, seed=args.seed)
+
+    upstream = MockUpstream(
+        payload,
+        primary=FaultConfig(args.latency, args.jitter, args.error_rate, args.truncate_rate),
+        fallback=FaultConfig(args.fallback_latency, args.jitter, args.fallback_error_rate, 0.0),
+        telegram_429_rate=args.telegram_429_rate,
+        seed=args.seed
+    )
+
+    server = await serve(upstream.handle, args.host, args.port)
+    logger.info(f'🧪 Тестовий сервер: http://{args.host}:{args.port}/ '
+                f'(fallback {ALT_API_PATH}, Telegram /bot<token>/, статистика /stats)')
+
+    tasks = []
+    if args.timeline:
+        with open(args.timeline, 'r', encoding='utf-8') as f:
+            tasks.append(asyncio.ensure_future(upstream.run_timeline(json.load(f))))
+
+    try:
+        while True:
+            await asyncio.sleep(args.stats_interval)
+            logger.info(f'📊 {upstream.snapshot_stats()}')
+    finally:
+        for task in tasks:
+            task.cancel()
+        server.close()
+        await server.wait_closed()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Тестовий сервер API svitlo.live та Telegram Bot API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--payload', help='записана відповідь API (JSON); інакше - згенерована')
+    parser.add_argument('--regions', type=int, default=None, help='кількість згенерованих регіонів')
+    parser.add_argument('--days', type=int, default=2, help='кількість згенерованих днів')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--latency', type=float, default=0, help='затримка primary (мс)')
+    parser.add_argument('--jitter', type=float, default=0, help='випадкова добавка до затримки (мс)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='частка відповідей 5xx (primary)')
+    parser.add_argument('--truncate-rate', type=float, default=0.0, help='частка обрізаного JSON (primary)')
+    parser.add_argument('--fallback-latency', type=float, default=0, help='затримка fallback (мс)')
+    parser.add_argument('--fallback-error-rate', type=float, default=0.0, help='частка 5xx (fallback)')
+    parser.add_argument('--telegram-429-rate', type=float, default=0.0, help='частка відповідей 429 Telegram')
+    parser.add_argument('--timeline', help='JSON файл з подіями таймлайну')
+    parser.add_argument('--stats-interval', type=float, default=30, help='інтервал виводу статистики (с)')
+    parser.add_argument('--write-subscriptions', type=int, metavar='N',
+                        help='створити subscriptions.json з N фейковими чатами і вийти')
+    args = parser.parse_args()
+
+    logging.basicConfig(format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', level=logging.INFO)
+
+    if args.write_subscriptions:
+        write_subscriptions('subscriptions.json', args.write_subscriptions, args.seed)
+        print(f'💾 subscriptions.json: {args.write_subscriptions} чатів')
+        return
+
+    try:
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        print('\n⛔ Сервер зупинено')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,112 @@
+"""
+Генератор синтетичних відповідей API svitlo.live
+
+Створює відповіді у форматі API ({'regions': [{'cpu', 'schedule'}]}) для
+всіх регіонів, 12 груп і 48 півгодинних слотів на кілька днів уперед.
+Використовується бенчмарками та тестовим сервером замість реального API.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+REGIONS = [
+    ('kyiv', 'Київ'),
+    ('kiivska-oblast', 'Київська область'),
+    ('dnipropetrovska-oblast', 'Дніпропетровська область'),
+    ('odeska-oblast', 'Одеська область'),
+    ('kharkivska-oblast', 'Харківська область'),
+    ('lvivska-oblast', 'Львівська область'),
+    ('zaporizka-oblast', 'Запорізька область'),
+    ('poltavska-oblast', 'Полтавська область'),
+    ('vinnytska-oblast', 'Вінницька область'),
+    ('zhytomyrska-oblast', 'Житомирська область'),
+    ('cherkaska-oblast', 'Черкаська область'),
+    ('chernihivska-oblast', 'Чернігівська область'),
+    ('sumska-oblast', 'Сумська область'),
+    ('khmelnytska-oblast', 'Хмельницька область'),
+    ('rivnenska-oblast', 'Рівненська область'),
+    ('volynska-oblast', 'Волинська область'),
+    ('ternopilska-oblast', 'Тернопільська область'),
+    ('ivano-frankivska-oblast', 'Івано-Франківська область'),
+    ('zakarpatska-oblast', 'Закарпатська область'),
+    ('chernivetska-oblast', 'Чернівецька область'),
+    ('kirovohradska-oblast', 'Кіровоградська область'),
+    ('mykolaivska-oblast', 'Миколаївська область'),
+    ('khersonska-oblast', 'Херсонська область'),
+    ('donetska-oblast', 'Донецька область'),
+]
+
+QUEUES = [f'{group}.{sub}' for group in range(1, 7) for sub in (1, 2)]
+SLOT_MINUTES = 30
+
+
+def generate_day(rng, outage_blocks=3, unknown_probability=0.05):
+    """Графік на одну добу: {"HH:MM": статус} для 48 півгодинних слотів"""
+    statuses = [1] * (24 * 60 // SLOT_MINUTES)
+
+    for _ in range(rng.randint(0, outage_blocks)):
+        start = rng.randrange(len(statuses))
+        length = rng.choice((2, 4, 6, 8))
+        for slot in range(start, min(start + length, len(statuses))):
+            statuses[slot] = 2
+
+    if rng.random() < unknown_probability:
+        start = rng.randrange(len(statuses))
+        for slot in range(start, len(statuses)):
+            statuses[slot] = 0
+
+    return {
+        f'{slot * SLOT_MINUTES // 60:02d}:{slot * SLOT_MINUTES % 60:02d}': status
+        for slot, status in enumerate(statuses)
+    }
+
+
+def generate_payload(regions=None, queues=None, days=2, start_date=None, seed=0):
+    """Повертає синтетичну відповідь API
+
+    Args:
+        regions: кількість регіонів зі списку REGIONS (None - всі)
+        queues: кількість груп (None - всі 12)
+        days: кількість днів, починаючи з start_date
+        start_date: перша дата (datetime.date, за замовчуванням - сьогодні)
+        seed: зерно генератора для відтворюваності
+    """
+    rng = random.Random(seed)
+    start_date = start_date or datetime.now().date()
+    dates = [(start_date + timedelta(days=offset)).strftime('%Y-%m-%d') for offset in range(days)]
+
+    region_list = REGIONS if regions is None else REGIONS[:regions]
+    queue_list = QUEUES if queues is None else QUEUES[:queues]
+
+    return {
+        'date_today': dates[0],
+        'regions': [
+            {
+                'cpu': cpu,
+                'name_ua': name,
+                'schedule': {
+                    queue: {date: generate_day(rng) for date in dates}
+                    for queue in queue_list
+                }
+            }
+            for cpu, name in region_list
+        ]
+    }
+
+
+def mutate_payload(payload, rng, changes=1):
+    """Змінює випадкові слоти у відповіді (імітація оновлення графіку)
+
+    Returns:
+        Список змінених (регіон, група, дата, час)
+    """
+    changed = []
+    for _ in range(changes):
+        region = rng.choice(payload['regions'])
+        queue = rng.choice(list(region['schedule']))
+        date = rng.choice(list(region['schedule'][queue]))
+        day = region['schedule'][queue][date]
+        time_str = rng.choice(list(day))
+        day[time_str] = 1 if day[time_str] == 2 else 2
+        changed.append((region['cpu'], queue, date, time_str))
+    return changed
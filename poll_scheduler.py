@@ -0,0 +1,143 @@
+"""
+Адаптивний планувальник опитування API
+
+Замість фіксованого інтервалу затримка до наступного запиту залежить від:
+- недавніх змін (зміни приходять серіями - після зміни опитуємо частіше);
+- погодинної історії змін (у "гарячі" години частіше, вночі рідше);
+- відсутності графіку на завтра після початку вечірньої публікації;
+- помилок API (експоненційна затримка, при нестабільному API не частіше базового).
+До затримки додається випадковий розкид. Щоденні повідомлення від
+опитування не залежать - DigestScheduler сам оновлює знімок, якщо той застарів.
+"""
+
+import logging
+import random
+from collections import deque
+from datetime import timedelta
+
+import clock
+
+logger = logging.getLogger(__name__)
+
+MIN_POLL_SECONDS = 120
+MAX_POLL_SECONDS = 60 * 60
+RECENT_CHANGE_SECONDS = 45 * 60  # Скільки після зміни опитуємо з мінімальним інтервалом
+QUIET_SECONDS = 3 * 60 * 60  # Скільки без змін вважається "тихим" періодом
+TOMORROW_EXPECTED_HOUR = 16  # З цієї години чекаємо публікацію графіку на завтра
+NIGHT_HOURS = range(0, 6)
+JITTER = 0.1  # Випадковий розкид затримки (частка)
+ERROR_WINDOW = 20  # Скільки останніх запитів враховується в частці помилок
+HIGH_ERROR_RATE = 0.3
+
+
+class PollScheduler:
+    """Обчислює затримку до наступного опитування API"""
+
+    def __init__(self, base_seconds, min_seconds=MIN_POLL_SECONDS, max_seconds=MAX_POLL_SECONDS, rng=None):
+        self.base = base_seconds
+        self.min = min(min_seconds, base_seconds)
+        self.max = max(max_seconds, base_seconds)
+        self.rng = rng or random.Random()
+
+        self.changes_by_hour = [0] * 24
+        self.last_change = None
+        self.tomorrow_missing = False
+        self.consecutive_errors = 0
+        self.outcomes = deque(maxlen=ERROR_WINDOW)
+
+        self._digests = {}
+
+    def seed_hours(self, counts):
+        """Додає погодинну історію змін (наприклад, з архіву графіків)"""
+        for hour, count in counts.items():
+            self.changes_by_hour[int(hour) % 24] += count
+
+    def error_rate(self):
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def observe(self, schedule, keys, ok=True, now=None):
+        """Враховує результат опитування
+
+        Args:
+            schedule: поточний знімок Schedule (може бути None)
+            keys: (регіон, група), графіки яких відстежуються
+            ok: чи вдався запит до API
+            now: час опитування
+
+        Returns:
+            True, якщо графік відстежуваних груп змінився або з'явився новий день
+        """
+        now = now or clock.now()
+        self.outcomes.append(bool(ok))
+        if not ok:
+            self.consecutive_errors += 1
+            return False
+        self.consecutive_errors = 0
+
+        if schedule is None:
+            return False
+
+        tomorrow = (now + timedelta(days=1)).strftime('%Y-%m-%d')
+        changed = False
+        missing = False
+        for key in keys:
+            days = schedule.queue(*key) or {}
+            digests = {date: day.digest for date, day in days.items()}
+            missing = missing or tomorrow not in digests
+
+            # Перше спостереження групи - не зміна; зникнення минулих дат - теж
+            previous = self._digests.get(key)
+            if previous is not None and any(previous.get(date) != digest for date, digest in digests.items()):
+                changed = True
+            self._digests[key] = digests
+
+        self.tomorrow_missing = missing
+        if changed:
+            self.last_change = now
+            self.changes_by_hour[now.hour] += 1
+        return changed
+
+    def _hour_activity(self, hour):
+        """Активність години відносно середньої (1.0 - середня, None - мало історії)"""
+        total = sum(self.changes_by_hour)
+        if total < 24:
+            return None
+        return self.changes_by_hour[hour] * 24 / total
+
+    def next_delay(self, now=None):
+        """Повертає (затримка в секундах, причина)"""
+        now = now or clock.now()
+        activity = self._hour_activity(now.hour)
+        since_change = (now - self.last_change).total_seconds() if self.last_change else None
+
+        if self.consecutive_errors:
+            delay = self.base * 2 ** (self.consecutive_errors - 1)
+            reason = f'помилки API ({self.consecutive_errors} поспіль)'
+        elif since_change is not None and since_change < RECENT_CHANGE_SECONDS:
+            delay = self.min
+            reason = 'графік нещодавно змінювався'
+        elif self.tomorrow_missing and now.hour >= TOMORROW_EXPECTED_HOUR:
+            delay = max(self.min, self.base / 3)
+            reason = 'очікую графік на завтра'
+        elif activity is not None and activity >= 2:
+            delay = max(self.min, self.base / 2)
+            reason = 'година частих змін'
+        elif now.hour in NIGHT_HOURS and not activity and (since_change is None or since_change > QUIET_SECONDS):
+            delay = self.max
+            reason = 'ніч без змін'
+        elif since_change is not None and since_change > QUIET_SECONDS and activity is not None and activity < 0.5:
+            delay = self.base * 2
+            reason = 'тихий період'
+        else:
+            delay = self.base
+            reason = 'базовий інтервал'
+
+        # Нестабільне API не опитуємо частіше базового інтервалу
+        if self.error_rate() >= HIGH_ERROR_RATE:
+            delay = max(delay, self.base)
+
+        delay *= self.rng.uniform(1 - JITTER, 1 + JITTER)
+        delay = min(max(delay, self.min), self.max)
+        return delay, reason
@@ -0,0 +1,358 @@
+"""
+Профілювання живого циклу моніторингу без перезапуску бота
+
+- Етапи кожної ітерації циклу (fetch, parse, diff, render, send, archive,
+  flush) - по рядку JSON на ітерацію у PROFILE_DIR/loop_spans.jsonl
+  (PROFILE_SPANS=1).
+- Семплюючий профайлер: потік раз на SAMPLE_INTERVAL_SECONDS знімає стек
+  потоку event loop і пише файл у форматі speedscope (https://speedscope.app).
+- cProfile на вікно часу - файл .pstats (python -m pstats, snakeviz).
+- Сторож event loop (SLOW_CALLBACK_SECONDS > 0): якщо колбек блокує loop
+  довше порогу, в лог і в loop_spans.jsonl пишеться стек, на якому loop стоїть.
+
+Етапи і сторож вмикаються змінними середовища: за замовчуванням цикл не
+платить за профілювання нічого. Завжди підключені лише точки запуску вікна
+профілю: сигнали (SIGUSR1 - speedscope, SIGUSR2 - cProfile) і запит
+GET /debug/profile?seconds=30&format=speedscope|pstats до ендпоінту метрик.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from mini_http import Response, json_response
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DIR = os.getenv('PROFILE_DIR', 'profiles')
+PROFILE_SECONDS = float(os.getenv('PROFILE_SECONDS') or 30)  # Тривалість вікна профілю за замовчуванням
+MAX_PROFILE_SECONDS = 600
+SAMPLE_INTERVAL_SECONDS = 0.005
+SLOW_CALLBACK_SECONDS = float(os.getenv('SLOW_CALLBACK_SECONDS') or 0)  # 0 - сторож вимкнено
+PROFILE_SPANS = os.getenv('PROFILE_SPANS', '').lower() in ('1', 'true', 'yes')  # Писати loop_spans.jsonl
+SPANS_MAX_BYTES = 5 * 1024 * 1024  # Після цього loop_spans.jsonl перейменовується на .1
+ASYNCIO_DEBUG = os.getenv('ASYNCIO_DEBUG', '').lower() in ('1', 'true', 'yes')
+
+# Етапи поточної ітерації: {назва: секунди} або None поза ітерацією
+_spans = contextvars.ContextVar('profiling_spans', default=None)
+
+
+def _write_line(path, record):
+    """Дописує рядок JSON, ротуючи файл після SPANS_MAX_BYTES"""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    try:
+        if os.path.getsize(path) > SPANS_MAX_BYTES:
+            os.replace(path, path + '.1')
+    except OSError:
+        pass
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+@contextmanager
+def span(name):
+    """Додає тривалість блоку до етапу name поточної ітерації
+
+    Поза ітерацією (команди, фонові задачі) нічого не записує. Етапи
+    можуть бути вкладеними: fetch включає parse.
+    """
+    spans = _spans.get()
+    if spans is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        spans[name] = spans.get(name, 0.0) + time.perf_counter() - started
+
+
+class LoopSpans:
+    """Запис етапів ітерацій циклу у JSONL (enabled=False - нічого не міряє)"""
+
+    def __init__(self, directory=PROFILE_DIR, enabled=PROFILE_SPANS):
+        self.path = os.path.join(directory, 'loop_spans.jsonl')
+        self.enabled = enabled
+        self.iterations = 0
+
+    @contextmanager
+    def iteration(self, **extra):
+        """Обгортка однієї ітерації; extra - додаткові поля запису"""
+        if not self.enabled:
+            yield None
+            return
+        self.iterations += 1
+        spans = {}
+        token = _spans.set(spans)
+        started = time.time()
+        started_perf = time.perf_counter()
+        try:
+            yield spans
+        finally:
+            _spans.reset(token)
+            record = {
+                'started': round(started, 3),
+                'iteration': self.iterations,
+                'total': round(time.perf_counter() - started_perf, 6),
+                'spans': {name: round(seconds, 6) for name, seconds in spans.items()},
+            }
+            record.update(extra)
+            try:
+                _write_line(self.path, record)
+            except OSError as e:
+                logger.warning(f'⚠️ Не вдалося записати етапи циклу: {e}')
+
+
+class SamplingProfile:
+    """Вікно семплюючого профілю потоку event loop у форматі speedscope"""
+
+    def __init__(self, thread_id, seconds, path, interval=SAMPLE_INTERVAL_SECONDS):
+        self.thread_id = thread_id
+        self.seconds = seconds
+        self.path = path
+        self.interval = interval
+        self.frames = []
+        self._frame_index = {}
+        self.samples = []
+        self.weights = []
+
+    def _frame(self, code):
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            self.frames.append({'name': key[0], 'file': key[1], 'line': key[2]})
+        return index
+
+    def _stack(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(self._frame(frame.f_code))
+            frame = frame.f_back
+        stack.reverse()  # speedscope: від кореня до листа
+        return stack
+
+    def run(self):
+        """Збирає семпли (виконується в окремому потоці) і пише файл"""
+        started = previous = time.perf_counter()
+        deadline = started + self.seconds
+        while previous < deadline:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.thread_id)
+            current = time.perf_counter()
+            if frame is not None:
+                self.samples.append(self._stack(frame))
+                self.weights.append(current - previous)
+            previous = current
+        del frame
+        self.save(previous - started)
+
+    def save(self, duration):
+        name = os.path.basename(self.path)
+        document = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'shared': {'frames': self.frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': 'event loop',
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': duration,
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+            'name': name,
+            'exporter': 'light-bot profiling.py',
+        }
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(document, f)
+        os.replace(self.path + '.tmp', self.path)
+        logger.info(f'🔬 Профіль speedscope: {self.path} (семплів {len(self.samples)})')
+
+
+class LoopWatchdog:
+    """Сторож event loop: ловить колбеки, що блокують loop
+
+    Задача в loop раз на чверть порогу оновлює мітку часу; потік перевіряє,
+    чи мітка не застаріла. Якщо застаріла - loop зайнятий синхронним кодом,
+    і стек його потоку показує, яким саме.
+    """
+
+    def __init__(self, loop, threshold, spans_path):
+        self.loop = loop
+        self.threshold = threshold
+        self.spans_path = spans_path
+        self.thread_id = threading.get_ident()
+        self.heartbeat = time.monotonic()
+        self.stalls = 0
+        self._stop = threading.Event()
+        self._task = None
+        self._thread = None
+
+    async def _beat(self):
+        while True:
+            self.heartbeat = time.monotonic()
+            await asyncio.sleep(self.threshold / 4)
+
+    def _stack(self):
+        frame = sys._current_frames().get(self.thread_id)
+        stack = []
+        while frame is not None and len(stack) < 40:
+            code = frame.f_code
+            stack.append(f'{code.co_filename}:{frame.f_lineno} {code.co_name}')
+            frame = frame.f_back
+        return stack
+
+    def _report(self, heartbeat, stack):
+        # Блокування тривало від пропущеного такту до наступної мітки
+        blocked = self.heartbeat - heartbeat - self.threshold / 4
+        self.stalls += 1
+        logger.warning(f'🐢 Event loop заблоковано на {blocked * 1000:.0f} мс: '
+                       f'{stack[0] if stack else "?"}')
+        try:
+            _write_line(self.spans_path, {
+                'started': round(time.time() - (time.monotonic() - heartbeat), 3),
+                'slow_callback': round(blocked, 6),
+                'stack': stack,
+            })
+        except OSError:
+            pass
+
+    def _watch(self):
+        stalled = None  # (мітка, на якій loop зупинився, стек під час блокування)
+        while not self._stop.wait(self.threshold / 4):
+            heartbeat = self.heartbeat
+            if stalled is not None and heartbeat != stalled[0]:
+                self._report(*stalled)
+                stalled = None
+            if stalled is None and time.monotonic() - heartbeat >= self.threshold:
+                # Стек знімаємо, поки loop ще стоїть; пишемо, коли відпустить
+                stalled = (heartbeat, self._stack())
+
+    def start(self):
+        self._task = self.loop.create_task(self._beat())
+        self._thread = threading.Thread(target=self._watch, name='loop-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+
+class Profiler:
+    """Точки профілювання процесу: етапи циклу, вікна профілю, сторож loop"""
+
+    def __init__(self, directory=PROFILE_DIR, slow_callback=SLOW_CALLBACK_SECONDS, spans=PROFILE_SPANS):
+        self.directory = directory
+        self.slow_callback = slow_callback
+        self.spans = LoopSpans(directory, spans)
+        self.loop = None
+        self.thread_id = None
+        self.watchdog = None
+        self.active = None  # Шлях файлу профілю, що збирається зараз
+        self._signals = []
+
+    def iteration(self, **extra):
+        return self.spans.iteration(**extra)
+
+    def start(self):
+        """Підключає сигнали (і сторож, якщо ввімкнено) до поточного event loop"""
+        self.loop = asyncio.get_running_loop()
+        self.thread_id = threading.get_ident()
+
+        if ASYNCIO_DEBUG:
+            # Стандартний лог asyncio про повільні колбеки (з дебаг-накладними витратами)
+            self.loop.set_debug(True)
+            self.loop.slow_callback_duration = self.slow_callback or 0.1
+        if self.slow_callback > 0:
+            self.watchdog = LoopWatchdog(self.loop, self.slow_callback, self.spans.path)
+            self.watchdog.start()
+
+        for name, profile_format in (('SIGUSR1', 'speedscope'), ('SIGUSR2', 'pstats')):
+            signum = getattr(signal, name, None)
+            if signum is None:
+                continue  # Windows
+            try:
+                self.loop.add_signal_handler(signum, self.start_window, None, profile_format)
+                self._signals.append(signum)
+            except (NotImplementedError, RuntimeError, ValueError):
+                pass
+        if self._signals:
+            logger.info(f'🔬 Профілювання: kill -USR1 {os.getpid()} (speedscope), '
+                        f'kill -USR2 {os.getpid()} (pstats) -> {self.directory}/')
+
+    def stop(self):
+        for signum in self._signals:
+            self.loop.remove_signal_handler(signum)
+        self._signals = []
+        if self.watchdog is not None:
+            self.watchdog.stop()
+
+    def start_window(self, seconds=None, profile_format='speedscope'):
+        """Запускає вікно профілю; повертає шлях майбутнього файлу або None, якщо вже йде інше"""
+        if self.active is not None:
+            logger.warning(f'⚠️ Профіль уже збирається: {self.active}')
+            return None
+        seconds = min(max(float(seconds or PROFILE_SECONDS), 0.1), MAX_PROFILE_SECONDS)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        extension = 'speedscope.json' if profile_format == 'speedscope' else 'pstats'
+        path = os.path.join(self.directory, f'profile-{stamp}.{extension}')
+        self.active = path
+        logger.info(f'🔬 Профіль {profile_format} на {seconds:g} с...')
+
+        if profile_format == 'speedscope':
+            profile = SamplingProfile(self.thread_id, seconds, path)
+
+            def run():
+                try:
+                    profile.run()
+                except Exception as e:
+                    logger.error(f'❌ Помилка профілювання: {e}')
+                finally:
+                    self.active = None
+
+            threading.Thread(target=run, name='sampling-profiler', daemon=True).start()
+        else:
+            # cProfile профілює лише потік, що його ввімкнув - тобто потік event loop;
+            # імпортується лише при першому вікні
+            import cProfile
+            profile = cProfile.Profile()
+            profile.enable()
+
+            def finish():
+                profile.disable()
+                self.active = None
+                try:
+                    os.makedirs(self.directory, exist_ok=True)
+                    profile.dump_stats(path)
+                    logger.info(f'🔬 Профіль pstats: {path}')
+                except OSError as e:
+                    logger.error(f'❌ Не вдалося записати профіль: {e}')
+
+            self.loop.call_later(seconds, finish)
+        return path
+
+    async def handle_request(self, request):
+        """GET /debug/profile?seconds=N&format=speedscope|pstats для ендпоінту метрик"""
+        if request.path != '/debug/profile':
+            return Response(404, 'not found', 'text/plain')
+        profile_format = request.query.get('format', 'speedscope')
+        if profile_format not in ('speedscope', 'pstats'):
+            return Response(400, 'format: speedscope | pstats', 'text/plain')
+        try:
+            seconds = float(request.query.get('seconds') or PROFILE_SECONDS)
+        except ValueError:
+            return Response(400, 'seconds: число', 'text/plain')
+        path = self.start_window(seconds, profile_format)
+        if path is None:
+            return json_response({'error': 'profile already running', 'path': self.active}, status=409)
+        return json_response({'path': path, 'seconds': min(seconds, MAX_PROFILE_SECONDS)}, status=202)
@@ -0,0 +1,99 @@
+"""
+Кеш відформатованих повідомлень з графіком
+
+Текст повідомлення залежить лише від графіку дня, тому кешується за
+ключем (регіон, група, дата, хеш графіку дня, варіант). Поки графік не
+змінився, тисячі однакових запитів /today віддають один і той самий рядок;
+новий хеш автоматично дає новий ключ, а старі записи витісняються (LRU).
+
+Щоденні повідомлення рендеряться заздалегідь (prerender), щойно приходить
+новий знімок, тож відправка за розкладом - це пошук у словнику.
+
+Час оновлення графіку не входить у кешований текст (ключ його не містить,
+і повідомлення з кешу показувало б час першого рендеру) - його додає
+stamp_updated перед відправкою.
+"""
+
+import asyncio
+from collections import OrderedDict
+
+import clock
+
+MAX_ENTRIES = 2048
+PRERENDER_BATCH = 50  # Скільки груп рендерити між поверненнями в event loop
+
+
+def stamp_updated(text, updated_at=None):
+    """Додає до тексту з кешу рядок з часом оновлення графіку (None - зараз)"""
+    updated_at = updated_at or clock.now()
+    return f'{text.rstrip()}\n\n🕐 Оновлено: {updated_at.strftime("%d.%m.%Y %H:%M")}'
+
+
+class RenderCache:
+    """LRU кеш відформатованих графіків
+
+    render(schedule, region, queue, date, variant) -> текст повідомлення;
+    date=None означає всі дати групи (ключ - хеші всіх днів).
+    """
+
+    def __init__(self, render, max_entries=MAX_ENTRIES):
+        self.render = render
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, schedule, region, queue, date, variant):
+        """Повертає текст для графіку групи на дату (рендерить при першому запиті)"""
+        key = (region, queue, date, self._digest(schedule, region, queue, date), variant)
+
+        text = self._entries.get(key)
+        if text is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return text
+
+        self.misses += 1
+        text = self.render(schedule, region, queue, date, variant)
+        self._entries[key] = text
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return text
+
+    @staticmethod
+    def _digest(schedule, region, queue, date):
+        if date is None:
+            days = schedule.queue(region, queue) or {}
+            return tuple(day.digest for day in days.values())
+        day = schedule.day(region, queue, date)
+        return day.digest if day is not None else None
+
+    async def prerender(self, schedule, keys, variants):
+        """Рендерить наперед повідомлення для груп keys
+
+        Args:
+            schedule: новий знімок графіку
+            keys: (регіон, група)
+            variants: (дата або None, варіант) для кожної групи
+
+        Returns:
+            Кількість нових відрендерених повідомлень
+        """
+        rendered = 0
+        for index, (region, queue) in enumerate(keys, 1):
+            if schedule.queue(region, queue) is None:
+                continue
+            for date, variant in variants:
+                misses = self.misses
+                self.get(schedule, region, queue, date, variant)
+                rendered += self.misses - misses
+            if index % PRERENDER_BATCH == 0:
+                await asyncio.sleep(0)
+        return rendered
+
+    def clear(self):
+        self._entries.clear()
@@ -0,0 +1,435 @@
+"""
+Прискорене відтворення роботи бота у віртуальному часі
+
+Таймлайн знімків графіку (синтетичний або з архіву schedule_archive.db)
+проганяється через той самий конвеєр, що й у боті: адаптивне опитування,
+порівняння графіків, рендер, попередження, щоденні повідомлення і черга
+відправки з лімітами Telegram. Замість Telegram - фейковий бот, замість
+реального часу - VirtualClock (clock.py), тому доба роботи бота
+відтворюється за секунди.
+
+Звіт: скільки попереджень і за скільки хвилин до відключень надіслано,
+які попередження і щоденні повідомлення пропущено, затримка помітки змін,
+кількість викликів Telegram API і швидкість відтворення.
+
+Приклади:
+    python replay.py --days 3 --chats 200
+    python replay.py --archive schedule_archive.db --start 2026-10-10 --days 2
+    python replay.py --days 7 --report replay.json
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import statistics
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from functools import partial
+from types import SimpleNamespace
+
+import clock
+from clock import VirtualClock, VirtualTimeLoop
+from telegram_bot import (
+    REGION, UPDATE_INTERVAL_MINUTES, MORNING_NOTIFICATION_HOUR, EVENING_NOTIFICATION_HOUR,
+    WARNING_MINUTES_BEFORE, DIGEST_TIMEZONE, DELIVERY_WORKERS, SNAPSHOT_TTL_SECONDS,
+    MonitorLoop, render_schedule_variant, send_digest, send_outage_warning
+)
+from subscriptions import SubscriptionRegistry
+from delivery import DeliveryQueue
+from warning_scheduler import WarningScheduler, iter_outage_starts
+from digest_scheduler import DigestScheduler, KINDS, get_timezone
+from poll_scheduler import PollScheduler
+from render_cache import RenderCache
+from schedule_archive import ScheduleArchive
+from schedule_model import Schedule
+from payload_generator import QUEUES, generate_payload, mutate_payload
+
+logger = logging.getLogger(__name__)
+
+TELEGRAM_LATENCY_SECONDS = 0.05  # Віртуальна тривалість одного виклику Telegram API
+CHANGES_PER_DAY = 4  # Скільки разів на добу змінюється синтетичний графік
+# Коли публікується синтетичний графік на завтра (хвилини від початку доби)
+PUBLISH_FROM_MINUTES = 17 * 60
+PUBLISH_TO_MINUTES = 22 * 60 + 30
+LATE_WARNING_SECONDS = 60  # Попередження, надіслане пізніше за це, вважається запізнілим
+
+
+class FakeBot:
+    """Бот без мережі: рахує виклики Telegram API у віртуальному часі"""
+
+    def __init__(self, latency=TELEGRAM_LATENCY_SECONDS):
+        self.latency = latency
+        self.calls = Counter()
+        self.chats = Counter()  # chat_id -> кількість повідомлень
+        self._message_id = 0
+
+    async def _call(self, method, chat_id=None, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.calls[method] += 1
+        if method == 'send_message':
+            self.chats[chat_id] += 1
+            self._message_id += 1
+            return SimpleNamespace(message_id=self._message_id, chat_id=chat_id)
+        return True
+
+    def __getattr__(self, method):
+        return partial(self._call, method)
+
+
+class ReplayFeed:
+    """Знімки таймлайну з інтерфейсом ScheduleCache (get/peek)
+
+    "Запит до API" в момент now повертає останній знімок таймлайну,
+    опублікований не пізніше now.
+    """
+
+    def __init__(self, timeline, ttl=SNAPSHOT_TTL_SECONDS):
+        self.timeline = timeline
+        self.ttl = ttl
+        self.index = -1
+        self.schedule = None
+        self.healthy = True
+        self.fetched_at = None
+        self.updated_at = None
+        self.detection_delays = []  # Секунди від публікації знімку до його отримання
+
+    def poll(self):
+        now = clock.now()
+        while self.index + 1 < len(self.timeline) and self.timeline[self.index + 1][0] <= now:
+            self.index += 1
+            self.detection_delays.append((now - self.timeline[self.index][0]).total_seconds())
+        if self.index >= 0:
+            self.schedule = self.timeline[self.index][1]
+        self.fetched_at = clock.monotonic()
+        self.updated_at = clock.now()
+        return self.schedule
+
+    async def get(self, force=False, max_age=None):
+        max_age = self.ttl if max_age is None else max_age
+        if force or self.fetched_at is None or clock.monotonic() - self.fetched_at >= max_age:
+            self.poll()
+        return self.schedule
+
+    def peek(self):
+        return self.schedule
+
+    def set_keys(self, keys, regions=()):
+        pass
+
+
+class DigestLog:
+    """Замість StateStore для DigestScheduler: запам'ятовує відправлені повідомлення"""
+
+    def __init__(self):
+        self.sent = set()  # (chat_id, вид, дата за часом чату)
+
+    def mark_digest(self, chat_ids, kind, day):
+        for chat_id in chat_ids:
+            self.sent.add((str(chat_id), kind, day))
+
+    def save_chat_settings(self, chat_id, morning, evening, timezone_name):
+        pass
+
+
+def _visible_payload(region_data, dates):
+    """Відповідь API, що містить тільки дати dates"""
+    return {
+        'regions': [{
+            'cpu': region_data['cpu'],
+            'name_ua': region_data['name_ua'],
+            'schedule': {
+                queue: {date: days[date] for date in dates}
+                for queue, days in region_data['schedule'].items()
+            }
+        }]
+    }
+
+
+def synthetic_timeline(region, start, days, changes_per_day=CHANGES_PER_DAY, seed=0):
+    """Синтетичний таймлайн: графік на завтра публікується ввечері, протягом доби - зміни
+
+    Returns:
+        Список (час публікації, Schedule), перший знімок - у момент start
+    """
+    rng = random.Random(seed)
+    payload = generate_payload(days=days + 1, start_date=start.date(), seed=seed)
+    region_data = next((data for data in payload['regions'] if data['cpu'] == region), None)
+    if region_data is None:
+        raise ValueError(f'регіону {region} немає в payload_generator.REGIONS')
+    dates = [(start.date() + timedelta(days=offset)).isoformat() for offset in range(days + 1)]
+
+    events = []
+    for offset in range(days):
+        midnight = datetime.combine(start.date() + timedelta(days=offset), datetime.min.time())
+        publish_at = midnight + timedelta(minutes=rng.randrange(PUBLISH_FROM_MINUTES, PUBLISH_TO_MINUTES))
+        events.append((publish_at, dates[offset + 1]))
+        for _ in range(changes_per_day):
+            events.append((midnight + timedelta(minutes=rng.randrange(24 * 60)), None))
+    events.sort()
+
+    visible = [dates[0]]
+    timeline = [(start, Schedule.from_data(_visible_payload(region_data, visible)))]
+    for at, published in events:
+        if at < start:
+            continue
+        if published is not None:
+            visible = (visible + [published])[-2:]
+        else:
+            mutate_payload(_visible_payload(region_data, visible), rng)
+        timeline.append((at, Schedule.from_data(_visible_payload(region_data, visible))))
+    return timeline
+
+
+def make_registry(region, chats):
+    """chats чатів, підписаних по черзі на всі групи регіону"""
+    registry = SubscriptionRegistry()
+    for index in range(chats):
+        registry.subscribe(str(100000 + index), region, QUEUES[index % len(QUEUES)])
+    return registry
+
+
+def expected_warnings(timeline, keys, start, end, warning):
+    """Попередження, які мали бути надіслані: відключення, відоме в момент попередження"""
+    expected = set()
+    for index, (published_at, schedule) in enumerate(timeline):
+        until = timeline[index + 1][0] if index + 1 < len(timeline) else end
+        since = max(published_at, start)
+        for region, queue in keys:
+            for outage_at in iter_outage_starts(schedule, region, queue, since + warning):
+                warn_at = outage_at - warning
+                if warn_at < until and outage_at < end:
+                    expected.add((region, queue, outage_at))
+    return expected
+
+
+def expected_digests(digests, chat_ids, start, end, local_zone):
+    """(chat_id, вид, дата), які мали бути надіслані між start і end (naive, пояс local_zone)
+
+    Вечірнє повідомлення може чекати на графік до кінця доби, тому
+    враховується, тільки якщо доба закінчилась до end.
+    """
+    start_utc, end_utc = start.replace(tzinfo=local_zone), end.replace(tzinfo=local_zone)
+    expected = set()
+    for chat_id in chat_ids:
+        settings = digests.settings(chat_id)
+        zone = get_timezone(settings['timezone'])
+        day = start_utc.astimezone(zone).date()
+        while datetime.combine(day, datetime.min.time(), tzinfo=zone) < end_utc:
+            for kind in KINDS:
+                hour, minute = settings[kind]
+                fire_at = datetime.combine(day, datetime.min.time(), tzinfo=zone).replace(hour=hour, minute=minute)
+                deadline = fire_at if kind == 'morning' else datetime.combine(
+                    day + timedelta(days=1), datetime.min.time(), tzinfo=zone)
+                if start_utc <= fire_at and deadline < end_utc:
+                    expected.add((str(chat_id), kind, day.isoformat()))
+            day += timedelta(days=1)
+    return expected
+
+
+def _summary(values):
+    if not values:
+        return {'count': 0}
+    return {
+        'count': len(values),
+        'min': min(values),
+        'mean': statistics.fmean(values),
+        'max': max(values)
+    }
+
+
+async def replay(timeline, registry, start, end, warning_minutes=WARNING_MINUTES_BEFORE,
+                 morning_hour=MORNING_NOTIFICATION_HOUR, evening_hour=EVENING_NOTIFICATION_HOUR,
+                 interval_minutes=UPDATE_INTERVAL_MINUTES, latency=TELEGRAM_LATENCY_SECONDS, seed=0):
+    """Проганяє таймлайн через конвеєр бота (викликати у VirtualTimeLoop)
+
+    Returns:
+        Звіт (словник)
+    """
+    feed = ReplayFeed(timeline)
+    bot = FakeBot(latency)
+    delivery = DeliveryQueue(bot, workers=DELIVERY_WORKERS)
+    renders = RenderCache(render_schedule_variant)
+    digest_log = DigestLog()
+    fired = []  # (регіон, група, початок відключення, час попередження)
+
+    async def warn(region, queue, outage_at):
+        fired.append((region, queue, outage_at, clock.now()))
+        await send_outage_warning(delivery, registry, region, queue, outage_at)
+
+    warnings = WarningScheduler(warn, warning_minutes)
+    digests = DigestScheduler(
+        lambda kind, c, date, keys: send_digest(delivery, feed, registry, renders, kind, c, date, keys),
+        morning=(morning_hour, 0),
+        evening=(evening_hour, 0),
+        timezone_name=DIGEST_TIMEZONE,
+        store=digest_log
+    )
+    poller = PollScheduler(interval_minutes * 60, rng=random.Random(seed))
+    # Той самий цикл, що й у monitor_and_send, без стану на диску
+    monitor = MonitorLoop(feed, registry, delivery, renders, warnings, digests, poller, {})
+
+    polls = 0
+    processing = []  # Реальний час ітерацій, що принесли новий знімок
+    started = time.perf_counter()
+    try:
+        delivery.start()
+        warnings.start()
+        digests.sync(registry.chats())
+        digests.start()
+
+        while clock.now() < end:
+            polls += 1
+            processed = feed.index
+            step_started = time.perf_counter()
+            delay, _ = await monitor.iteration()
+            if feed.index != processed:
+                processing.append(time.perf_counter() - step_started)
+            await asyncio.sleep(min(delay, (end - clock.now()).total_seconds()))
+
+        await delivery.drain()
+    finally:
+        await warnings.stop()
+        await digests.stop()
+        await delivery.stop()
+    wall_seconds = time.perf_counter() - started
+
+    warning = timedelta(minutes=warning_minutes)
+    expected = expected_warnings(timeline, registry.keys(), start, end, warning)
+    warned = {(region, queue, outage_at) for region, queue, outage_at, _ in fired}
+    leads = [(outage_at - at).total_seconds() / 60 for _, _, outage_at, at in fired]
+    late = [lead for lead in leads if lead * 60 < warning.total_seconds() - LATE_WARNING_SECONDS]
+    due_digests = expected_digests(digests, registry.chats(), start, end, get_timezone(DIGEST_TIMEZONE))
+    virtual_seconds = (end - start).total_seconds()
+
+    return {
+        'virtual_hours': virtual_seconds / 3600,
+        'wall_seconds': wall_seconds,
+        'speedup': virtual_seconds / wall_seconds if wall_seconds else None,
+        'chats': len(registry),
+        'snapshots': len(timeline),
+        'polls': polls,
+        'detection_delay_minutes': _summary([delay / 60 for delay in feed.detection_delays[1:]]),
+        'snapshot_processing_ms': _summary([seconds * 1000 for seconds in processing]),
+        'warnings': {
+            'fired': len(fired),
+            'expected': len(expected),
+            'missed': sorted(f'{r} {q} {at:%Y-%m-%d %H:%M}' for r, q, at in expected - warned),
+            # Відключення вже прибрали з графіку, але бот ще не побачив зміну
+            'stale': len(warned - expected),
+            'late': len(late),
+            'lead_minutes': _summary(leads)
+        },
+        'digests': {
+            'sent': len(digest_log.sent),
+            'expected': len(due_digests),
+            'delivered': len(due_digests & digest_log.sent),
+            'missed': sorted(f'{chat} {kind} {day}' for chat, kind, day in due_digests - digest_log.sent)
+        },
+        'telegram_calls': dict(bot.calls),
+        'messages_per_chat': _summary(list(bot.chats.values())),
+        'delivery': {
+            'failed': delivery.stats['failed'],
+            'latency_max_seconds': delivery.stats['latency_max'],
+            'latency_mean_seconds': delivery.stats['latency_total'] / delivery.stats['sent']
+            if delivery.stats['sent'] else 0.0
+        }
+    }
+
+
+def run_replay(timeline, registry, start, end, **options):
+    """Запускає replay() у власному event loop з віртуальним часом"""
+    # Графіки і naive час бота - за київським часом, незалежно від поясу машини
+    virtual = VirtualClock(start, get_timezone(DIGEST_TIMEZONE))
+    previous = clock.set_clock(virtual)
+    loop = VirtualTimeLoop(virtual)
+    try:
+        asyncio.set_event_loop(loop)
+        return loop.run_until_complete(replay(timeline, registry, start, end, **options))
+    finally:
+        loop.close()
+        asyncio.set_event_loop(None)
+        clock.set_clock(previous)
+
+
+def print_report(report):
+    def line(summary, unit):
+        if not summary['count']:
+            return '—'
+        unit = f' {unit}' if unit else ''
+        return f'сер. {summary["mean"]:.1f}{unit}, мін. {summary["min"]:.1f}, макс. {summary["max"]:.1f}'
+
+    print(f'⏱️ {report["virtual_hours"]:.0f} год за {report["wall_seconds"]:.2f} с '
+          f'({report["speedup"]:.0f}× швидше за реальний час)')
+    print(f'👥 Чатів: {report["chats"]}, знімків: {report["snapshots"]}, опитувань: {report["polls"]}')
+    print(f'🔎 Затримка помітки змін: {line(report["detection_delay_minutes"], "хв")}')
+    print(f'⚙️ Обробка знімку: {line(report["snapshot_processing_ms"], "мс")}')
+
+    warnings = report['warnings']
+    print(f'⚠️ Попереджень: {warnings["fired"]} (очікувалось {warnings["expected"]}), '
+          f'застарілих {warnings["stale"]}, запізнілих {warnings["late"]}, '
+          f'за {line(warnings["lead_minutes"], "хв")} до відключення')
+    for missed in warnings['missed']:
+        print(f'  ❌ пропущено попередження: {missed}')
+
+    digests = report['digests']
+    print(f'🗓️ Щоденних повідомлень: {digests["delivered"]} з {digests["expected"]} '
+          f'(всього надіслано {digests["sent"]})')
+    for missed in digests['missed']:
+        print(f'  ❌ пропущено: {missed}')
+
+    calls = ', '.join(f'{method} {count}' for method, count in sorted(report['telegram_calls'].items()))
+    print(f'📨 Telegram API: {calls or "—"}; повідомлень на чат: {line(report["messages_per_chat"], "")}')
+    delivery = report['delivery']
+    print(f'📬 Доставка: помилок {delivery["failed"]}, затримка сер. {delivery["latency_mean_seconds"]:.2f} с '
+          f'/ макс. {delivery["latency_max_seconds"]:.2f} с')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Відтворення роботи бота у віртуальному часі')
+    parser.add_argument('--days', type=int, default=1, help='скільки діб відтворити')
+    parser.add_argument('--start', help='перша доба YYYY-MM-DD (за замовчуванням - сьогодні)')
+    parser.add_argument('--region', default=REGION, help='регіон')
+    parser.add_argument('--chats', type=int, default=len(QUEUES), help='кількість чатів (по черзі на всі групи)')
+    parser.add_argument('--archive', help='відтворити знімки з архіву замість синтетичних')
+    parser.add_argument('--changes', type=int, default=CHANGES_PER_DAY, help='змін синтетичного графіку на добу')
+    parser.add_argument('--warning-minutes', type=int, default=WARNING_MINUTES_BEFORE, help='попередження за N хв')
+    parser.add_argument('--latency', type=float, default=TELEGRAM_LATENCY_SECONDS,
+                        help='тривалість виклику Telegram API (с)')
+    parser.add_argument('--seed', type=int, default=0, help='зерно генератора')
+    parser.add_argument('--report', help='записати звіт у JSON файл')
+    parser.add_argument('--verbose', action='store_true', help='показувати логи бота')
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.WARNING)
+
+    start_date = datetime.strptime(args.start, '%Y-%m-%d').date() if args.start else datetime.now().date()
+    start = datetime.combine(start_date, datetime.min.time())
+    end = start + timedelta(days=args.days)
+
+    if args.archive:
+        archive = ScheduleArchive(args.archive)
+        timeline = archive.timeline(start, end, region=args.region)
+        archive.close()
+        if not timeline:
+            print(f'❌ В архіві {args.archive} немає знімків {args.region} до {end:%Y-%m-%d}')
+            return
+    else:
+        timeline = synthetic_timeline(args.region, start, args.days, args.changes, args.seed)
+
+    report = run_replay(
+        timeline, make_registry(args.region, args.chats), start, end,
+        warning_minutes=args.warning_minutes, latency=args.latency, seed=args.seed
+    )
+    print_report(report)
+
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f'\n💾 Звіт збережено у {args.report}')
+
+
+if __name__ == '__main__':
+    main()
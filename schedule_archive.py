@@ -0,0 +1,274 @@
+"""
+Архів історії графіків відключень
+
+Кожна нова версія графіку (регіон, група, дата) записується один раз:
+однакові знімки відкидаються за хешем. Графік зберігається у вигляді
+інтервалів (хвилини початку + статуси) разом з 48-бітною маскою
+відключень по півгодинних слотах і кількістю хвилин відключень, тому
+запити "скільки годин без світла" не потребують розбору інтервалів.
+"""
+
+import logging
+import sqlite3
+import sys
+import threading
+from datetime import datetime, timedelta
+
+import clock
+from schedule_model import STATUS_OUTAGE, DaySchedule, Schedule
+from slot_matrix import day_masks
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_DB_FILE = 'schedule_archive.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS snapshots (
+    region TEXT NOT NULL,
+    queue TEXT NOT NULL,
+    date TEXT NOT NULL,
+    seen_at TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    starts BLOB NOT NULL,
+    statuses BLOB NOT NULL,
+    outage_minutes INTEGER NOT NULL,
+    outage_mask INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS snapshots_key ON snapshots (region, queue, date, seen_at);
+'''
+
+
+def outage_stats(day):
+    """Повертає (хвилини відключень, маска півгодинних слотів з відключенням)"""
+    minutes = sum(end - start for start, end, status in day.intervals() if status == STATUS_OUTAGE)
+    return minutes, day_masks(day).get(STATUS_OUTAGE, 0)
+
+
+def _copy_regions(regions):
+    """Копія словників регіон -> група -> дата (DaySchedule спільні)"""
+    return {region: {queue: dict(days) for queue, days in queues.items()} for region, queues in regions.items()}
+
+
+class ScheduleArchive:
+    """Архів унікальних версій графіку з API запитів по історії"""
+
+    def __init__(self, path=ARCHIVE_DB_FILE, recent_days=2):
+        self.path = path
+        self._lock = threading.Lock()
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+        # Останній хеш для недавніх дат - лише вони можуть ще змінюватись
+        since = (clock.now() - timedelta(days=recent_days)).strftime('%Y-%m-%d')
+        rows = self.conn.execute(
+            'SELECT region, queue, date, digest, MAX(seen_at) FROM snapshots '
+            'WHERE date >= ? GROUP BY region, queue, date',
+            (since,)
+        ).fetchall()
+        self._latest = {(region, queue, date): digest for region, queue, date, digest, _ in rows}
+
+    def record(self, schedule, keys=None, seen_at=None):
+        """Записує нові версії графіку зі знімку
+
+        Args:
+            schedule: модель Schedule
+            keys: (регіон, група) для запису; None - всі групи знімку
+            seen_at: час отримання знімку (за замовчуванням - зараз)
+
+        Returns:
+            Кількість записаних нових версій
+
+        Raises:
+            sqlite3.Error: транзакцію відкочено, версії буде записано наступного разу
+        """
+        seen_at = (seen_at or clock.now()).isoformat(timespec='seconds')
+
+        if keys is None:
+            keys = [
+                (region, queue)
+                for region, queues in schedule.regions.items()
+                for queue in queues
+            ]
+
+        rows = []
+        latest = {}
+        for region, queue in keys:
+            for date, day in (schedule.queue(region, queue) or {}).items():
+                archive_key = (region, queue, date)
+                if self._latest.get(archive_key) == day.digest:
+                    continue
+                minutes, mask = outage_stats(day)
+                rows.append((
+                    region, queue, date, seen_at, day.digest,
+                    day.starts.tobytes(), day.statuses.tobytes(), minutes, mask
+                ))
+                latest[archive_key] = day.digest
+
+        if rows:
+            with self._lock:
+                try:
+                    self.conn.execute('BEGIN')
+                    self.conn.executemany(
+                        'INSERT INTO snapshots (region, queue, date, seen_at, digest, starts, statuses, '
+                        'outage_minutes, outage_mask) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                        rows
+                    )
+                    self.conn.execute('COMMIT')
+                except sqlite3.Error:
+                    if self.conn.in_transaction:
+                        self.conn.execute('ROLLBACK')
+                    raise
+            # Лише після COMMIT: інакше невдалі версії вже не записались би
+            self._latest.update(latest)
+        return len(rows)
+
+    def _query(self, sql, params):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def outage_hours_by_day(self, region, queue, start_date, end_date):
+        """Годин можливих відключень за днями (за останньою версією графіку)
+
+        Returns:
+            {дата: години}
+        """
+        rows = self._query(
+            'SELECT date, outage_minutes, MAX(seen_at) FROM snapshots '
+            'WHERE region = ? AND queue = ? AND date BETWEEN ? AND ? GROUP BY date ORDER BY date',
+            (region, queue, start_date, end_date)
+        )
+        return {date: minutes / 60 for date, minutes, _ in rows}
+
+    def outage_hours_by_week(self, region, queue, start_date, end_date):
+        """Годин можливих відключень за ISO тижнями
+
+        Returns:
+            {"YYYY-Www": години}
+        """
+        weeks = {}
+        for date, hours in self.outage_hours_by_day(region, queue, start_date, end_date).items():
+            year, week, _ = datetime.strptime(date, '%Y-%m-%d').isocalendar()
+            week_key = f'{year}-W{week:02d}'
+            weeks[week_key] = weeks.get(week_key, 0) + hours
+        return weeks
+
+    def change_counts(self, region, queue, start_date, end_date):
+        """Скільки разів змінювався графік на кожну дату (перша публікація не рахується)
+
+        Returns:
+            {дата: кількість змін}
+        """
+        rows = self._query(
+            'SELECT date, COUNT(*) FROM snapshots '
+            'WHERE region = ? AND queue = ? AND date BETWEEN ? AND ? GROUP BY date ORDER BY date',
+            (region, queue, start_date, end_date)
+        )
+        return {date: count - 1 for date, count in rows}
+
+    def first_published(self, region, queue, date):
+        """Коли графік на дату з'явився вперше (datetime або None)"""
+        rows = self._query(
+            'SELECT MIN(seen_at) FROM snapshots WHERE region = ? AND queue = ? AND date = ?',
+            (region, queue, date)
+        )
+        if not rows or rows[0][0] is None:
+            return None
+        return datetime.fromisoformat(rows[0][0])
+
+    def publication_lead_hours(self, region, queue, start_date, end_date):
+        """За скільки годин до початку доби публікувався графік
+
+        Returns:
+            {дата: години (від'ємні - опубліковано вже протягом дня)}
+        """
+        rows = self._query(
+            'SELECT date, MIN(seen_at) FROM snapshots '
+            'WHERE region = ? AND queue = ? AND date BETWEEN ? AND ? GROUP BY date ORDER BY date',
+            (region, queue, start_date, end_date)
+        )
+        result = {}
+        for date, first_seen in rows:
+            midnight = datetime.strptime(date, '%Y-%m-%d')
+            result[date] = (midnight - datetime.fromisoformat(first_seen)).total_seconds() / 3600
+        return result
+
+    def changes_by_hour(self, days=14):
+        """Скільки опитувань за останні дні принесли нові версії графіку, за годинами
+
+        Returns:
+            {година: кількість}
+        """
+        since = (clock.now() - timedelta(days=days)).isoformat(timespec='seconds')
+        rows = self._query(
+            'SELECT CAST(substr(seen_at, 12, 2) AS INTEGER), COUNT(DISTINCT seen_at) FROM snapshots '
+            'WHERE seen_at >= ? GROUP BY 1',
+            (since,)
+        )
+        return dict(rows)
+
+    def timeline(self, start, end, region=None):
+        """Відновлює послідовність знімків, які бачив бот з start до end
+
+        Перший знімок - стан архіву на момент start (останні версії графіків
+        дат, не старіших за добу до start), далі - новий знімок на кожне
+        опитування, що принесло зміни.
+
+        Returns:
+            Список (час отримання, Schedule)
+        """
+        sql = ('SELECT region, queue, date, seen_at, starts, statuses FROM snapshots '
+               'WHERE seen_at < ? AND date >= ?')
+        params = [end.isoformat(timespec='seconds'), (start - timedelta(days=1)).strftime('%Y-%m-%d')]
+        if region is not None:
+            sql += ' AND region = ?'
+            params.append(region)
+        rows = self._query(sql + ' ORDER BY seen_at', params)
+
+        start_text = start.isoformat(timespec='seconds')
+        regions = {}
+        timeline = []
+        for index, (region_name, queue, date, seen_at, starts, statuses) in enumerate(rows):
+            days = regions.setdefault(region_name, {}).setdefault(queue, {})
+            days[date] = DaySchedule.from_bytes(date, starts, statuses)
+
+            # Версії одного опитування мають однаковий seen_at
+            last = index + 1 == len(rows) or rows[index + 1][3] != seen_at
+            if last and seen_at >= start_text:
+                timeline.append((datetime.fromisoformat(seen_at), _copy_regions(regions)))
+            elif last and (index + 1 == len(rows) or rows[index + 1][3] >= start_text):
+                timeline.append((start, _copy_regions(regions)))
+
+        return [(seen_at, Schedule(regions)) for seen_at, regions in timeline]
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+
+if __name__ == '__main__':
+    # Приклад: python schedule_archive.py 2.2 [днів] [регіон]
+    queue = sys.argv[1] if len(sys.argv) > 1 else '2.2'
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    region = sys.argv[3] if len(sys.argv) > 3 else 'kyiv'
+
+    end = clock.now()
+    start_date = (end - timedelta(days=days - 1)).strftime('%Y-%m-%d')
+    end_date = end.strftime('%Y-%m-%d')
+
+    archive = ScheduleArchive()
+    hours = archive.outage_hours_by_day(region, queue, start_date, end_date)
+    changes = archive.change_counts(region, queue, start_date, end_date)
+
+    print(f'📊 Архів графіків: {region}, група {queue}, {start_date} - {end_date}')
+    for date in sorted(set(hours) | set(changes)):
+        published = archive.first_published(region, queue, date)
+        published_text = published.strftime('%d.%m %H:%M') if published else '—'
+        print(f'  📅 {date}: {hours.get(date, 0):.1f} год відключень, '
+              f'змін: {changes.get(date, 0)}, опубліковано: {published_text}')
+
+    for week, week_hours in archive.outage_hours_by_week(region, queue, start_date, end_date).items():
+        print(f'  🗓️ {week}: {week_hours:.1f} год')
+
+    archive.close()
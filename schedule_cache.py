@@ -0,0 +1,160 @@
+"""
+Спільний кеш знімку графіку відключень
+
+Один цикл бота (оновлення, попередження, графік на завтра) отримує
+один і той самий розпарсений знімок (Schedule) замість окремого запиту
+до API. Модель будується один раз на кожну нову відповідь API.
+"""
+
+import asyncio
+import logging
+
+import clock
+from fetch_api import fetch_schedule_conditional_async
+from schedule_model import Schedule
+from stream_parse import wanted_from_keys
+from metrics import PARSE_SECONDS
+from profiling import span
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TTL_SECONDS = 60
+
+
+class ScheduleCache:
+    """Кеш знімку графіку з TTL, ревалідацією та об'єднанням запитів
+
+    - поки знімок свіжий (TTL), get() повертає його без запиту до API;
+    - після TTL виконується умовний запит (ETag / Last-Modified),
+      відповідь 304 лише продовжує життя поточного знімку;
+    - одночасні виклики get() чекають на один і той самий запит.
+    """
+
+    def __init__(self, region, queue, ttl=DEFAULT_TTL_SECONDS):
+        self.region = region
+        self.queue = queue
+        self.ttl = ttl
+        self.wanted = None  # {регіон: набір груп}; None - вся відповідь API
+
+        self.schedule = None
+        self.etag = None
+        self.last_modified = None
+        self.fetched_at = None  # clock.monotonic() останньої успішної перевірки
+        self.updated_at = None  # clock.now() останньої успішної перевірки - для "Оновлено" у повідомленнях
+
+        self.hits = 0
+        self.fetches = 0
+        self.not_modified = 0
+        self.errors = 0
+        self.healthy = True  # Чи вдалася остання перевірка в API
+
+        self._inflight = None
+
+    def is_fresh(self, max_age=None):
+        """Чи можна віддати поточний знімок без запиту до API (max_age замість TTL)"""
+        return (
+            self.schedule is not None
+            and self.fetched_at is not None
+            and clock.monotonic() - self.fetched_at < (self.ttl if max_age is None else max_age)
+        )
+
+    def peek(self):
+        """Повертає поточний знімок без запиту до API (може бути застарілим)"""
+        return self.schedule
+
+    def restore(self, schedule, etag=None, last_modified=None, wanted=None, saved_at=None):
+        """Підставляє знімок, збережений до перезапуску (SnapshotStore)
+
+        Знімок одразу доступний через peek(), але не вважається свіжим:
+        перший get() перевірить його в API умовним запитом зі збереженими
+        валідаторами (зазвичай 304 без завантаження даних).
+        """
+        self.schedule = schedule
+        self.etag = etag
+        self.last_modified = last_modified
+        self.wanted = wanted
+        self.fetched_at = None
+        self.updated_at = saved_at
+
+    def invalidate(self):
+        """Скидає знімок та валідатори - наступний get() завантажить дані повністю"""
+        self.schedule = None
+        self.etag = None
+        self.last_modified = None
+        self.fetched_at = None
+        self.updated_at = None
+
+    def set_keys(self, keys, regions=()):
+        """Обмежує розбір відповіді графіками груп keys (регіон, група)
+
+        Регіони regions розбираються повністю (всі групи) - наприклад,
+        щоб відповідати на команди про будь-яку групу без запиту до API.
+
+        При зміні набору груп валідатори скидаються: відповідь 304 не
+        принесла б графіків нових груп. Поточний знімок лишається до
+        наступного успішного запиту.
+        """
+        wanted = wanted_from_keys(keys, regions)
+        if wanted == self.wanted:
+            return
+        self.wanted = wanted
+        self.etag = None
+        self.last_modified = None
+        self.fetched_at = None
+
+    async def get(self, force=False, max_age=None):
+        """Повертає актуальний знімок графіку (Schedule)
+
+        Args:
+            force: ігнорувати TTL і перевірити дані в API
+            max_age: допустимий вік знімку в секундах замість TTL
+        """
+        if not force and self.is_fresh(max_age):
+            self.hits += 1
+            return self.schedule
+
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._refresh())
+
+        # shield: скасування одного споживача не скасовує спільний запит
+        return await asyncio.shield(self._inflight)
+
+    async def _refresh(self):
+        try:
+            self.fetches += 1
+            result = await fetch_schedule_conditional_async(
+                self.region,
+                self.queue,
+                etag=self.etag if self.schedule is not None else None,
+                last_modified=self.last_modified if self.schedule is not None else None,
+                wanted=self.wanted
+            )
+
+            if result is None:
+                self.errors += 1
+                self.healthy = False
+                # Віддаємо останній відомий знімок, поки API недоступне
+                if self.schedule is not None:
+                    logger.warning('⚠️ API недоступне, використовую попередній знімок графіку')
+                return self.schedule
+
+            if result.not_modified:
+                self.not_modified += 1
+            else:
+                with PARSE_SECONDS.time(stage='model'), span('parse'):
+                    schedule = Schedule.from_data(result.data)
+                if schedule is None:
+                    self.errors += 1
+                    self.healthy = False
+                    logger.warning('⚠️ Дані не в очікуваному форматі, використовую попередній знімок')
+                    return self.schedule
+                self.schedule = schedule
+
+            self.healthy = True
+            self.etag = result.etag
+            self.last_modified = result.last_modified
+            self.fetched_at = clock.monotonic()
+            self.updated_at = clock.now()
+            return self.schedule
+        finally:
+            self._inflight = None
@@ -0,0 +1,111 @@
+"""
+Структурне порівняння графіків відключень
+
+Порівнює вікна відключень двох версій графіку однієї групи на одну
+дату і повертає мінімальний набір змін: нові, скасовані та зсунуті
+вікна. Однакові графіки відсікаються за хешем вмісту без розбору
+інтервалів.
+"""
+
+from collections import namedtuple
+
+# added/removed - списки (початок, кінець); shifted - список (старі вікна, нові вікна)
+DayDiff = namedtuple('DayDiff', ['date', 'added', 'removed', 'shifted', 'other'])
+
+
+def diff_windows(old_windows, new_windows):
+    """Порівнює два відсортовані списки вікон відключень
+
+    Вікна, що перетинаються, об'єднуються в компоненти зв'язності:
+    компонента тільки зі старих вікон - скасування, тільки з нових -
+    нове відключення, однакові вікна - без змін, решта - зсув
+    (включно з об'єднанням чи розділенням вікон).
+
+    Returns:
+        (added, removed, shifted)
+    """
+    added = []
+    removed = []
+    shifted = []
+
+    i = j = 0
+    while i < len(old_windows) or j < len(new_windows):
+        # Беремо найраніше вікно як початок компоненти
+        if j >= len(new_windows) or (i < len(old_windows) and old_windows[i][0] <= new_windows[j][0]):
+            old_group, new_group = [old_windows[i]], []
+            end = old_windows[i][1]
+            i += 1
+        else:
+            old_group, new_group = [], [new_windows[j]]
+            end = new_windows[j][1]
+            j += 1
+
+        # Розширюємо компоненту, поки наступні вікна перетинаються з нею
+        while True:
+            if i < len(old_windows) and old_windows[i][0] < end:
+                old_group.append(old_windows[i])
+                end = max(end, old_windows[i][1])
+                i += 1
+            elif j < len(new_windows) and new_windows[j][0] < end:
+                new_group.append(new_windows[j])
+                end = max(end, new_windows[j][1])
+                j += 1
+            else:
+                break
+
+        if not new_group:
+            removed.extend(old_group)
+        elif not old_group:
+            added.extend(new_group)
+        elif old_group != new_group:
+            shifted.append((old_group, new_group))
+
+    return added, removed, shifted
+
+
+def diff_days(old_day, new_day):
+    """Порівнює два DaySchedule однієї дати
+
+    Returns:
+        DayDiff або None, якщо графіки однакові
+    """
+    if old_day is not None and new_day is not None and old_day.digest == new_day.digest:
+        return None
+
+    old_windows = old_day.outage_windows() if old_day is not None else []
+    new_windows = new_day.outage_windows() if new_day is not None else []
+    added, removed, shifted = diff_windows(old_windows, new_windows)
+
+    # Зміни поза відключеннями (наприклад, "дані недоступні" -> "світло є")
+    other = not (added or removed or shifted)
+
+    date = new_day.date if new_day is not None else old_day.date
+    return DayDiff(date, added, removed, shifted, other)
+
+
+def diff_schedules(old_days, new_days, dates):
+    """Порівнює графіки групи на вказані дати
+
+    Args:
+        old_days, new_days: {дата: DaySchedule}
+        dates: дати для порівняння (наприклад, сьогодні та завтра)
+
+    Returns:
+        Список DayDiff для дат, де графік змінився
+    """
+    diffs = []
+    for date in dates:
+        old_day = old_days.get(date)
+        new_day = new_days.get(date)
+        # Перша публікація графіку на дату - не зміна, а новий графік
+        if old_day is None:
+            continue
+        diff = diff_days(old_day, new_day)
+        if diff is not None:
+            diffs.append(diff)
+    return diffs
+
+
+def is_material(diffs):
+    """Чи є серед змін зміни вікон відключень"""
+    return any(diff.added or diff.removed or diff.shifted for diff in diffs)
@@ -0,0 +1,216 @@
+"""
+Розпарсена модель графіку відключень
+
+Знімок з API ("HH:MM" -> статус для кожного регіону/групи/дати)
+перетворюється один раз у компактні інтервали: масив хвилин початку
+інтервалу та масив статусів. Сусідні слоти з однаковим статусом
+об'єднуються, тому запити до графіку не потребують сортування і
+повторного парсингу рядків.
+"""
+
+import hashlib
+from array import array
+from bisect import bisect_right
+
+# Статуси з API
+STATUS_UNKNOWN = 0   # Дані недоступні
+STATUS_POWER = 1     # Світло є
+STATUS_OUTAGE = 2    # Можливе відключення
+STATUS_INVALID = 255  # Невідомий статус у даних
+
+MINUTES_PER_DAY = 24 * 60
+
+# Назви регіонів для повідомлень
+REGION_NAMES = {
+    'kyiv': 'Київ'
+}
+
+
+def get_region_name(region):
+    """Повертає назву регіону для повідомлень"""
+    return REGION_NAMES.get(region, region)
+
+
+def parse_time(time_str):
+    """Перетворює "HH:MM" у хвилини від початку доби"""
+    hour, minute = time_str.split(':')
+    return int(hour) * 60 + int(minute)
+
+
+def format_minutes(minutes):
+    """Перетворює хвилини від початку доби у "HH:MM" (1440 -> "24:00")"""
+    return f'{minutes // 60:02d}:{minutes % 60:02d}'
+
+
+def _status_code(status):
+    if isinstance(status, int) and not isinstance(status, bool) and 0 <= status < STATUS_INVALID:
+        return status
+    return STATUS_INVALID
+
+
+class DaySchedule:
+    """Графік однієї групи на одну дату у вигляді інтервалів
+
+    starts[i] - хвилина початку i-го інтервалу, statuses[i] - його статус;
+    інтервал триває до starts[i + 1] (останній - до 24:00).
+    """
+
+    __slots__ = ('date', 'starts', 'statuses', 'outage_starts', '_digest')
+
+    def __init__(self, date, starts, statuses):
+        self.date = date
+        self.starts = starts
+        self.statuses = statuses
+        self._digest = None
+        # Початки відключень - для пошуку "наступне відключення після t" за O(log n)
+        self.outage_starts = array('H', (
+            start for start, status in zip(starts, statuses) if status == STATUS_OUTAGE
+        ))
+
+    @classmethod
+    def from_times(cls, date, times):
+        """Будує графік з словника {"HH:MM": статус}"""
+        slots = []
+        for time_str, status in times.items():
+            try:
+                slots.append((parse_time(time_str), _status_code(status)))
+            except (ValueError, AttributeError):
+                continue
+        slots.sort()
+
+        starts = array('H')
+        statuses = array('B')
+        for minute, status in slots:
+            if statuses and statuses[-1] == status:
+                continue
+            starts.append(minute)
+            statuses.append(status)
+
+        return cls(date, starts, statuses)
+
+    @classmethod
+    def from_bytes(cls, date, starts_bytes, statuses_bytes):
+        """Відновлює графік з компактного представлення (starts/statuses.tobytes())"""
+        starts = array('H')
+        starts.frombytes(starts_bytes)
+        statuses = array('B')
+        statuses.frombytes(statuses_bytes)
+        return cls(date, starts, statuses)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __bool__(self):
+        return len(self.starts) > 0
+
+    @property
+    def key(self):
+        """Компактне представлення для порівняння графіків"""
+        return self.starts.tobytes() + self.statuses.tobytes()
+
+    @property
+    def digest(self):
+        """Короткий хеш вмісту (обчислюється один раз) - швидка перевірка змін"""
+        if self._digest is None:
+            self._digest = hashlib.blake2b(self.key, digest_size=8).hexdigest()
+        return self._digest
+
+    def intervals(self):
+        """Повертає список (початок, кінець, статус) у хвилинах"""
+        starts = self.starts
+        ends = list(starts[1:]) + [MINUTES_PER_DAY]
+        return list(zip(starts, ends, self.statuses))
+
+    def status_at(self, minute):
+        """Статус у вказану хвилину доби (None - до першого слоту)"""
+        index = bisect_right(self.starts, minute) - 1
+        if index < 0:
+            return None
+        return self.statuses[index]
+
+    def interval_end(self, start):
+        """Кінець інтервалу, що починається у хвилину start"""
+        index = bisect_right(self.starts, start)
+        return self.starts[index] if index < len(self.starts) else MINUTES_PER_DAY
+
+    def next_outage_after(self, minute):
+        """Хвилина початку першого відключення строго після minute (або None)"""
+        index = bisect_right(self.outage_starts, minute)
+        if index < len(self.outage_starts):
+            return self.outage_starts[index]
+        return None
+
+    def outages_between(self, start, end):
+        """Початки відключень у проміжку (start, end]"""
+        return self.outage_starts[bisect_right(self.outage_starts, start):bisect_right(self.outage_starts, end)]
+
+    def outage_windows(self):
+        """Повертає список вікон відключень (початок, кінець) у хвилинах"""
+        windows = []
+        for start in self.outage_starts:
+            windows.append((start, self.interval_end(start)))
+        return windows
+
+    def starts_with_outage(self):
+        return bool(self.starts) and self.starts[0] == 0 and self.statuses[0] == STATUS_OUTAGE
+
+    def ends_with_outage(self):
+        return bool(self.statuses) and self.statuses[-1] == STATUS_OUTAGE
+
+
+class Schedule:
+    """Знімок графіку: регіон -> група -> дата -> DaySchedule"""
+
+    __slots__ = ('regions',)
+
+    def __init__(self, regions=None):
+        self.regions = regions if regions is not None else {}
+
+    @classmethod
+    def from_data(cls, data):
+        """Будує модель з відповіді API (None, якщо формат не той)"""
+        if not isinstance(data, dict) or not isinstance(data.get('regions'), list):
+            return None
+
+        regions = {}
+        for region_data in data['regions']:
+            if not isinstance(region_data, dict) or 'cpu' not in region_data:
+                continue
+            queues = {}
+            for queue, days in (region_data.get('schedule') or {}).items():
+                if not isinstance(days, dict):
+                    continue
+                queues[queue] = {
+                    date: DaySchedule.from_times(date, times)
+                    for date, times in days.items()
+                    if isinstance(times, dict)
+                }
+            # Як і раніше, беремо перший регіон з потрібним cpu
+            regions.setdefault(region_data['cpu'], queues)
+
+        return cls(regions)
+
+    def region(self, region):
+        """Групи регіону {група: {дата: DaySchedule}} або None"""
+        return self.regions.get(region) or None
+
+    def queue(self, region, queue):
+        """Графік групи {дата: DaySchedule} або None"""
+        queues = self.regions.get(region)
+        if not queues:
+            return None
+        return queues.get(queue)
+
+    def day(self, region, queue, date):
+        """Графік групи на дату або None"""
+        days = self.queue(region, queue)
+        if days is None:
+            return None
+        return days.get(date)
+
+
+def as_schedule(data):
+    """Повертає модель Schedule для сирих даних API або вже готової моделі"""
+    if isinstance(data, Schedule):
+        return data
+    return Schedule.from_data(data)
@@ -0,0 +1,434 @@
+"""
+Самоперевірка чистих функцій обробки графіків
+
+Короткі assert-перевірки крайніх випадків, які легко зламати
+оптимізацією і не помітити в бенчмарках: склеювання інтервалів моделі
+графіку, порівняння вікон, вибірковий розбір JSON, бітові маски слотів.
+Працює офлайн, без API і Telegram.
+
+Приклади:
+    python self_test.py            # всі перевірки
+    python self_test.py model      # тільки вказані групи
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+from array import array
+from datetime import datetime, timedelta
+
+from endpoints import SchemaError
+from schedule_diff import diff_days, diff_schedules, diff_windows, is_material
+from schedule_model import (
+    STATUS_INVALID, STATUS_OUTAGE, STATUS_POWER, STATUS_UNKNOWN, DaySchedule, Schedule
+)
+from slot_matrix import SLOT_MINUTES, SLOTS_PER_DAY, SlotMatrix, day_masks, longest_run, runs
+from stream_parse import parse_filtered
+
+CHECKS = {}  # група -> [функція перевірки]
+
+
+def check(group):
+    """Реєструє функцію як перевірку групи group"""
+    def register(func):
+        CHECKS.setdefault(group, []).append(func)
+        return func
+    return register
+
+
+def day(times, date='2025-01-01'):
+    """DaySchedule з {"HH:MM": статус}; статус - 'on' / 'off' / число"""
+    codes = {'on': STATUS_POWER, 'off': STATUS_OUTAGE}
+    return DaySchedule.from_times(date, {time: codes.get(status, status) for time, status in times.items()})
+
+
+def half_hours(*outages):
+    """{"HH:MM": статус} на всю добу з відключеннями outages [(початок, кінець) у годинах]"""
+    times = {}
+    for slot in range(48):
+        hour = slot / 2
+        off = any(start <= hour < end for start, end in outages)
+        times[f'{slot // 2:02d}:{slot % 2 * 30:02d}'] = 'off' if off else 'on'
+    return times
+
+
+# ============================================
+# Модель графіку (schedule_model)
+# ============================================
+
+@check('model')
+def check_merge_adjacent_slots():
+    """Сусідні слоти з однаковим статусом склеюються, порядок ключів не важливий"""
+    schedule = day({'01:00': 'off', '00:00': 'on', '00:30': 'on', '01:30': 'off', '02:00': 'on'})
+    assert list(schedule.starts) == [0, 60, 120]
+    assert list(schedule.statuses) == [STATUS_POWER, STATUS_OUTAGE, STATUS_POWER]
+    assert schedule.intervals() == [(0, 60, STATUS_POWER), (60, 120, STATUS_OUTAGE), (120, 1440, STATUS_POWER)]
+
+
+@check('model')
+def check_bad_slots():
+    """Некоректний час пропускається, невідомий статус не зливається з відомими"""
+    schedule = day({'00:00': 'on', 'xx': 'off', '03:00': 'maybe', '04:00': True, '05:00': 'on'})
+    assert list(schedule.starts) == [0, 180, 300]
+    assert list(schedule.statuses) == [STATUS_POWER, STATUS_INVALID, STATUS_POWER]
+    assert not day({})
+    assert day({}).intervals() == []
+
+
+@check('model')
+def check_lookups():
+    """status_at, next_outage_after і вікна на межах інтервалів"""
+    schedule = day({'06:00': 'on', '08:00': 'off', '10:00': 'on', '22:00': 'off'})
+    assert schedule.status_at(359) is None
+    assert schedule.status_at(360) == STATUS_POWER
+    assert schedule.status_at(480) == STATUS_OUTAGE
+    assert schedule.status_at(599) == STATUS_OUTAGE
+    assert schedule.next_outage_after(-1) == 480
+    assert schedule.next_outage_after(480) == 1320
+    assert schedule.next_outage_after(1320) is None
+    assert list(schedule.outages_between(480, 1320)) == [1320]
+    assert schedule.outage_windows() == [(480, 600), (1320, 1440)]
+    assert schedule.ends_with_outage() and not schedule.starts_with_outage()
+    assert day({'00:00': 'off', '01:00': 'on'}).starts_with_outage()
+
+
+@check('model')
+def check_bytes_roundtrip():
+    """Компактне представлення відновлюється без змін і з тим самим хешем"""
+    schedule = day(half_hours((3, 5.5), (20, 24)))
+    restored = DaySchedule.from_bytes(schedule.date, schedule.starts.tobytes(), schedule.statuses.tobytes())
+    assert restored.intervals() == schedule.intervals()
+    assert restored.digest == schedule.digest
+    assert day(half_hours((3, 6))).digest != schedule.digest
+    assert isinstance(restored.starts, array)
+
+
+@check('model')
+def check_from_data():
+    """Schedule.from_data: чужий формат - None, перший регіон з cpu виграє"""
+    assert Schedule.from_data(None) is None
+    assert Schedule.from_data({'regions': {}}) is None
+    data = {'regions': [
+        {'name': 'без cpu'},
+        {'cpu': 'kyiv', 'schedule': {'1.1': {'2025-01-01': {'00:00': 2}}, '1.2': 'bad'}},
+        {'cpu': 'kyiv', 'schedule': {'1.1': {'2025-01-01': {'00:00': 1}}}},
+    ]}
+    schedule = Schedule.from_data(data)
+    assert schedule.day('kyiv', '1.1', '2025-01-01').intervals() == [(0, 1440, STATUS_OUTAGE)]
+    assert schedule.queue('kyiv', '1.2') is None
+    assert schedule.region('odesa') is None
+    assert Schedule.from_data({'regions': [{'cpu': 'x', 'schedule': {'1': {'d': {'00:00': 0}}}}]}) \
+        .day('x', '1', 'd').statuses[0] == STATUS_UNKNOWN
+
+
+# ============================================
+# Порівняння графіків (schedule_diff)
+# ============================================
+
+@check('diff')
+def check_diff_windows_basic():
+    """Нові, скасовані та незмінні вікна"""
+    assert diff_windows([], []) == ([], [], [])
+    assert diff_windows([(60, 120)], [(60, 120)]) == ([], [], [])
+    assert diff_windows([], [(60, 120)]) == ([(60, 120)], [], [])
+    assert diff_windows([(60, 120), (600, 660)], [(600, 660)]) == ([], [(60, 120)], [])
+
+
+@check('diff')
+def check_diff_windows_shift():
+    """Зсув, об'єднання і розділення вікон - одна зміна на компоненту"""
+    assert diff_windows([(60, 120)], [(90, 150)]) == ([], [], [([(60, 120)], [(90, 150)])])
+    merged = diff_windows([(60, 120), (150, 210)], [(60, 210)])
+    assert merged == ([], [], [([(60, 120), (150, 210)], [(60, 210)])])
+    split = diff_windows([(60, 210)], [(60, 120), (150, 210)])
+    assert split == ([], [], [([(60, 210)], [(60, 120), (150, 210)])])
+    # Ланцюжок перетинів: старе - нове - старе в одній компоненті
+    chain = diff_windows([(0, 60), (100, 160)], [(30, 130)])
+    assert chain == ([], [], [([(0, 60), (100, 160)], [(30, 130)])])
+
+
+@check('diff')
+def check_diff_windows_touching():
+    """Вікна, що лише торкаються, не зливаються; вікно до 24:00 порівнюється як звичайне"""
+    assert diff_windows([(60, 120)], [(120, 180)]) == ([(120, 180)], [(60, 120)], [])
+    assert diff_windows([(1320, 1440)], [(1380, 1440)]) == ([], [], [([(1320, 1440)], [(1380, 1440)])])
+
+
+@check('diff')
+def check_diff_days():
+    """Однаковий хеш - None; зміна поза відключеннями - other"""
+    old = day(half_hours((3, 5)))
+    assert diff_days(old, day(half_hours((3, 5)))) is None
+
+    unknown = half_hours((3, 5))
+    unknown['12:00'] = STATUS_UNKNOWN
+    diff = diff_days(old, day(unknown))
+    assert diff.other and not (diff.added or diff.removed or diff.shifted)
+    assert not is_material([diff])
+
+    diff = diff_days(old, None)
+    assert diff.removed == [(180, 300)] and diff.date == old.date
+    assert is_material([diff])
+
+
+@check('diff')
+def check_diff_schedules():
+    """Перша публікація дати - не зміна; зміни лише на вказані дати"""
+    today, tomorrow = '2025-01-01', '2025-01-02'
+    old = {today: day(half_hours((3, 5)), today)}
+    new = {today: day(half_hours((3, 6)), today), tomorrow: day(half_hours((1, 2)), tomorrow)}
+    diffs = diff_schedules(old, new, (today, tomorrow))
+    assert [diff.date for diff in diffs] == [today]
+    assert diffs[0].shifted == [([(180, 300)], [(180, 360)])]
+    assert diff_schedules(old, new, (tomorrow,)) == []
+
+
+class FakeDelivery:
+    """Черга відправки, що лише запам'ятовує повідомлення"""
+
+    def __init__(self):
+        self.messages = []  # (chat_id, текст)
+
+    def send_message(self, chat_id, text, parse_mode=None):
+        self.messages.append((chat_id, text))
+
+
+class FakeCache:
+    """Кеш знімків, що повертає заданий Schedule"""
+
+    def __init__(self):
+        self.schedule = None
+        self.updated_at = datetime(2025, 1, 1, 18, 0)
+
+    async def get(self, force=False, max_age=None):
+        return self.schedule
+
+
+@check('diff')
+def check_update_publish_then_change():
+    """send_schedule_update: публікація графіку на завтра, потім його зміна - два повідомлення"""
+    # Відправка оновлень живе в модулі бота (Telegram, .env) - імпортуємо лише тут
+    from subscriptions import SubscriptionRegistry
+    from telegram_bot import send_schedule_update
+
+    logging.getLogger('telegram_bot').setLevel(logging.WARNING)
+    today = datetime.now().strftime('%Y-%m-%d')
+    tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
+    registry = SubscriptionRegistry()
+    registry.subscribe('1', 'kyiv', '1.1')
+    delivery, cache, last_schedules = FakeDelivery(), FakeCache(), {}
+
+    def publish(*days):
+        cache.schedule = Schedule({'kyiv': {'1.1': {date: day(times, date) for date, times in days}}})
+        before = len(delivery.messages)
+        asyncio.run(send_schedule_update(delivery, cache, registry, last_schedules))
+        return [text for _, text in delivery.messages[before:]]
+
+    assert len(publish((today, half_hours((3, 5))))) == 1
+    assert publish((today, half_hours((3, 5)))) == []
+    published = publish((today, half_hours((3, 5))), (tomorrow, half_hours((10, 12))))
+    assert len(published) == 1 and 'ЗАВТРА' in published[0]
+    assert set(last_schedules[('kyiv', '1.1')]) == {today, tomorrow}
+    changed = publish((today, half_hours((3, 5))), (tomorrow, half_hours((10, 13))))
+    assert len(changed) == 1 and 'ЗМІНИВСЯ' in changed[0] and tomorrow in changed[0]
+    assert publish((today, half_hours((3, 5))), (tomorrow, half_hours((10, 13)))) == []
+
+
+# ============================================
+# Вибірковий розбір JSON (stream_parse)
+# ============================================
+
+def expected_filtered(payload, wanted):
+    """Еталон для parse_filtered: повний json.loads і фільтр у Python"""
+    result = {key: value for key, value in payload.items() if not isinstance(value, (dict, list))}
+    regions = []
+    for region in payload['regions']:
+        if region['cpu'] not in wanted:
+            continue
+        queues = wanted[region['cpu']]
+        filtered = {key: value for key, value in region.items() if not isinstance(value, (dict, list))}
+        filtered['schedule'] = {
+            queue: days for queue, days in region['schedule'].items() if queues is None or queue in queues
+        }
+        regions.append(filtered)
+    result['regions'] = regions
+    return result
+
+
+TRICKY_PAYLOAD = {
+    'date_today': '2025-01-01',
+    'note': 'лапки \" і дужки {[ ]} у рядку',
+    'meta': {'nested': [[{'deep': '}'}], {'x': '\\'}]},
+    'regions': [
+        {'cpu': 'odesa', 'name_ua': 'Одеса "}]"', 'schedule': {'1.1': {'2025-01-01': {'00:00': 1}}}},
+        {'name_ua': 'schedule перед cpu', 'schedule': {
+            '2.2': {'2025-01-01': {'00:00': 2, '12:00': 1}},
+            '3.1': {'2025-01-01': {'00:00': 1}},
+        }, 'cpu': 'kyiv'},
+        {'cpu': 'lviv', 'schedule': {}},
+    ],
+}
+
+
+@check('parse')
+def check_filtered_matches_json():
+    """Результат збігається з json.loads + фільтром (екрановані рядки, вкладені дужки, schedule до cpu)"""
+    for indent in (None, 2):
+        text = json.dumps(TRICKY_PAYLOAD, ensure_ascii=False, indent=indent)
+        for wanted in ({'kyiv': {'2.2'}}, {'kyiv': None, 'odesa': {'1.1'}}, {'lviv': None}, {'nowhere': None}):
+            assert parse_filtered(text, wanted) == expected_filtered(TRICKY_PAYLOAD, wanted), (indent, wanted)
+    text = json.dumps(TRICKY_PAYLOAD, ensure_ascii=True)
+    assert parse_filtered(text, {'odesa': None}) == expected_filtered(TRICKY_PAYLOAD, {'odesa': None})
+
+
+@check('parse')
+def check_filtered_errors():
+    """Обрізаний JSON і зайві дані - ValueError, чужий формат - SchemaError"""
+    text = json.dumps(TRICKY_PAYLOAD)
+    for cut in (len(text) // 3, len(text) // 2, len(text) - 1):
+        try:
+            parse_filtered(text[:cut], {'kyiv': None})
+        except SchemaError:
+            raise AssertionError(f'обрізаний на {cut}: SchemaError замість ValueError')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f'обрізаний на {cut} розібрано')
+
+    for bad, error in (
+        (text + ' {}', ValueError),
+        ('{"regions": []}', SchemaError),
+        ('{"other": 1}', SchemaError),
+        ('{"regions": [{"schedule": {}}]}', SchemaError),
+        ('{"regions": [{"cpu": "kyiv", "schedule": []}]}', SchemaError),
+    ):
+        try:
+            parse_filtered(bad, {'kyiv': None})
+        except error:
+            continue
+        raise AssertionError(f'{bad[:40]!r}: очікувалась {error.__name__}')
+
+
+# ============================================
+# Бітові маски слотів (slot_matrix)
+# ============================================
+
+def slots(*ranges):
+    """Маска з одиницями у слотах ranges [(перший, останній + 1)]"""
+    mask = 0
+    for first, end in ranges:
+        mask |= ((1 << (end - first)) - 1) << first
+    return mask
+
+
+def naive_runs(mask, width):
+    """Еталон для runs: обхід слот за слотом"""
+    result = []
+    start = None
+    for bit in range(width + 1):
+        on = bit < width and mask >> bit & 1
+        if on and start is None:
+            start = bit
+        elif not on and start is not None:
+            result.append((start, bit - start))
+            start = None
+    return result
+
+
+@check('slots')
+def check_day_masks():
+    """Слот з частковим відключенням - не світло; порожній день - без масок"""
+    masks = day_masks(day({'00:00': 'on', '08:15': 'off', '09:00': 'on', '23:30': STATUS_UNKNOWN}))
+    assert masks[STATUS_OUTAGE] == slots((16, 18))
+    assert masks[STATUS_UNKNOWN] == slots((47, 48))
+    assert masks[STATUS_POWER] == slots((0, 16), (18, 47))
+    assert day_masks(day({'06:00': 'off'})) == {STATUS_OUTAGE: slots((12, 48))}
+    assert day_masks(day({})) == {}
+
+
+@check('slots')
+def check_runs_match_naive():
+    """runs і longest_run збігаються з обходом слот за слотом (найдовше - перше з рівних)"""
+    rng = random.Random(0)
+    width = 3 * SLOTS_PER_DAY
+    masks = [0, 1, 1 << (width - 1), (1 << width) - 1, slots((2, 4), (6, 8)), slots((0, 3), (10, 12), (20, 23))]
+    masks += [rng.getrandbits(width) & rng.getrandbits(width) for _ in range(200)]
+    for mask in masks:
+        expected = naive_runs(mask, width)
+        assert runs(mask) == expected, bin(mask)
+        longest = max(expected, key=lambda run: (run[1], -run[0]), default=None)
+        assert longest_run(mask) == longest, bin(mask)
+
+
+def slot_schedule():
+    """Дві групи на дві доби: 1.1 без світла 20-22 і 03-05, 1.2 - 22:30-23:00"""
+    first, second = '2025-01-01', '2025-01-02'
+    return SlotMatrix(Schedule({'kyiv': {
+        '1.1': {first: day(half_hours((20, 22)), first), second: day(half_hours((3, 5)), second)},
+        '1.2': {first: day(half_hours((22.5, 23)), first), second: day(half_hours(), second)},
+    }})), (first, second)
+
+
+@check('slots')
+def check_windows_across_midnight():
+    """Вікно через північ не розривається; дати без графіку - нулі"""
+    matrix, dates = slot_schedule()
+    day_minutes = SLOTS_PER_DAY * SLOT_MINUTES
+    one = [('kyiv', '1.1')]
+    both = [('kyiv', '1.1'), ('kyiv', '1.2')]
+    assert matrix.windows(one, dates) == [(0, 1200), (1320, day_minutes + 180), (day_minutes + 300, 2 * day_minutes)]
+    assert matrix.windows(both, dates) == [
+        (0, 1200), (1320, 1350), (1380, day_minutes + 180), (day_minutes + 300, 2 * day_minutes)
+    ]
+    assert matrix.longest_window(both, dates) == (0, 1200)
+    assert matrix.union(both, dates, STATUS_OUTAGE) == slots((40, 44), (45, 46), (54, 58))
+    assert matrix.windows(one, (dates[0], '2025-01-05')) == [(0, 1200), (1320, day_minutes)]
+    assert matrix.windows([('kyiv', '9.9')], dates) == []
+
+
+@check('slots')
+def check_from_slot():
+    """from_slot відрізає минуле, зокрема посеред вікна"""
+    matrix, dates = slot_schedule()
+    one = [('kyiv', '1.1')]
+    assert matrix.windows(one, dates, from_slot=10)[0] == (300, 1200)
+    assert matrix.windows(one, dates, from_slot=40)[0] == (1320, 1620)
+    assert matrix.windows(one, dates, from_slot=50) == [(1500, 1620), (1740, 2880)]
+    assert matrix.longest_window(one, dates, from_slot=50) == (1740, 2880)
+    assert matrix.longest_window(one, dates, from_slot=2 * SLOTS_PER_DAY) is None
+    assert matrix.windows(one, dates, from_slot=2 * SLOTS_PER_DAY) == []
+
+
+def run(groups):
+    failed = 0
+    total = 0
+    for group in groups:
+        for func in CHECKS[group]:
+            total += 1
+            try:
+                func()
+            except Exception as e:
+                failed += 1
+                print(f'❌ [{group}] {func.__doc__}: {type(e).__name__} {e}')
+            else:
+                print(f'✅ [{group}] {func.__doc__}')
+    print(f'\n{"❌" if failed else "✅"} Перевірок: {total}, помилок: {failed}')
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Самоперевірка обробки графіків відключень')
+    parser.add_argument('groups', nargs='*', help=f'групи перевірок (за замовчуванням - всі: {", ".join(CHECKS)})')
+    args = parser.parse_args()
+
+    unknown = [group for group in args.groups if group not in CHECKS]
+    if unknown:
+        parser.error(f'невідомі групи: {", ".join(unknown)}')
+    return 1 if run(args.groups or list(CHECKS)) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,466 @@
+"""
+Шардинг підписників по процесах
+
+Процес fetcher опитує API (один раз для всіх), отримує оновлення Telegram
+(команди) і публікує кожен новий знімок графіку воркерам через локальні
+сокети (multiprocessing Pipe). Знімок серіалізується один раз.
+
+Кожен з N воркерів обслуговує свою частину чатів (crc32(chat_id) % N):
+порівнює графіки, планує попередження і щоденні повідомлення та
+відправляє їх у Telegram. Стан воркера зберігається в окремій базі
+(bot_state.shard0.db, ...), а загальний ліміт Telegram ділиться між
+процесами порівну.
+
+Запуск:
+    python sharding.py --shards 4
+"""
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import pickle
+import sqlite3
+import time
+import zlib
+from datetime import timedelta
+
+from telegram import Bot
+
+import clock
+from telegram_bot import (
+    BOT_TOKEN, CHAT_ID, REGION, QUEUE, UPDATE_INTERVAL_MINUTES, MORNING_NOTIFICATION_HOUR,
+    EVENING_NOTIFICATION_HOUR, WARNING_MINUTES_BEFORE, TELEGRAM_BASE_URL, SNAPSHOT_TTL_SECONDS,
+    DELIVERY_WORKERS, COMMANDS_ENABLED, LIVE_MESSAGES, DIGEST_TIMEZONE, LONG_POLL_TIMEOUT, METRICS_HOST, METRICS_PORT,
+    render_schedule_variant, digest_variants, send_schedule_update, send_digest, send_outage_warning,
+    start_updates, send_welcome, restore_snapshot, save_snapshot
+)
+from fetch_api import close_async_client, get_endpoint_pool
+from schedule_cache import ScheduleCache
+from subscriptions import SubscriptionRegistry, SUBSCRIPTIONS_FILE
+from delivery import DeliveryQueue, GLOBAL_MESSAGES_PER_SECOND
+from warning_scheduler import WarningScheduler
+from digest_scheduler import DigestScheduler
+from state_store import StateStore, STATE_DB_FILE
+from snapshot_store import SnapshotStore, SNAPSHOT_FILE
+from poll_scheduler import PollScheduler
+from render_cache import RenderCache
+from metrics import serve_metrics, monitor_event_loop_lag
+from profiling import Profiler, span, PROFILE_DIR
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SHARDS = max(1, (os.cpu_count() or 2) - 1)
+COMMAND_DELIVERY_WORKERS = 2  # Воркери відправки відповідей на команди (у процесі fetcher)
+SUBSCRIPTIONS_CHECK_SECONDS = 1  # Як часто fetcher перевіряє зміни підписок
+STOP_TIMEOUT_SECONDS = 15
+
+
+def shard_of(chat_id, shards):
+    """Номер шарду чату (стабільний між перезапусками, на відміну від hash())"""
+    return zlib.crc32(str(chat_id).encode()) % shards
+
+
+def shard_path(path, shard):
+    """bot_state.db -> bot_state.shard0.db"""
+    root, ext = os.path.splitext(path)
+    return f'{root}.shard{shard}{ext}'
+
+
+def load_shard_registry(path, shard, shards):
+    """Підписки тільки тих чатів, що належать шарду"""
+    full = SubscriptionRegistry(path)
+    full.load()
+    registry = SubscriptionRegistry()
+    for chat_id in full.chats():
+        if shard_of(chat_id, shards) == shard:
+            for region, queue in full.queues_for(chat_id):
+                registry.subscribe(chat_id, region, queue)
+    return registry
+
+
+class SnapshotBus:
+    """Сторона fetcher: розсилає повідомлення воркерам через Pipe
+
+    Повідомлення - кортежі ('snapshot', Schedule, healthy, час отримання),
+    ('subscriptions',), ('digest', chat_id, ранок, вечір, пояс).
+    """
+
+    def __init__(self, connections):
+        self.connections = connections
+
+    async def publish(self, message):
+        """Серіалізує повідомлення один раз і відправляє всім воркерам"""
+        data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        loop = asyncio.get_running_loop()
+        results = await asyncio.gather(
+            *[loop.run_in_executor(None, conn.send_bytes, data) for conn in self.connections],
+            return_exceptions=True
+        )
+        for shard, result in enumerate(results):
+            if isinstance(result, Exception):
+                logger.error(f'❌ Воркер шарду {shard} недоступний: {result}')
+        return len(data)
+
+    async def send(self, shard, message):
+        data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+        try:
+            await asyncio.get_running_loop().run_in_executor(None, self.connections[shard].send_bytes, data)
+        except OSError as e:
+            logger.error(f'❌ Воркер шарду {shard} недоступний: {e}')
+
+    def close(self):
+        for conn in self.connections:
+            conn.close()
+
+
+class SnapshotFeed:
+    """Сторона воркера: знімки від fetcher з інтерфейсом ScheduleCache (get/peek)
+
+    Воркер ніколи не звертається до API - get() повертає останній
+    отриманий знімок.
+    """
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.schedule = None
+        self.healthy = True
+        self.fetched_at = None
+        self.updated_at = None
+
+    def _receive(self):
+        try:
+            return pickle.loads(self.conn.recv_bytes())
+        except (EOFError, OSError):
+            return ('stop',)
+
+    async def next(self):
+        """Чекає наступне повідомлення від fetcher (розбір - в окремому потоці)"""
+        message = await asyncio.get_running_loop().run_in_executor(None, self._receive)
+        if message[0] == 'snapshot':
+            self.schedule, self.healthy, self.updated_at = message[1], message[2], message[3]
+            self.fetched_at = clock.monotonic()
+        return message
+
+    async def get(self, force=False, max_age=None):
+        return self.schedule
+
+    def peek(self):
+        return self.schedule
+
+
+class ShardDigestSettings(DigestScheduler):
+    """Налаштування щоденних повідомлень у процесі fetcher (для команди /digest)
+
+    Повідомлення планує воркер шарду чату - зміни пересилаються йому,
+    а тут зберігаються лише для відповіді на /digest.
+    """
+
+    def __init__(self, bus, shards, morning, evening, timezone_name):
+        super().__init__(None, morning, evening, timezone_name)
+        self.bus = bus
+        self.shards = shards
+
+    def configure(self, chat_id, morning=None, evening=None, timezone_name=None):
+        super().configure(chat_id, morning, evening, timezone_name)
+        message = ('digest', str(chat_id), morning, evening, timezone_name)
+        asyncio.ensure_future(self.bus.send(shard_of(chat_id, self.shards), message))
+
+    def _push(self, chat_id, kind, catch_up=True):
+        pass
+
+
+async def run_worker(conn, shard, shards, bot_token, region, queue, interval_minutes, warning_minutes, morning_hour,
+                     evening_hour):
+    """Воркер шарду: зміни графіку, попередження та щоденні повідомлення своїх чатів"""
+    feed = SnapshotFeed(conn)
+    bot = Bot(token=bot_token, base_url=TELEGRAM_BASE_URL)
+    registry = load_shard_registry(SUBSCRIPTIONS_FILE, shard, shards)
+    store = StateStore(shard_path(STATE_DB_FILE, shard))
+    delivery = DeliveryQueue(bot, workers=DELIVERY_WORKERS, global_rate=GLOBAL_MESSAGES_PER_SECOND / (shards + 1))
+    renders = RenderCache(render_schedule_variant)
+    live = None
+    if LIVE_MESSAGES:
+        from live_messages import LiveMessages
+        live = LiveMessages(delivery, renders, store)
+    # Замикання читають registry в момент виклику, тому бачать перезавантажені підписки
+    warnings = WarningScheduler(
+        lambda r, q, outage_at: send_outage_warning(delivery, registry, r, q, outage_at, store),
+        warning_minutes
+    )
+    digests = DigestScheduler(
+        lambda kind, c, date, keys: send_digest(delivery, feed, registry, renders, kind, c, date, keys),
+        morning=(morning_hour, 0),
+        evening=(evening_hour, 0),
+        timezone_name=DIGEST_TIMEZONE,
+        store=store
+    )
+    last_schedules = store.load_schedules()
+    warnings.restore_fired(store.load_warnings())
+    sent = store.load_digests()
+    digests.restore(sent, store.load_chat_settings())
+    if live is not None:
+        live.restore(store.load_live_messages())
+    welcome_pending = True
+    last_date = clock.now().date()
+    # Кожен процес пише свої профілі (kill -USR1 <pid воркера>)
+    profiler = Profiler(os.path.join(PROFILE_DIR, f'shard{shard}'))
+
+    async def apply_schedule(schedule, now):
+        """Зміни графіку, живі повідомлення і попередження для поточних підписок"""
+        with span('render'):
+            await renders.prerender(schedule, registry.keys(), digest_variants(now))
+        if live is not None:
+            with span('live'):
+                dates = [date for date, _ in digest_variants(now) if date]
+                live.refresh(schedule, registry, dates, feed.updated_at)
+        await send_schedule_update(delivery, feed, registry, last_schedules, store=store,
+                                   renders=renders, live=live)
+        with span('warnings'):
+            warnings.reschedule(schedule, registry.keys())
+
+    logger.info(f'🧩 Шард {shard}/{shards}: чатів {len(registry)}, груп {len(registry.keys())}')
+
+    try:
+        profiler.start()
+        await bot.initialize()
+        delivery.start()
+        warnings.start()
+        digests.sync(registry.chats())
+        send_welcome(delivery, registry, store, sent, interval_minutes, morning_hour, evening_hour, warning_minutes)
+
+        while True:
+            message = await feed.next()
+            kind = message[0]
+
+            if kind == 'stop':
+                break
+            elif kind == 'subscriptions':
+                registry = load_shard_registry(SUBSCRIPTIONS_FILE, shard, shards)
+                digests.sync(registry.chats())
+                if welcome_pending:
+                    # Перші підписки fetcher публікує при старті, вже зберігши CHAT_ID з .env
+                    welcome_pending = False
+                    send_welcome(
+                        delivery, registry, store, sent, interval_minutes, morning_hour, evening_hour, warning_minutes
+                    )
+                if feed.schedule is not None:
+                    # Нові групи отримують графік і попередження одразу, а не з наступним знімком
+                    await apply_schedule(feed.schedule, clock.now())
+            elif kind == 'digest':
+                _, chat_id, morning, evening, timezone_name = message
+                digests.configure(chat_id, morning, evening, timezone_name)
+            elif kind == 'snapshot':
+                with profiler.iteration(shard=shard):
+                    schedule = feed.schedule
+                    now = clock.now()
+                    if last_date != now.date():
+                        last_date = now.date()
+                        store.prune(now - timedelta(days=2))
+                        if live is not None:
+                            live.expire(last_date.isoformat())
+
+                    await apply_schedule(schedule, now)
+                    await digests.on_snapshot(schedule)
+                    # Щоденні повідомлення - тільки після першого знімку
+                    digests.start()
+                    delivery.log_stats()
+
+            await store.flush_async()
+    finally:
+        profiler.stop()
+        await warnings.stop()
+        await digests.stop()
+        await delivery.stop()
+        await store.flush_async()
+        store.close()
+        await bot.shutdown()
+
+
+def worker_main(conn, shard, shards, options):
+    """Точка входу процесу воркера"""
+    formatter = logging.Formatter(f'%(asctime)s - [шард {shard}] %(name)s - %(levelname)s - %(message)s')
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(formatter)
+    try:
+        asyncio.run(run_worker(conn, shard, shards, **options))
+    except KeyboardInterrupt:
+        pass
+
+
+async def run_fetcher(bus, shards, bot_token, chat_id, region, queue, interval_minutes, morning_hour, evening_hour):
+    """Процес fetcher: опитування API, команди та публікація знімків воркерам"""
+    bot = Bot(token=bot_token, base_url=TELEGRAM_BASE_URL)
+    cache = ScheduleCache(region, queue, ttl=SNAPSHOT_TTL_SECONDS)
+    delivery = DeliveryQueue(bot, workers=COMMAND_DELIVERY_WORKERS,
+                             global_rate=GLOBAL_MESSAGES_PER_SECOND / (shards + 1))
+    registry = SubscriptionRegistry(SUBSCRIPTIONS_FILE)
+    registry.load()
+    if chat_id:
+        for single_chat_id in str(chat_id).split(','):
+            if single_chat_id.strip():
+                registry.subscribe(single_chat_id.strip(), region, queue)
+    registry.save()
+    # Воркери могли прочитати файл підписок раніше
+    await bus.publish(('subscriptions',))
+
+    # Архів і команди потрібні лише процесу, що опитує API, - воркери їх не імпортують
+    from schedule_archive import ScheduleArchive, ARCHIVE_DB_FILE
+    from commands import BotCommands
+    archive = ScheduleArchive(ARCHIVE_DB_FILE)
+    snapshots = SnapshotStore(SNAPSHOT_FILE)
+    warm_schedule = restore_snapshot(cache, snapshots)
+    poller = PollScheduler(interval_minutes * 60)
+    poller.seed_hours(archive.changes_by_hour())
+    renders = RenderCache(render_schedule_variant)
+
+    digest_settings = ShardDigestSettings(bus, shards, (morning_hour, 0), (evening_hour, 0), DIGEST_TIMEZONE)
+    for shard in range(shards):
+        shard_store = StateStore(shard_path(STATE_DB_FILE, shard))
+        digest_settings.restore({}, shard_store.load_chat_settings())
+        shard_store.close()
+
+    commands = BotCommands(bot, cache, registry, delivery, renders, region, queue,
+                           long_poll_timeout=LONG_POLL_TIMEOUT, digests=digest_settings)
+    receiver = None
+    metrics_server = None
+    lag_task = None
+    profiler = Profiler()
+    published = warm_schedule
+
+    async def watch_subscriptions():
+        # Команди змінюють підписки в цьому процесі - воркери перечитують файл
+        version = registry.version
+        while True:
+            await asyncio.sleep(SUBSCRIPTIONS_CHECK_SECONDS)
+            if registry.version != version:
+                version = registry.version
+                await bus.publish(('subscriptions',))
+
+    watch_task = None
+
+    logger.info(f'🧩 Шардинг: {shards} воркерів, чатів {len(registry)}, груп {len(registry.keys())}')
+
+    try:
+        profiler.start()
+        if METRICS_PORT:
+            metrics_server = await serve_metrics(METRICS_HOST, METRICS_PORT, debug=profiler.handle_request)
+            lag_task = asyncio.ensure_future(monitor_event_loop_lag())
+
+        # Воркери отримують знімок з диска одразу, ще до запиту до API
+        if warm_schedule is not None:
+            await bus.publish(('snapshot', warm_schedule, True, cache.updated_at))
+
+        bot_info = await bot.get_me()
+        logger.info(f'✅ Бот підключено: @{bot_info.username}')
+        delivery.start()
+        if COMMANDS_ENABLED:
+            receiver = await start_updates(bot, commands)
+        watch_task = asyncio.ensure_future(watch_subscriptions())
+
+        while True:
+            with profiler.iteration():
+                iteration_started = time.monotonic()
+                cache.set_keys(registry.keys(), regions=(region,) if COMMANDS_ENABLED else ())
+                with span('fetch'):
+                    schedule = await cache.get()
+                poller.observe(schedule, registry.keys(), ok=cache.healthy)
+
+                # Публікуємо тільки нові знімки (304 повертає той самий об'єкт)
+                if schedule is not None and schedule is not published:
+                    with span('publish'):
+                        size = await bus.publish(('snapshot', schedule, cache.healthy, cache.updated_at))
+                    published = schedule
+                    logger.info(f'📤 Знімок графіку відправлено воркерам ({size / 1024:.0f} КБ)')
+
+                    loop = asyncio.get_running_loop()
+                    try:
+                        with span('archive'):
+                            recorded = await loop.run_in_executor(None, archive.record, schedule)
+                    except sqlite3.Error as e:
+                        logger.warning(f'⚠️ Не вдалося записати графік в архів: {e}')
+                        recorded = 0
+                    if recorded:
+                        logger.info(f'🗄️ В архів записано нових версій графіку: {recorded}')
+                    with span('snapshot'):
+                        await save_snapshot(snapshots, cache, schedule)
+
+                get_endpoint_pool().log_stats()
+                delay, reason = poller.next_delay()
+                logger.info(f'⏳ Наступна перевірка через {delay / 60:.1f} хв ({reason}), '
+                            f'цикл {time.monotonic() - iteration_started:.2f} с')
+            await asyncio.sleep(delay)
+    finally:
+        if watch_task is not None:
+            watch_task.cancel()
+        await commands.stop()
+        if receiver is not None:
+            await receiver.stop()
+        if lag_task is not None:
+            lag_task.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+        profiler.stop()
+        await delivery.stop()
+        await close_async_client()
+        archive.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Бот з розподілом чатів по процесах-воркерах')
+    parser.add_argument('--shards', type=int, default=DEFAULT_SHARDS, help='кількість процесів-воркерів')
+    args = parser.parse_args()
+
+    if not BOT_TOKEN:
+        print('❌ ПОМИЛКА: Не вказано BOT_TOKEN!')
+        return
+
+    options = {
+        'bot_token': BOT_TOKEN,
+        'region': REGION,
+        'queue': QUEUE,
+        'interval_minutes': UPDATE_INTERVAL_MINUTES,
+        'warning_minutes': WARNING_MINUTES_BEFORE,
+        'morning_hour': MORNING_NOTIFICATION_HOUR,
+        'evening_hour': EVENING_NOTIFICATION_HOUR
+    }
+
+    # spawn працює однаково на Linux і Windows
+    context = multiprocessing.get_context('spawn')
+    connections = []
+    processes = []
+    for shard in range(args.shards):
+        reader, writer = context.Pipe(duplex=False)
+        process = context.Process(target=worker_main, args=(reader, shard, args.shards, options),
+                                  name=f'shard-{shard}', daemon=True)
+        process.start()
+        reader.close()
+        connections.append(writer)
+        processes.append(process)
+
+    bus = SnapshotBus(connections)
+    try:
+        asyncio.run(run_fetcher(
+            bus, args.shards,
+            bot_token=BOT_TOKEN,
+            chat_id=CHAT_ID,
+            region=REGION,
+            queue=QUEUE,
+            interval_minutes=UPDATE_INTERVAL_MINUTES,
+            morning_hour=MORNING_NOTIFICATION_HOUR,
+            evening_hour=EVENING_NOTIFICATION_HOUR
+        ))
+    except KeyboardInterrupt:
+        logger.info('\n⛔ Зупинка бота...')
+    finally:
+        # Закритий Pipe - сигнал воркерам завершити відправку і зупинитись
+        bus.close()
+        for process in processes:
+            process.join(STOP_TIMEOUT_SECONDS)
+            if process.is_alive():
+                process.terminate()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Бітові маски півгодинних слотів для запитів по кількох групах
+
+Графік групи на дату кодується цілими числами: по одній масці на статус,
+біт i - слот i (00:00-00:30 - біт 0). Кілька дат поспіль склеюються в
+одне число (48 біт на добу), тому вікно через північ не розривається.
+
+"Коли світло є в усіх моїх групах" - це AND масок груп, "коли хоч одна
+група без світла" - OR, а найдовше спільне вікно шукається побітовими
+зсувами: одна операція над усіма слотами замість обходу слот за слотом.
+"""
+
+from schedule_model import MINUTES_PER_DAY, STATUS_POWER
+
+SLOT_MINUTES = 30
+SLOTS_PER_DAY = MINUTES_PER_DAY // SLOT_MINUTES
+
+
+def day_masks(day):
+    """{статус: маска слотів, які хоча б частково мають цей статус}"""
+    masks = {}
+    for start, end, status in day.intervals():
+        if end <= start:
+            continue
+        first, last = start // SLOT_MINUTES, (end - 1) // SLOT_MINUTES
+        masks[status] = masks.get(status, 0) | (((1 << (last - first + 1)) - 1) << first)
+
+    # Світло - тільки слоти, де його нічого не перериває
+    if STATUS_POWER in masks:
+        other = 0
+        for status, mask in masks.items():
+            if status != STATUS_POWER:
+                other |= mask
+        masks[STATUS_POWER] &= ~other
+    return masks
+
+
+def runs(mask):
+    """Неперервні послідовності одиниць маски: [(перший слот, кількість слотів)]"""
+    result = []
+    while mask:
+        first = (mask & -mask).bit_length() - 1
+        shifted = mask >> first
+        length = (shifted ^ (shifted + 1)).bit_length() - 1
+        result.append((first, length))
+        mask &= ~(((1 << length) - 1) << first)
+    return result
+
+
+def longest_run(mask):
+    """Найдовша послідовність одиниць (перший слот, кількість) або None
+
+    Після k кроків x &= x >> 1 біт i лишається, лише якщо слоти i..i+k
+    усі одиниці, тож кількість кроків до нуля - довжина найдовшого вікна.
+    """
+    length = 0
+    previous = 0
+    while mask:
+        previous = mask
+        mask &= mask >> 1
+        length += 1
+    if not length:
+        return None
+    return (previous & -previous).bit_length() - 1, length
+
+
+class SlotMatrix:
+    """Маски слотів груп знімку графіку
+
+    Маски регіону будуються для всіх його груп при першому зверненні
+    до будь-якої з них і живуть, поки живе знімок.
+    """
+
+    def __init__(self, schedule):
+        self.schedule = schedule
+        self._masks = {}       # (регіон, група, дата) -> {статус: маска}
+        self._regions = set()  # Регіони, для яких маски вже побудовано
+
+    def _build_region(self, region):
+        self._regions.add(region)
+        for queue, days in (self.schedule.region(region) or {}).items():
+            for date, day in days.items():
+                self._masks[(region, queue, date)] = day_masks(day)
+
+    def mask(self, region, queue, dates, status=STATUS_POWER):
+        """Маска групи на дати dates (склеєні поспіль; немає графіку - нулі)"""
+        if region not in self._regions:
+            self._build_region(region)
+        result = 0
+        for index, date in enumerate(dates):
+            masks = self._masks.get((region, queue, date))
+            if masks:
+                result |= masks.get(status, 0) << (index * SLOTS_PER_DAY)
+        return result
+
+    def intersection(self, keys, dates, status=STATUS_POWER):
+        """Слоти, де статус status у всіх групах keys (регіон, група)"""
+        result = (1 << (len(dates) * SLOTS_PER_DAY)) - 1
+        for region, queue in keys:
+            result &= self.mask(region, queue, dates, status)
+        return result
+
+    def union(self, keys, dates, status):
+        """Слоти, де статус status хоча б в одній групі keys"""
+        result = 0
+        for region, queue in keys:
+            result |= self.mask(region, queue, dates, status)
+        return result
+
+    def windows(self, keys, dates, status=STATUS_POWER, from_slot=0):
+        """Спільні вікна статусу в усіх групах: [(початок, кінець)] у хвилинах від початку dates[0]"""
+        mask = self.intersection(keys, dates, status) >> from_slot << from_slot
+        return [
+            (first * SLOT_MINUTES, (first + length) * SLOT_MINUTES)
+            for first, length in runs(mask)
+        ]
+
+    def longest_window(self, keys, dates, status=STATUS_POWER, from_slot=0):
+        """Найдовше спільне вікно (початок, кінець) у хвилинах від початку dates[0] або None"""
+        run = longest_run(self.intersection(keys, dates, status) >> from_slot << from_slot)
+        if run is None:
+            return None
+        first, length = run
+        return first * SLOT_MINUTES, (first + length) * SLOT_MINUTES
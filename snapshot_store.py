@@ -0,0 +1,189 @@
+"""
+Збережений на диску розпарсений знімок графіку (теплий старт)
+
+Після кожного нового знімку бот записує його в компактний бінарний файл:
+заголовок з хешем і далі графіки груп у тому ж вигляді, що й у моделі
+(масиви хвилин початку інтервалів і статусів). При старті файл
+відображається в пам'ять (mmap), перевіряється хеш, і DaySchedule
+будуються напряму з байтів - без JSON і без запиту до API. Разом зі
+знімком зберігаються ETag/Last-Modified, тож перше оновлення зазвичай
+закінчується відповіддю 304.
+
+Формат (little/big endian - як у процесора, що записав файл):
+    заголовок: magic, версія, прапорці, довжина даних, blake2b(дані)
+    дані: довжина + JSON метаданих, кількість записів, записи
+    запис: регіон, група, дата (довжина + UTF-8), кількість інтервалів n,
+           starts (n * uint16), statuses (n * uint8)
+"""
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+
+import clock
+from schedule_model import DaySchedule, Schedule
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_FILE = 'schedule_snapshot.bin'
+MAGIC = b'SVSN'
+VERSION = 1
+FLAG_BIG_ENDIAN = 1
+MAX_AGE_SECONDS = 2 * 24 * 3600  # Старіший знімок не містить актуальних дат
+
+HEADER = struct.Struct('<4sHHQ16s')
+_COUNT = struct.Struct('<I')
+_LENGTH = struct.Struct('<B')
+_INTERVALS = struct.Struct('<H')
+
+
+class WarmSnapshot:
+    """Знімок з диска та його валідатори"""
+
+    def __init__(self, schedule, etag, last_modified, wanted, saved_at):
+        self.schedule = schedule
+        self.etag = etag
+        self.last_modified = last_modified
+        self.wanted = wanted
+        self.saved_at = saved_at
+
+    @property
+    def age(self):
+        """Вік знімку в секундах"""
+        return (clock.now() - self.saved_at).total_seconds()
+
+
+def _flags():
+    return FLAG_BIG_ENDIAN if sys.byteorder == 'big' else 0
+
+
+def _pack_text(text):
+    data = text.encode('utf-8')
+    return _LENGTH.pack(len(data)) + data
+
+
+def encode_snapshot(schedule, etag=None, last_modified=None, wanted=None):
+    """Серіалізує Schedule у формат файлу (заголовок + дані)"""
+    meta = {
+        'saved_at': clock.now().isoformat(),
+        'etag': etag,
+        'last_modified': last_modified,
+        'wanted': None if wanted is None else {
+            region: None if queues is None else sorted(queues) for region, queues in wanted.items()
+        }
+    }
+    meta_data = json.dumps(meta, ensure_ascii=False).encode('utf-8')
+
+    records = []
+    for region, queues in schedule.regions.items():
+        for queue, days in queues.items():
+            for date, day in days.items():
+                records.append(b''.join((
+                    _pack_text(region), _pack_text(queue), _pack_text(date),
+                    _INTERVALS.pack(len(day.starts)), day.starts.tobytes(), day.statuses.tobytes()
+                )))
+
+    payload = b''.join([_COUNT.pack(len(meta_data)), meta_data, _COUNT.pack(len(records))] + records)
+    digest = hashlib.blake2b(payload, digest_size=16).digest()
+    return HEADER.pack(MAGIC, VERSION, _flags(), len(payload), digest) + payload
+
+
+def _decode_payload(view, pos):
+    """Розбирає дані з буфера view (mmap), починаючи з pos"""
+    meta_length, = _COUNT.unpack_from(view, pos)
+    pos += _COUNT.size
+    meta = json.loads(view[pos:pos + meta_length].decode('utf-8'))
+    pos += meta_length
+
+    count, = _COUNT.unpack_from(view, pos)
+    pos += _COUNT.size
+
+    regions = {}
+    texts = {}  # Однакові назви регіонів/груп/дат - один об'єкт рядка
+    for _ in range(count):
+        fields = []
+        for _ in range(3):
+            length = view[pos]
+            raw = view[pos + 1:pos + 1 + length]
+            text = texts.get(raw)
+            if text is None:
+                text = texts[raw] = raw.decode('utf-8')
+            fields.append(text)
+            pos += 1 + length
+        region, queue, date = fields
+
+        intervals, = _INTERVALS.unpack_from(view, pos)
+        pos += _INTERVALS.size
+        starts_end = pos + intervals * array('H').itemsize
+        day = DaySchedule.from_bytes(date, view[pos:starts_end], view[starts_end:starts_end + intervals])
+        pos = starts_end + intervals
+
+        regions.setdefault(region, {}).setdefault(queue, {})[date] = day
+
+    wanted = meta.get('wanted')
+    if wanted is not None:
+        wanted = {region: None if queues is None else set(queues) for region, queues in wanted.items()}
+    return WarmSnapshot(
+        Schedule(regions),
+        meta.get('etag'),
+        meta.get('last_modified'),
+        wanted,
+        datetime.fromisoformat(meta['saved_at'])
+    )
+
+
+class SnapshotStore:
+    """Файл з останнім знімком графіку"""
+
+    def __init__(self, path=SNAPSHOT_FILE, max_age=MAX_AGE_SECONDS):
+        self.path = path
+        self.max_age = max_age
+
+    def save(self, schedule, etag=None, last_modified=None, wanted=None):
+        """Атомарно записує знімок (викликати через run_in_executor)"""
+        data = encode_snapshot(schedule, etag, last_modified, wanted)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, self.path)
+        return len(data)
+
+    def load(self):
+        """Повертає WarmSnapshot або None (файлу немає, він пошкоджений або застарів)"""
+        try:
+            with open(self.path, 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                if size < HEADER.size:
+                    return None
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as view:
+                    snapshot = self._read(view, size)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, struct.error, IndexError) as e:
+            logger.warning(f'⚠️ Не вдалося прочитати знімок {self.path}: {e}')
+            return None
+
+        if snapshot is not None and snapshot.age > self.max_age:
+            logger.info(f'ℹ️ Збережений знімок застарів ({snapshot.age / 3600:.0f} год), чекаю на API')
+            return None
+        return snapshot
+
+    def _read(self, view, size):
+        magic, version, flags, length, digest = HEADER.unpack_from(view, 0)
+        if magic != MAGIC or version != VERSION or flags != _flags() or HEADER.size + length != size:
+            logger.warning(f'⚠️ Знімок {self.path} іншого формату, ігнорую')
+            return None
+
+        with memoryview(view) as buffer, buffer[HEADER.size:] as payload:
+            valid = hashlib.blake2b(payload, digest_size=16).digest() == digest
+        if not valid:
+            logger.warning(f'⚠️ Знімок {self.path} пошкоджено (хеш не збігається), ігнорую')
+            return None
+
+        return _decode_payload(view, HEADER.size)
@@ -0,0 +1,219 @@
+"""
+Постійне сховище стану бота (SQLite у режимі WAL)
+
+Зберігає те, що раніше жило в атрибутах функцій і губилося при
+перезапуску: останні відомі графіки груп (для порівняння змін),
+відправлені попередження, позначки щоденних повідомлень по чатах
+налаштування часу цих повідомлень та "живі" повідомлення з графіком.
+Запис буферизується і скидається однією транзакцією раз на цикл.
+"""
+
+import asyncio
+import logging
+import sqlite3
+import threading
+from datetime import datetime
+
+from schedule_model import DaySchedule
+
+logger = logging.getLogger(__name__)
+
+STATE_DB_FILE = 'bot_state.db'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS schedules (
+    region TEXT NOT NULL,
+    queue TEXT NOT NULL,
+    date TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    starts BLOB NOT NULL,
+    statuses BLOB NOT NULL,
+    PRIMARY KEY (region, queue, date)
+);
+CREATE TABLE IF NOT EXISTS warnings (
+    region TEXT NOT NULL,
+    queue TEXT NOT NULL,
+    outage_at TEXT NOT NULL,
+    PRIMARY KEY (region, queue, outage_at)
+);
+CREATE TABLE IF NOT EXISTS digests (
+    chat_id TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (chat_id, kind)
+);
+CREATE TABLE IF NOT EXISTS live_messages (
+    chat_id TEXT NOT NULL,
+    region TEXT NOT NULL,
+    queue TEXT NOT NULL,
+    date TEXT NOT NULL,
+    message_id INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    PRIMARY KEY (chat_id, region, queue, date)
+);
+CREATE TABLE IF NOT EXISTS chat_settings (
+    chat_id TEXT PRIMARY KEY,
+    morning TEXT,
+    evening TEXT,
+    timezone TEXT
+);
+'''
+
+
+class StateStore:
+    """Сховище стану з буферизованим записом
+
+    Методи mark_*/save_* лише додають операції в буфер; flush() записує
+    їх однією транзакцією. Читання виконується один раз при старті.
+    """
+
+    def __init__(self, path=STATE_DB_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = []  # (sql, params)
+
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(SCHEMA)
+
+    # ---------- Читання ----------
+
+    def load_schedules(self):
+        """Повертає {(регіон, група): {дата: DaySchedule}}"""
+        result = {}
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT region, queue, date, starts, statuses FROM schedules'
+            ).fetchall()
+        for region, queue, date, starts, statuses in rows:
+            result.setdefault((region, queue), {})[date] = DaySchedule.from_bytes(date, starts, statuses)
+        return result
+
+    def load_warnings(self):
+        """Повертає множину (регіон, група, datetime початку відключення)"""
+        with self._lock:
+            rows = self.conn.execute('SELECT region, queue, outage_at FROM warnings').fetchall()
+        return {
+            (region, queue, datetime.fromisoformat(outage_at))
+            for region, queue, outage_at in rows
+        }
+
+    def load_digests(self):
+        """Повертає {(chat_id, вид): дата останньої відправки}"""
+        with self._lock:
+            rows = self.conn.execute('SELECT chat_id, kind, date FROM digests').fetchall()
+        return {(chat_id, kind): date for chat_id, kind, date in rows}
+
+    def load_chat_settings(self):
+        """Повертає {chat_id: (ранок 'HH:MM', вечір 'HH:MM', часовий пояс)}; None - за замовчуванням"""
+        with self._lock:
+            rows = self.conn.execute('SELECT chat_id, morning, evening, timezone FROM chat_settings').fetchall()
+        return {chat_id: (morning, evening, timezone) for chat_id, morning, evening, timezone in rows}
+
+    def load_live_messages(self):
+        """Повертає {(chat_id, регіон, група, дата): (message_id, хеш графіку)}"""
+        with self._lock:
+            rows = self.conn.execute(
+                'SELECT chat_id, region, queue, date, message_id, digest FROM live_messages'
+            ).fetchall()
+        return {
+            (chat_id, region, queue, date): (message_id, digest)
+            for chat_id, region, queue, date, message_id, digest in rows
+        }
+
+    # ---------- Буферизований запис ----------
+
+    def save_schedules(self, region, queue, days):
+        """Замінює збережені графіки групи на {дата: DaySchedule}"""
+        self._pending.append((
+            'DELETE FROM schedules WHERE region = ? AND queue = ?',
+            [(region, queue)]
+        ))
+        self._pending.append((
+            'INSERT INTO schedules (region, queue, date, digest, starts, statuses) VALUES (?, ?, ?, ?, ?, ?)',
+            [
+                (region, queue, date, day.digest, day.starts.tobytes(), day.statuses.tobytes())
+                for date, day in days.items()
+            ]
+        ))
+
+    def mark_warning(self, region, queue, outage_at):
+        self._pending.append((
+            'INSERT OR IGNORE INTO warnings (region, queue, outage_at) VALUES (?, ?, ?)',
+            [(region, queue, outage_at.isoformat())]
+        ))
+
+    def mark_digest(self, chat_ids, kind, date):
+        """Позначає, що повідомлення виду kind за дату date відправлено в чати"""
+        self._pending.append((
+            'INSERT OR REPLACE INTO digests (chat_id, kind, date) VALUES (?, ?, ?)',
+            [(str(chat_id), kind, date) for chat_id in chat_ids]
+        ))
+
+    def save_chat_settings(self, chat_id, morning, evening, timezone):
+        self._pending.append((
+            'INSERT OR REPLACE INTO chat_settings (chat_id, morning, evening, timezone) VALUES (?, ?, ?, ?)',
+            [(str(chat_id), morning, evening, timezone)]
+        ))
+
+    def save_live_message(self, chat_id, region, queue, date, message_id, digest):
+        self._pending.append((
+            'INSERT OR REPLACE INTO live_messages (chat_id, region, queue, date, message_id, digest) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            [(str(chat_id), region, queue, date, message_id, digest)]
+        ))
+
+    def delete_live_message(self, chat_id, region, queue, date):
+        self._pending.append((
+            'DELETE FROM live_messages WHERE chat_id = ? AND region = ? AND queue = ? AND date = ?',
+            [(str(chat_id), region, queue, date)]
+        ))
+
+    def prune(self, before):
+        """Видаляє записи про відключення та графіки, старші за before (datetime)"""
+        self._pending.append((
+            'DELETE FROM warnings WHERE outage_at < ?',
+            [(before.isoformat(),)]
+        ))
+        self._pending.append((
+            'DELETE FROM schedules WHERE date < ?',
+            [(before.strftime('%Y-%m-%d'),)]
+        ))
+
+    def _take_pending(self):
+        pending, self._pending = self._pending, []
+        return pending
+
+    def _write(self, pending):
+        if not pending:
+            return 0
+
+        with self._lock:
+            try:
+                self.conn.execute('BEGIN')
+                for sql, params in pending:
+                    self.conn.executemany(sql, params)
+                self.conn.execute('COMMIT')
+            except sqlite3.Error as e:
+                self.conn.execute('ROLLBACK')
+                logger.error(f'❌ Помилка запису стану: {e}')
+                return 0
+        return len(pending)
+
+    def flush(self):
+        """Записує всі буферизовані операції однією транзакцією"""
+        return self._write(self._take_pending())
+
+    async def flush_async(self):
+        """Як flush(), але запис виконується в пулі потоків, щоб не блокувати event loop"""
+        pending = self._take_pending()
+        if not pending:
+            return 0
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._write, pending)
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self.conn.close()
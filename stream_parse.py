@@ -0,0 +1,195 @@
+"""
+Вибірковий розбір відповіді API svitlo.live
+
+Відповідь містить графіки всіх регіонів і груп, а боту потрібні лише
+підписані. Замість json.loads усього документа текст проходиться
+сканером: непотрібні регіони та групи пропускаються за дужками
+(рядки пропускає регулярний вираз, у Python обробляються лише дужки),
+і Python об'єкти будуються тільки для потрібних графіків. Результат
+має той самий формат, що й відповідь API, тільки з відфільтрованими даними.
+"""
+
+import json
+import re
+
+from endpoints import SchemaError
+
+# Все, що не є дужкою: пробіли, числа, розділювачі та цілі рядки
+# (розгорнутий цикл замість альтернативи - в рази швидший у модулі re)
+_FILLER = re.compile(r'[^"{}\[\]]*(?:"[^"\\]*(?:\\.[^"\\]*)*"[^"{}\[\]]*)*')
+_WS = re.compile(r'[ \t\n\r]*')
+_decoder = json.JSONDecoder()
+
+
+def _skip_ws(text, pos):
+    return _WS.match(text, pos).end()
+
+
+def _skip_container(text, pos):
+    """Повертає позицію після об'єкта/масиву, що починається з pos"""
+    depth = 0
+    while True:
+        pos = _FILLER.match(text, pos).end()
+        char = text[pos]
+        if char == '{' or char == '[':
+            depth += 1
+        elif char == '}' or char == ']':
+            depth -= 1
+        else:
+            raise ValueError(f'незакритий рядок на позиції {pos}')
+        pos += 1
+        if depth == 0:
+            return pos
+
+
+def _value_end(text, pos):
+    if text[pos] in '{[':
+        return _skip_container(text, pos)
+    return _decoder.raw_decode(text, pos)[1]
+
+
+def _walk_object(text, pos, on_member):
+    """Проходить об'єкт з позиції pos; on_member(ключ, початок значення) -> кінець значення"""
+    if text[pos] != '{':
+        raise SchemaError(f'очікувався об\'єкт на позиції {pos}')
+    pos = _skip_ws(text, pos + 1)
+    if text[pos] == '}':
+        return pos + 1
+
+    while True:
+        key, pos = _decoder.raw_decode(text, pos)
+        pos = _skip_ws(text, pos)
+        if text[pos] != ':':
+            raise ValueError(f'очікувалась ":" на позиції {pos}')
+        pos = _skip_ws(text, on_member(key, _skip_ws(text, pos + 1)))
+        if text[pos] == ',':
+            pos = _skip_ws(text, pos + 1)
+        elif text[pos] == '}':
+            return pos + 1
+        else:
+            raise ValueError(f'очікувалась "," або "}}" на позиції {pos}')
+
+
+def _walk_array(text, pos, on_element):
+    """Проходить масив з позиції pos; on_element(початок елемента) -> кінець елемента"""
+    if text[pos] != '[':
+        raise SchemaError(f'очікувався масив на позиції {pos}')
+    pos = _skip_ws(text, pos + 1)
+    if text[pos] == ']':
+        return pos + 1
+
+    while True:
+        pos = _skip_ws(text, on_element(pos))
+        if text[pos] == ',':
+            pos = _skip_ws(text, pos + 1)
+        elif text[pos] == ']':
+            return pos + 1
+        else:
+            raise ValueError(f'очікувалась "," або "]" на позиції {pos}')
+
+
+def _parse_schedule(text, pos, queues):
+    """Розбирає schedule регіону, будуючи об'єкти лише для груп queues (None - всі)"""
+    schedule = {}
+
+    def on_member(queue, start):
+        if queues is None or queue in queues:
+            schedule[queue], end = _decoder.raw_decode(text, start)
+            return end
+        return _value_end(text, start)
+
+    return schedule, _walk_object(text, pos, on_member)
+
+
+def _parse_regions(text, pos, wanted, regions):
+    """Розбирає масив regions; повертає (кінець масиву, кількість регіонів у відповіді)"""
+    count = 0
+
+    def on_element(start):
+        nonlocal count
+        count += 1
+        region = {}
+        schedule_pos = []
+
+        def on_member(key, value_start):
+            if key == 'schedule':
+                cpu = region.get('cpu')
+                if cpu is not None and cpu in wanted:
+                    region['schedule'], end = _parse_schedule(text, value_start, wanted[cpu])
+                    return end
+                # cpu ще невідомий або регіон не потрібен - пропускаємо
+                schedule_pos.append(value_start)
+                return _value_end(text, value_start)
+            if text[value_start] in '{[':
+                return _skip_container(text, value_start)
+            region[key], end = _decoder.raw_decode(text, value_start)
+            return end
+
+        end = _walk_object(text, start, on_member)
+
+        cpu = region.get('cpu')
+        if not isinstance(cpu, str):
+            raise SchemaError('регіон без cpu')
+        if 'schedule' not in region and not schedule_pos:
+            raise SchemaError(f'регіон {cpu} без schedule')
+        if cpu in wanted:
+            if 'schedule' not in region:
+                if text[schedule_pos[0]] != '{':
+                    raise SchemaError(f'регіон {cpu} без schedule')
+                region['schedule'], _ = _parse_schedule(text, schedule_pos[0], wanted[cpu])
+            regions.append(region)
+        elif schedule_pos and text[schedule_pos[0]] != '{':
+            raise SchemaError(f'регіон {cpu} без schedule')
+        return end
+
+    return _walk_array(text, pos, on_element), count
+
+
+def parse_filtered(text, wanted):
+    """Розбирає відповідь API, залишаючи тільки потрібні регіони та групи
+
+    Args:
+        text: текст відповіді API
+        wanted: {регіон: набір груп або None (всі групи регіону)}
+
+    Returns:
+        {'regions': [...], ...} у форматі відповіді API
+
+    Raises:
+        ValueError: некоректний або обрізаний JSON (SchemaError - не той формат)
+    """
+    result = {}
+
+    def on_member(key, start):
+        if key == 'regions':
+            regions = []
+            end, count = _parse_regions(text, start, wanted, regions)
+            if not count:
+                raise SchemaError('немає списку regions')
+            result['regions'] = regions
+            return end
+        if text[start] in '{[':
+            return _skip_container(text, start)
+        result[key], end = _decoder.raw_decode(text, start)
+        return end
+
+    try:
+        end = _walk_object(text, _skip_ws(text, 0), on_member)
+    except IndexError:
+        raise ValueError('обрізаний JSON')
+
+    if _skip_ws(text, end) != len(text):
+        raise ValueError(f'зайві дані після JSON на позиції {end}')
+    if 'regions' not in result:
+        raise SchemaError('немає списку regions')
+    return result
+
+
+def wanted_from_keys(keys, regions=()):
+    """{регіон: набір груп} з пар (регіон, група); регіони regions - повністю (None)"""
+    wanted = {}
+    for region, queue in keys:
+        wanted.setdefault(region, set()).add(queue)
+    for region in regions:
+        wanted[region] = None
+    return wanted
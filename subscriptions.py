@@ -0,0 +1,127 @@
+"""
+Реєстр підписок: (регіон, група) -> множина чатів
+
+Дозволяє одному процесу бота обслуговувати багато чатів і груп:
+графік завантажується один раз, а повідомлення отримують тільки
+підписники групи, в якій щось змінилось.
+"""
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTIONS_FILE = 'subscriptions.json'
+
+
+class SubscriptionRegistry:
+    """Двосторонній індекс підписок чатів на групи відключень
+
+    Обидва напрямки (група -> чати, чат -> групи) зберігаються окремими
+    словниками множин, тому пошук підписників групи та підписок чату
+    не залежить від загальної кількості чатів.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self._by_queue = {}  # (region, queue) -> set(chat_id)
+        self._by_chat = {}   # chat_id -> set((region, queue))
+        self.version = 0     # Збільшується при кожній зміні підписок
+
+    def __len__(self):
+        return len(self._by_chat)
+
+    def subscribe(self, chat_id, region, queue):
+        """Підписує чат на групу. Повертає False, якщо підписка вже існувала"""
+        chat_id = str(chat_id)
+        key = (region, queue)
+
+        chats = self._by_queue.setdefault(key, set())
+        if chat_id in chats:
+            return False
+
+        chats.add(chat_id)
+        self._by_chat.setdefault(chat_id, set()).add(key)
+        self.version += 1
+        return True
+
+    def unsubscribe(self, chat_id, region=None, queue=None):
+        """Відписує чат від групи (або від усіх груп, якщо група не вказана)"""
+        chat_id = str(chat_id)
+        keys = self._by_chat.get(chat_id, set())
+
+        if region is not None and queue is not None:
+            targets = {(region, queue)} & keys
+        else:
+            targets = set(keys)
+
+        for key in targets:
+            chats = self._by_queue.get(key)
+            if chats is not None:
+                chats.discard(chat_id)
+                if not chats:
+                    del self._by_queue[key]
+            keys.discard(key)
+
+        if not keys:
+            self._by_chat.pop(chat_id, None)
+
+        if targets:
+            self.version += 1
+        return bool(targets)
+
+    def chats_for(self, region, queue):
+        """Повертає копію множини чатів, підписаних на групу"""
+        return frozenset(self._by_queue.get((region, queue), ()))
+
+    def queues_for(self, chat_id):
+        """Повертає копію множини (регіон, група), на які підписаний чат"""
+        return frozenset(self._by_chat.get(str(chat_id), ()))
+
+    def keys(self):
+        """Повертає всі (регіон, група), які мають хоча б одного підписника"""
+        return list(self._by_queue)
+
+    def regions(self):
+        """Повертає множину регіонів з підписниками"""
+        return {region for region, _ in self._by_queue}
+
+    def chats(self):
+        """Повертає всі чати з підписками"""
+        return list(self._by_chat)
+
+    def load(self):
+        """Завантажує підписки з JSON файлу (якщо він існує)"""
+        if not self.path or not os.path.exists(self.path):
+            return
+
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.error(f'❌ Не вдалося прочитати підписки з {self.path}: {e}')
+            return
+
+        for chat_id, keys in data.get('chats', {}).items():
+            for region, queue in keys:
+                self.subscribe(chat_id, region, queue)
+
+        logger.info(f'📋 Завантажено підписки: {len(self._by_chat)} чатів, {len(self._by_queue)} груп')
+
+    def save(self):
+        """Атомарно зберігає підписки у JSON файл"""
+        if not self.path:
+            return
+
+        data = {
+            'chats': {
+                chat_id: sorted([region, queue] for region, queue in keys)
+                for chat_id, keys in self._by_chat.items()
+            }
+        }
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
@@ -1,11 +1,16 @@
 import asyncio
 import logging
-from datetime import datetime, time as dt_time, timedelta
+import time
+import secrets
+import sqlite3
+from datetime import timedelta
+
+# Час запуску процесу - для логу тривалості теплого старту
+STARTED_AT = time.monotonic()
+
 from telegram import Bot
-from telegram.error import TelegramError
 import sys
 import os
-import json
 from dotenv import load_dotenv
 
 # Завантажуємо змінні з .env файлу
@@ -14,7 +19,24 @@ load_dotenv()
 # Додаємо поточну директорію до шляху
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-from fetch_api import fetch_schedule_from_api
+import clock
+from fetch_api import close_async_client, get_endpoint_pool
+from schedule_cache import ScheduleCache
+from subscriptions import SubscriptionRegistry, SUBSCRIPTIONS_FILE
+from delivery import DeliveryQueue
+from warning_scheduler import WarningScheduler
+from schedule_diff import diff_schedules, is_material
+from state_store import StateStore, STATE_DB_FILE
+from snapshot_store import SnapshotStore, SNAPSHOT_FILE
+from poll_scheduler import PollScheduler
+from digest_scheduler import DigestScheduler
+from render_cache import RenderCache, stamp_updated
+from metrics import (
+    serve_metrics, monitor_event_loop_lag, SCHEDULE_CHANGES, WINDOW_CHANGES, SCHEDULE_AGE,
+    DELIVERY_PENDING, LOOP_ITERATION_SECONDS, LOOP_OVERSLEEP_SECONDS
+)
+from schedule_model import as_schedule, format_minutes, get_region_name, DaySchedule
+from profiling import Profiler, span
 
 # Налаштування логування
 logging.basicConfig(
@@ -28,311 +50,393 @@ logger = logging.getLogger(__name__)
 # ============================================
 # Читаємо приватні дані з .env файлу
 BOT_TOKEN = os.getenv('BOT_TOKEN')
-CHAT_ID = os.getenv('CHAT_ID')
+CHAT_ID = os.getenv('CHAT_ID')  # Один або кілька ID через кому
+# Адреса Bot API (для тестів - локальний mock_server.py)
+TELEGRAM_BASE_URL = os.getenv('TELEGRAM_BASE_URL', 'https://api.telegram.org/bot')
 
 # Публічні налаштування
 REGION = 'kyiv'
 QUEUE = '2.2'
-UPDATE_INTERVAL_MINUTES = 15
+UPDATE_INTERVAL_MINUTES = 15  # Базовий інтервал; фактичний адаптується до змін графіку
 MORNING_NOTIFICATION_HOUR = 8  # Ранкове повідомлення (графік на сьогодні)
 EVENING_NOTIFICATION_HOUR = 20  # Вечірнє повідомлення (графік на завтра)
+DIGEST_TIMEZONE = 'Europe/Kyiv'  # Часовий пояс щоденних повідомлень за замовчуванням (чат може змінити: /digest)
+DIGEST_MAX_AGE_SECONDS = 600  # Знімок, свіжіший за це, не перезавантажується для щоденного повідомлення
 WARNING_MINUTES_BEFORE = 15  
+SNAPSHOT_TTL_SECONDS = 60  # Скільки секунд знімок графіку вважається свіжим
+DELIVERY_WORKERS = 8  # Кількість паралельних воркерів відправки
+COMMANDS_ENABLED = True  # Відповідати на /today, /tomorrow, /next, /group та inline-запити
+LIVE_MESSAGES = False  # Одне закріплене повідомлення на групу і дату, що редагується при змінах графіку
+# Webhook замість long polling: публічна HTTPS адреса (порожньо - long polling)
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET') or secrets.token_urlsafe(32)
+WEBHOOK_HOST = os.getenv('WEBHOOK_HOST', '0.0.0.0')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT') or 8443)
+LONG_POLL_TIMEOUT = int(os.getenv('LONG_POLL_TIMEOUT') or 30)  # Секунд очікування в getUpdates
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = int(os.getenv('METRICS_PORT') or 0)  # Порт /metrics (0 - вимкнено)
+
+# Позначки статусів графіку (0 - дані недоступні, 1 - світло є, 2 - можливе відключення)
+STATUS_EMOJI = {
+    0: '❓',
+    1: '💡',
+    2: '⚠️'
+}
+
+STATUS_TEXT = {
+    0: 'Дані недоступні',
+    1: 'Світло Є',
+    2: 'Можливе відключення'
+}
 
-def format_schedule_for_telegram(data, queue, target_date=None, is_tomorrow=False):
+# Готові частини рядків повідомлення (не збираються заново для кожного слоту)
+STATUS_LINE_PREFIX = {status: f'{emoji} ' for status, emoji in STATUS_EMOJI.items()}
+UNKNOWN_LINE_PREFIX = '❔ '
+MESSAGE_SEPARATOR = f'{"─" * 30}\n\n'
+
+
+def format_schedule_for_telegram(data, queue, target_date=None, is_tomorrow=False, region='kyiv'):
     """Форматує графік для Telegram повідомлення
     
     Args:
-        data: дані з API
+        data: модель Schedule (або сирі дані з API)
         queue: номер групи
         target_date: конкретна дата для відображення (YYYY-MM-DD), якщо None - всі дати
         is_tomorrow: чи це графік на завтра
+        region: регіон
+    
+    Текст залежить лише від графіку (його кешує RenderCache), тому час
+    оновлення додається окремо при відправці (stamp_updated).
     """
     
-    if not isinstance(data, dict) or 'regions' not in data:
+    schedule = as_schedule(data)
+    if schedule is None:
         return '⚠️ Помилка: дані не в очікуваному форматі'
     
-    kyiv_data = None
-    for region in data['regions']:
-        if region.get('cpu') == 'kyiv':
-            kyiv_data = region
-            break
-    
-    if not kyiv_data or not kyiv_data.get('schedule'):
-        return '⚠️ Дані для Києва не знайдено'
-    
-    schedule = kyiv_data['schedule']
+    if not schedule.region(region):
+        return f'⚠️ Дані для регіону {get_region_name(region)} не знайдено'
     
-    if queue not in schedule:
+    group_schedule = schedule.queue(region, queue)
+    if group_schedule is None:
         return f'⚠️ Група {queue} не знайдена'
     
-    group_schedule = schedule[queue]
-    
     # Якщо вказана конкретна дата - фільтруємо
     if target_date:
         if target_date not in group_schedule:
             return f'⚠️ Графік на {target_date} не знайдено'
         group_schedule = {target_date: group_schedule[target_date]}
     
-    # Формуємо повідомлення
-    if is_tomorrow:
-        message = f'🌙 *ГРАФІК НА ЗАВТРА*\n'
-    else:
-        message = f'⚡ *ГРАФІК ВІДКЛЮЧЕНЬ*\n'
-    
-    message += f'📍 Київ, Група {queue}\n'
-    message += f'🕐 Оновлено: {datetime.now().strftime("%d.%m.%Y %H:%M")}\n'
-    message += f'{"─" * 30}\n\n'
+    # Формуємо повідомлення частинами і з'єднуємо один раз
+    parts = [
+        '🌙 *ГРАФІК НА ЗАВТРА*\n' if is_tomorrow else '⚡ *ГРАФІК ВІДКЛЮЧЕНЬ*\n',
+        f'📍 {get_region_name(region)}, Група {queue}\n',
+        MESSAGE_SEPARATOR
+    ]
     
-    for date, times in group_schedule.items():
-        message += f'📅 *{date}*\n'
-        
-        # Групуємо інтервали
-        current_status = None
-        start_time = None
+    for date, day in group_schedule.items():
+        parts.append(f'📅 *{date}*\n')
         
-        sorted_times = sorted(times.items())
+        # Інтервали вже згруповані в моделі
+        for start, end, status in day.intervals():
+            parts.append(f'{STATUS_LINE_PREFIX.get(status, UNKNOWN_LINE_PREFIX)}'
+                         f'`{format_minutes(start)} - {format_minutes(end)}` '
+                         f'{STATUS_TEXT.get(status, "Невідомо")}\n')
         
-        for time, status in sorted_times:
-            status_emoji = {
-                0: '❓',
-                1: '💡',
-                2: '⚠️'
-            }.get(status, '❔')
-            
-            status_text = {
-                0: 'Дані недоступні',
-                1: 'Світло Є',
-                2: 'Можливе відключення'
-            }.get(status, 'Невідомо')
-            
-            if status != current_status:
-                if current_status is not None and start_time is not None:
-                    message += f'{prev_emoji} `{start_time} - {time}` {prev_text}\n'
-                start_time = time
-                current_status = status
-                prev_emoji = status_emoji
-                prev_text = status_text
-        
-        # Додаємо останній інтервал
-        if start_time:
-            message += f'{prev_emoji} `{start_time} - 24:00` {prev_text}\n'
-        
-        message += '\n'
+        parts.append('\n')
     
-    return message
+    return ''.join(parts)
+
+
+def render_schedule_variant(schedule, region, queue, date, variant):
+    """Рендер для RenderCache: графік групи на одну дату (variant 'full' - на всі дати)"""
+    if variant == 'full':
+        return format_schedule_for_telegram(schedule, queue, region=region)
+    return format_schedule_for_telegram(
+        schedule, queue, target_date=date, is_tomorrow=variant == 'tomorrow', region=region
+    )
 
 
-def get_today_schedule_data(data, queue):
-    """Витягує тільки сьогоднішній графік для порівняння"""
-    today = datetime.now().strftime('%Y-%m-%d')
+def digest_variants(now=None):
+    """Варіанти повідомлень, що рендеряться наперед для кожної підписаної групи"""
+    now = now or clock.now()
+    return (
+        (None, 'full'),
+        (now.strftime('%Y-%m-%d'), 'today'),
+        ((now + timedelta(days=1)).strftime('%Y-%m-%d'), 'tomorrow'),
+    )
+
+
+def get_today_schedule_data(data, queue, region='kyiv'):
+    """Витягує тільки сьогоднішній графік (DaySchedule) для порівняння"""
+    today = clock.now().strftime('%Y-%m-%d')
     
-    if not isinstance(data, dict) or 'regions' not in data:
+    schedule = as_schedule(data)
+    if schedule is None:
         return None
     
-    for region in data['regions']:
-        if region.get('cpu') == 'kyiv':
-            schedule = region.get('schedule', {})
-            if queue in schedule:
-                return schedule[queue].get(today, {})
+    group_schedule = schedule.queue(region, queue)
+    if group_schedule is None:
+        return None
     
-    return None
+    return group_schedule.get(today) or DaySchedule.from_times(today, {})
 
 
-def get_upcoming_outages(data, queue, minutes_ahead):
-    """Знаходить майбутні відключення протягом наступних N хвилин"""
-    today = datetime.now().strftime('%Y-%m-%d')
-    current_time = datetime.now()
-    future_time = current_time + timedelta(minutes=minutes_ahead)
+def get_upcoming_outages(data, queue, minutes_ahead, region='kyiv'):
+    """Знаходить початки відключень протягом наступних N хвилин"""
+    current_time = clock.now()
+    today = current_time.strftime('%Y-%m-%d')
     
-    if not isinstance(data, dict) or 'regions' not in data:
+    schedule = as_schedule(data)
+    if schedule is None:
         return []
     
-    for region in data['regions']:
-        if region.get('cpu') == 'kyiv':
-            schedule = region.get('schedule', {})
-            if queue in schedule:
-                today_schedule = schedule[queue].get(today, {})
-                
-                outages = []
-                for time_str, status in today_schedule.items():
-                    # Статус 2 = можливе відключення
-                    if status == 2:
-                        try:
-                            # Парсимо час (формат "HH:MM")
-                            hour, minute = map(int, time_str.split(':'))
-                            schedule_time = current_time.replace(hour=hour, minute=minute, second=0, microsecond=0)
-                            
-                            # Перевіряємо чи відключення в потрібному діапазоні
-                            if current_time < schedule_time <= future_time:
-                                minutes_until = int((schedule_time - current_time).total_seconds() / 60)
-                                outages.append({
-                                    'time': time_str,
-                                    'minutes_until': minutes_until,
-                                    'datetime': schedule_time
-                                })
-                        except:
-                            pass
-                
-                return outages
+    day = schedule.day(region, queue, today)
+    if not day:
+        return []
+    
+    midnight = current_time.replace(hour=0, minute=0, second=0, microsecond=0)
+    now_minute = int((current_time - midnight).total_seconds() // 60)
     
-    return []
+    outages = []
+    # Статус 2 = можливе відключення; пошук у відсортованому масиві початків
+    for start in day.outages_between(now_minute, now_minute + minutes_ahead):
+        schedule_time = midnight + timedelta(minutes=start)
+        if schedule_time <= current_time:
+            continue
+        outages.append({
+            'time': format_minutes(start),
+            'minutes_until': int((schedule_time - current_time).total_seconds() / 60),
+            'datetime': schedule_time
+        })
+    
+    return outages
+
 
+def format_window(window):
+    """Форматує вікно відключення (початок, кінець) у хвилинах"""
+    return f'`{format_minutes(window[0])} - {format_minutes(window[1])}`'
 
-async def check_and_send_warnings(bot, chat_id, region, queue, warning_minutes):
-    """Перевіряє та відправляє попередження про майбутні відключення"""
+
+def format_schedule_diff(region, queue, diffs):
+    """Форматує коротке повідомлення тільки про змінені вікна відключень"""
     
-    try:
-        # Отримуємо дані з API
-        data = fetch_schedule_from_api(region, queue)
-        
-        if not data:
-            return
-        
-        # Шукаємо відключення в найближчі warning_minutes хвилин
-        upcoming = get_upcoming_outages(data, queue, warning_minutes)
-        
-        if not upcoming:
-            return
-        
-        # Перевіряємо, чи вже відправляли попередження для цього відключення
-        if not hasattr(check_and_send_warnings, 'warned_times'):
-            check_and_send_warnings.warned_times = set()
-        
-        for outage in upcoming:
-            time_key = outage['time']
-            
-            # Якщо ще не попереджали про це відключення
-            if time_key not in check_and_send_warnings.warned_times:
-                minutes = outage['minutes_until']
-                
-                message = (
-                    f"⚠️ *ПОПЕРЕДЖЕННЯ ПРО ВІДКЛЮЧЕННЯ*\n\n"
-                    f"🕐 Через *{minutes} хвилин* ({outage['time']}) очікується можливе відключення світла!\n\n"
-                    f"📍 Київ, Група {queue}"
-                )
-                
-                await bot.send_message(
-                    chat_id=chat_id,
-                    text=message,
-                    parse_mode='Markdown'
-                )
-                
-                logger.info(f'⚠️ Відправлено попередження про відключення о {outage["time"]} (через {minutes} хв)')
-                
-                # Позначаємо, що про це відключення вже попередили
-                check_and_send_warnings.warned_times.add(time_key)
-        
-        # Очищаємо старі попередження (час вже пройшов)
-        current_time_str = datetime.now().strftime('%H:%M')
-        check_and_send_warnings.warned_times = {
-            t for t in check_and_send_warnings.warned_times 
-            if t >= current_time_str
-        }
-        
-    except Exception as e:
-        logger.error(f'❌ Помилка перевірки попереджень: {e}')
+    lines = [
+        '🔄 *ГРАФІК ЗМІНИВСЯ*',
+        f'📍 {get_region_name(region)}, Група {queue}',
+        ''
+    ]
+    
+    for diff in diffs:
+        if not (diff.added or diff.removed or diff.shifted):
+            continue
+        
+        lines.append(f'📅 *{diff.date}*')
+        for window in diff.added:
+            lines.append(f'➕ {format_window(window)} нове відключення')
+        for window in diff.removed:
+            lines.append(f'➖ {format_window(window)} відключення скасовано')
+        for old_windows, new_windows in diff.shifted:
+            old_text = ', '.join(format_window(w) for w in old_windows)
+            new_text = ', '.join(format_window(w) for w in new_windows)
+            lines.append(f'↔️ {old_text} → {new_text}')
+        lines.append('')
+    
+    return '\n'.join(lines)
 
 
-async def send_tomorrow_schedule(bot, chat_id, region, queue):
-    """Відправляє графік на завтра (увечері)"""
+def send_to_chats(delivery, chat_ids, text, parse_mode='Markdown'):
+    """Ставить одне повідомлення в чергу відправки для кількох чатів
     
-    try:
-        logger.info('🌙 Відправка графіку на завтра...')
-        
-        # Отримуємо дані з API
-        data = fetch_schedule_from_api(region, queue)
-        
-        if not data:
-            logger.warning('❌ Не вдалося отримати графік')
-            return False
-        
-        # Визначаємо дату завтрашнього дня
-        tomorrow = (datetime.now() + timedelta(days=1)).strftime('%Y-%m-%d')
-        
-        # Перевіряємо чи є графік на завтра
-        if not isinstance(data, dict) or 'regions' not in data:
-            return False
-        
-        for region_data in data['regions']:
-            if region_data.get('cpu') == 'kyiv':
-                schedule = region_data.get('schedule', {})
-                if queue in schedule and tomorrow in schedule[queue]:
-                    # Є графік на завтра - відправляємо
-                    message = format_schedule_for_telegram(data, queue, target_date=tomorrow, is_tomorrow=True)
-                    
-                    await bot.send_message(
-                        chat_id=chat_id,
-                        text=message,
-                        parse_mode='Markdown'
-                    )
-                    
-                    logger.info('✅ Графік на завтра відправлено')
-                    return True
-        
-        logger.info('ℹ️ Графік на завтра ще не доступний')
-        return False
-        
-    except TelegramError as e:
-        logger.error(f'❌ Помилка Telegram: {e}')
-        return False
-    except Exception as e:
-        logger.error(f'❌ Помилка відправки графіку на завтра: {e}')
-        return False
+    Returns:
+        Кількість повідомлень, поставлених у чергу
+    """
+    count = 0
+    for chat_id in chat_ids:
+        delivery.send_message(chat_id, text, parse_mode=parse_mode)
+        count += 1
+    return count
+
+
+async def send_outage_warning(delivery, registry, region, queue, outage_at, store=None):
+    """Відправляє попередження про відключення підписникам групи
+    
+    Викликається планувальником WarningScheduler у точний час попередження.
+    """
+    minutes = max(1, round((outage_at - clock.now()).total_seconds() / 60))
+    time_str = outage_at.strftime('%H:%M')
+    
+    message = (
+        f"⚠️ *ПОПЕРЕДЖЕННЯ ПРО ВІДКЛЮЧЕННЯ*\n\n"
+        f"🕐 Через *{minutes} хвилин* ({time_str}) очікується можливе відключення світла!\n\n"
+        f"📍 {get_region_name(region)}, Група {queue}"
+    )
+    
+    sent = send_to_chats(delivery, registry.chats_for(region, queue), message)
+    
+    logger.info(f'⚠️ Відправлено попередження про відключення о {time_str} '
+                f'(через {minutes} хв, група {queue}, у черзі: {sent})')
+    
+    if store is not None:
+        store.mark_warning(region, queue, outage_at)
+
+
+async def send_digest(delivery, cache, registry, renders, kind, chat_id, date, keys=None):
+    """Щоденне повідомлення чату: ранок - графік на сьогодні, вечір - на завтра
+    
+    Знімок графіку завантажується з API, лише якщо він застарів
+    (старший за DIGEST_MAX_AGE_SECONDS); текст береться з кешу рендерів.
+    Повертається після доставки повідомлення; якщо його не вдалося
+    доставити, виняток Telegram передається далі.
+    
+    Args:
+        kind: 'morning' або 'evening'
+        date: дата графіку (YYYY-MM-DD)
+        keys: (регіон, група) для відправки; None - всі групи чату
+    
+    Returns:
+        Множина груп, графіку яких на дату ще немає
+    """
+    keys = sorted(registry.queues_for(chat_id) if keys is None else keys)
+    data = await cache.get(max_age=DIGEST_MAX_AGE_SECONDS)
+    if not data:
+        logger.warning('❌ Не вдалося отримати графік')
+        return set(keys)
+    
+    variant = 'tomorrow' if kind == 'evening' else 'today'
+    messages = []
+    missing = set()
+    for region, queue in keys:
+        if data.day(region, queue, date) is None:
+            missing.add((region, queue))
+            continue
+        messages.append(renders.get(data, region, queue, date, variant))
+    
+    if messages:
+        await delivery.send_message(chat_id, stamp_updated('\n'.join(messages), cache.updated_at))
+        logger.info(f'{"🌙" if kind == "evening" else "🌅"} Графік на {date} відправлено (чат {chat_id}, груп: {len(messages)})')
+    elif missing:
+        logger.info(f'ℹ️ Графік на {date} ще не доступний (чат {chat_id})')
+    return missing
 
 
-async def send_schedule_update(bot, chat_id, region, queue, force=False):
-    """Відправляє оновлення графіку у Telegram (тільки якщо змінився)"""
+async def send_schedule_update(delivery, cache, registry, last_schedules, store=None, renders=None, live=None):
+    """Відправляє оновлення графіку у Telegram (тільки підписникам груп, де він змінився)
+    
+    Графік завантажується один раз, а зміни визначаються окремо для кожної
+    групи з реєстру підписок. Перший графік групи відправляється повністю,
+    перша публікація графіку на завтра - графіком на завтра, подальші зміни
+    на сьогодні/завтра - коротким повідомленням тільки про змінені вікна
+    відключень. Якщо передано store, останні графіки зберігаються в ньому
+    і переживають перезапуск. Повні графіки беруться з renders
+    (RenderCache), якщо його передано.
+    
+    last_schedules - {(регіон, група): {дата: DaySchedule}} з останніми
+    відправленими графіками; належить циклу, що викликає функцію, і
+    оновлюється на місці.
+    
+    Якщо передано live (LiveMessages), повний графік показує закріплене
+    повідомлення, яке редагується окремо - тут надсилаються лише короткі
+    повідомлення про суттєві зміни.
+    
+    Returns:
+        Кількість груп, для яких було відправлено повідомлення, або None при помилці
+    """
     
     try:
-        logger.info(f'Перевірка графіку для {region}, група {queue}...')
+        logger.info(f'Перевірка графіку для {len(registry.keys())} груп...')
         
-        # Отримуємо дані з API
-        data = fetch_schedule_from_api(region, queue)
+        # Отримуємо знімок графіку (спільний для всього циклу)
+        with span('fetch'):
+            data = await cache.get()
         
         if not data:
             logger.warning('❌ Не вдалося отримати графік')
             return None
         
-        # Отримуємо тільки сьогоднішній графік
-        today_schedule = get_today_schedule_data(data, queue)
+        today = clock.now().strftime('%Y-%m-%d')
+        tomorrow = (clock.now() + timedelta(days=1)).strftime('%Y-%m-%d')
         
-        if today_schedule is None:
-            logger.warning('⚠️ Графік на сьогодні не знайдено')
-            return None
-        
-        # Перетворюємо в JSON для порівняння
-        schedule_hash = json.dumps(today_schedule, sort_keys=True)
-        
-        # Якщо не примусова відправка - перевіряємо зміни
-        if not force:
-            if hasattr(send_schedule_update, 'last_schedule'):
-                if send_schedule_update.last_schedule == schedule_hash:
-                    logger.info('✓ Графік не змінився, відправка не потрібна')
-                    return schedule_hash
-                else:
-                    logger.info('🔄 ГРАФІК ЗМІНИВСЯ! Відправляю оновлення...')
+        updated = 0
+        for region, queue in registry.keys():
+            key = (region, queue)
+            days = data.queue(region, queue)
+            
+            if days is None:
+                logger.warning(f'⚠️ Графік на сьогодні не знайдено (група {queue})')
+                continue
+            
+            current = {date: days[date] for date in (today, tomorrow) if date in days}
+            last_days = last_schedules.get(key)
+            
+            if last_days is None or today not in last_days:
+                SCHEDULE_CHANGES.inc(kind='full')
+                last_schedules[key] = current
+                if store is not None:
+                    store.save_schedules(region, queue, current)
+                if live is not None:
+                    continue
+                logger.info(f'📊 Перша перевірка групи {queue}, відправляю графік...')
+                with span('render'):
+                    if renders is not None:
+                        message = renders.get(data, region, queue, None, 'full')
+                    else:
+                        message = format_schedule_for_telegram(data, queue, region=region)
+                    message = stamp_updated(message, cache.updated_at)
             else:
-                logger.info('📊 Перша перевірка, відправляю графік...')
-        else:
-            logger.info('📅 Ранкове повідомлення о 8:00')
-        
-        # Форматуємо повідомлення
-        message = format_schedule_for_telegram(data, queue)
-        
-        # Відправляємо повідомлення
-        await bot.send_message(
-            chat_id=chat_id,
-            text=message,
-            parse_mode='Markdown'
-        )
+                # Швидка перевірка за хешем, далі - структурне порівняння вікон
+                with span('diff'):
+                    diffs = diff_schedules(last_days, current, (today, tomorrow))
+                # Першу публікацію дати diff_schedules не порівнює, але запам'ятати
+                # її треба, інакше наступні зміни графіку на завтра не буде з чим порівняти
+                if not diffs and current.keys() == last_days.keys():
+                    continue
+                
+                for diff in diffs:
+                    WINDOW_CHANGES.inc(len(diff.added), change='added')
+                    WINDOW_CHANGES.inc(len(diff.removed), change='removed')
+                    WINDOW_CHANGES.inc(len(diff.shifted), change='shifted')
+                
+                last_schedules[key] = current
+                if store is not None:
+                    store.save_schedules(region, queue, current)
+                
+                parts = []
+                if is_material(diffs):
+                    SCHEDULE_CHANGES.inc(kind='material')
+                    logger.info(f'🔄 ГРАФІК ЗМІНИВСЯ (група {queue})! Відправляю зміни...')
+                    with span('render'):
+                        parts.append(format_schedule_diff(region, queue, diffs))
+                elif diffs:
+                    SCHEDULE_CHANGES.inc(kind='minor')
+                    logger.info(f'ℹ️ Графік групи {queue} уточнено без змін у відключеннях')
+                
+                # Живе повідомлення покаже нову дату саме
+                if tomorrow in current and tomorrow not in last_days and live is None:
+                    SCHEDULE_CHANGES.inc(kind='published')
+                    logger.info(f'📅 Опубліковано графік на завтра (група {queue}), відправляю...')
+                    with span('render'):
+                        if renders is not None:
+                            published = renders.get(data, region, queue, tomorrow, 'tomorrow')
+                        else:
+                            published = render_schedule_variant(data, region, queue, tomorrow, 'tomorrow')
+                        parts.append(stamp_updated(published, cache.updated_at))
+                
+                if not parts:
+                    continue
+                message = '\n'.join(parts)
+            
+            # Відправляємо тільки підписникам цієї групи
+            with span('send'):
+                sent = send_to_chats(delivery, registry.chats_for(region, queue), message)
+            
+            logger.info(f'✅ Графік групи {queue} відправлено (у черзі: {sent})')
+            updated += 1
         
-        logger.info('✅ Повідомлення відправлено успішно')
+        if not updated:
+            logger.info('✓ Графік не змінився, відправка не потрібна')
         
-        return schedule_hash
+        return updated
         
-    except TelegramError as e:
-        logger.error(f'❌ Помилка Telegram: {e}')
-        return None
     except Exception as e:
         logger.error(f'❌ Загальна помилка: {e}')
         return None
@@ -351,15 +455,217 @@ async def get_chat_id_from_updates(bot):
     return None
 
 
+async def start_updates(bot, commands):
+    """Запускає отримання оновлень: webhook, якщо налаштовано, інакше long polling
+
+    Returns:
+        WebhookReceiver або None (long polling)
+    """
+    if WEBHOOK_URL:
+        # Webhook-сервер потрібен лише в цьому режимі
+        from webhook import WebhookReceiver
+        receiver = WebhookReceiver(bot, commands.handle_update, WEBHOOK_URL, WEBHOOK_SECRET,
+                                   WEBHOOK_HOST, WEBHOOK_PORT)
+        try:
+            await receiver.start()
+            return receiver
+        except Exception as e:
+            logger.error(f'❌ Не вдалося запустити webhook: {e}. Переходжу на long polling')
+    
+    commands.start()
+    logger.info(f'📥 Оновлення: long polling (тайм-аут {LONG_POLL_TIMEOUT} с)')
+    return None
+
+
+def send_welcome(delivery, registry, store, sent, interval_minutes, morning_hour, evening_hour, warning_minutes):
+    """Стартове повідомлення чатам реєстру, яким його ще не надсилали
+    
+    sent - {(чат, вид): дата} з store.load_digests(); доповнюється на місці,
+    тож повторний виклик (наприклад, після перечитування підписок) не
+    надсилає повідомлення вдруге.
+    
+    Returns:
+        Кількість чатів, яким відправлено повідомлення
+    """
+    today = clock.now().strftime('%Y-%m-%d')
+    new_chats = [c for c in registry.chats() if (c, 'welcome') not in sent]
+    for subscriber in new_chats:
+        queues = ', '.join(
+            f'{get_region_name(r)}, Група {q}' for r, q in sorted(registry.queues_for(subscriber))
+        )
+        send_to_chats(
+            delivery,
+            [subscriber],
+            f'🤖 *Бот запущено!*\n\n'
+            f'🌅 Щодня о {morning_hour}:00 - графік на сьогодні\n'
+            f'🌙 Щодня о {evening_hour}:00 - графік на завтра\n'
+            f'🔄 Перевіряю зміни кожні ~{interval_minutes} хв (частіше, коли публікують графік)\n'
+            f'📬 Повідомлення тільки при оновленні графіку\n'
+            f'⚠️ Попередження за {warning_minutes} хв до відключення\n\n'
+            f'📍 {queues}'
+        )
+        sent[(subscriber, 'welcome')] = today
+    store.mark_digest(new_chats, 'welcome', today)
+    return len(new_chats)
+
+
+def restore_snapshot(cache, snapshots):
+    """Підставляє в кеш знімок, збережений до перезапуску
+
+    Returns:
+        Schedule або None, якщо знімку немає (тоді чекаємо на API)
+    """
+    warm = snapshots.load()
+    if warm is None:
+        return None
+    cache.restore(warm.schedule, warm.etag, warm.last_modified, warm.wanted, warm.saved_at)
+    logger.info(
+        f'♨️ Теплий старт: знімок графіку від {warm.saved_at:%d.%m %H:%M} '
+        f'({sum(len(queues) for queues in warm.schedule.regions.values())} груп) '
+        f'за {(time.monotonic() - STARTED_AT) * 1000:.0f} мс від запуску'
+    )
+    return warm.schedule
+
+
+def log_bot_connected(task):
+    """Callback фонового get_me(): помилку отримає той, хто чекає на задачу"""
+    if not task.cancelled() and task.exception() is None:
+        logger.info(f'✅ Бот підключено: @{task.result().username}')
+
+
+async def save_snapshot(snapshots, cache, schedule):
+    """Записує новий знімок на диск (у потоці, щоб не блокувати event loop)"""
+    loop = asyncio.get_running_loop()
+    try:
+        await loop.run_in_executor(
+            None, snapshots.save, schedule, cache.etag, cache.last_modified, cache.wanted
+        )
+    except OSError as e:
+        logger.warning(f'⚠️ Не вдалося зберегти знімок графіку: {e}')
+
+
+class MonitorLoop:
+    """Тіло основного циклу: одна перевірка графіку і все, що від неї залежить
+
+    Спільне для monitor_and_send і replay.py (там - у віртуальному часі,
+    з ReplayFeed замість ScheduleCache). Необов'язкові частини (store,
+    live, archive, snapshots) можна не передавати.
+    """
+
+    def __init__(self, cache, registry, delivery, renders, warnings, digests, poller, last_schedules,
+                 region=None, store=None, live=None, archive=None, snapshots=None, warm_schedule=None):
+        self.cache = cache
+        self.registry = registry
+        self.delivery = delivery
+        self.renders = renders
+        self.warnings = warnings
+        self.digests = digests
+        self.poller = poller
+        self.last_schedules = last_schedules
+        self.region = region
+        self.store = store
+        self.live = live
+        self.archive = archive
+        self.snapshots = snapshots
+        self.archived = warm_schedule  # Вже в архіві і на диску
+        self.prerendered = None
+        self.last_date = clock.now().date()
+
+    async def iteration(self):
+        """Одна перевірка графіку
+
+        Returns:
+            (затримка до наступної перевірки в секундах, причина)
+        """
+        cache, registry = self.cache, self.registry
+        # Розбираємо з відповіді API тільки графіки підписаних груп
+        # (основний регіон - повністю, для команд про будь-яку групу)
+        cache.set_keys(registry.keys(), regions=(self.region,) if COMMANDS_ENABLED and self.region else ())
+        current_time = clock.now()
+        current_date = current_time.date()
+        self.digests.sync(registry.chats())
+        
+        # Новий знімок - одразу рендеримо щоденні повідомлення підписаних груп,
+        # щоб відправка за розкладом і команди були лише пошуком у кеші
+        with span('fetch'):
+            snapshot = await cache.get()
+        if snapshot is not None and snapshot is not self.prerendered:
+            with span('render'):
+                rendered = await self.renders.prerender(snapshot, registry.keys(), digest_variants(current_time))
+            self.prerendered = snapshot
+            if rendered:
+                logger.info(f'🖨️ Підготовлено повідомлень: {rendered} (у кеші: {len(self.renders)})')
+            # Вечірні повідомлення, що чекали на графік на завтра
+            await self.digests.on_snapshot(snapshot)
+        
+        # Перевіряємо, чи настав новий день
+        if self.last_date != current_date:
+            self.last_date = current_date
+            if self.store is not None:
+                self.store.prune(current_time - timedelta(days=2))
+            if self.live is not None:
+                self.live.expire(current_date.isoformat())
+        
+        # Живі повідомлення редагуються тільки там, де показаний графік застарів
+        if self.live is not None and snapshot is not None:
+            with span('live'):
+                dates = [date for date, variant in digest_variants(current_time) if date]
+                self.live.refresh(snapshot, registry, dates, cache.updated_at)
+        
+        # Перевірка на зміни (щоденні повідомлення відправляє digest_scheduler)
+        await send_schedule_update(self.delivery, cache, registry, self.last_schedules,
+                                   store=self.store, renders=self.renders, live=self.live)
+        
+        # Планування попереджень за точним часом початку відключень
+        schedule = await cache.get()
+        self.poller.observe(schedule, registry.keys(), ok=cache.healthy)
+        if schedule is not None:
+            with span('warnings'):
+                self.warnings.reschedule(schedule, registry.keys())
+        
+        # Архівуємо і зберігаємо для теплого старту тільки нові знімки
+        # (304 повертає той самий об'єкт)
+        if schedule is not None and schedule is not self.archived:
+            loop = asyncio.get_running_loop()
+            if self.archive is not None:
+                # Архів лише для статистики - його помилка не зупиняє моніторинг
+                try:
+                    with span('archive'):
+                        recorded = await loop.run_in_executor(None, self.archive.record, schedule)
+                except sqlite3.Error as e:
+                    logger.warning(f'⚠️ Не вдалося записати графік в архів: {e}')
+                    recorded = 0
+                if recorded:
+                    logger.info(f'🗄️ В архів записано нових версій графіку: {recorded}')
+            if self.snapshots is not None:
+                with span('snapshot'):
+                    await save_snapshot(self.snapshots, cache, schedule)
+            self.archived = schedule
+        
+        # Один запис стану на цикл
+        if self.store is not None:
+            with span('flush'):
+                await self.store.flush_async()
+        
+        self.delivery.log_stats()
+        if self.live is not None:
+            self.live.log_stats()
+        return self.poller.next_delay()
+
+
 async def monitor_and_send(bot_token, chat_id, region, queue, interval_minutes, morning_hour, evening_hour, warning_minutes):
-    """Головна функція моніторингу з відправкою у Telegram"""
+    """Головна функція моніторингу з відправкою у Telegram
+    
+    chat_id - один ID або кілька через кому; вони підписуються на групу
+    region/queue. Додаткові підписки читаються з файлу SUBSCRIPTIONS_FILE.
+    """
     
     logger.info('=' * 60)
     logger.info('🤖 TELEGRAM БОТ - МОНІТОРИНГ ГРАФІКУ ВІДКЛЮЧЕНЬ')
     logger.info('=' * 60)
     logger.info(f'📍 Регіон: {region}')
     logger.info(f'🔢 Група: {queue}')
-    logger.info(f'⏱️  Інтервал перевірки: {interval_minutes} хвилин')
+    logger.info(f'⏱️  Інтервал перевірки: ~{interval_minutes} хвилин (адаптивний)')
     logger.info(f'🌅 Ранкове повідомлення: {morning_hour}:00 (графік на сьогодні)')
     logger.info(f'🌙 Вечірнє повідомлення: {evening_hour}:00 (графік на завтра)')
     logger.info(f'⚠️  Попередження: за {warning_minutes} хв до відключення')
@@ -367,17 +673,100 @@ async def monitor_and_send(bot_token, chat_id, region, queue, interval_minutes,
     logger.info('⛔ Для зупинки натисніть Ctrl+C')
     logger.info('=' * 60)
     
-    bot = Bot(token=bot_token)
-    morning_sent_today = False
-    evening_sent_today = False
+    bot = Bot(token=bot_token, base_url=TELEGRAM_BASE_URL)
+    cache = ScheduleCache(region, queue, ttl=SNAPSHOT_TTL_SECONDS)
+    delivery = DeliveryQueue(bot, workers=DELIVERY_WORKERS)
+    warnings = WarningScheduler(
+        lambda r, q, outage_at: send_outage_warning(delivery, registry, r, q, outage_at, store),
+        warning_minutes
+    )
+    registry = SubscriptionRegistry(SUBSCRIPTIONS_FILE)
+    registry.load()
+    
+    # Відновлюємо стан після перезапуску: останні графіки, попередження, щоденні повідомлення
+    store = StateStore(STATE_DB_FILE)
+    archive = None
+    snapshots = SnapshotStore(SNAPSHOT_FILE)
+    # Знімок з диска: попередження, команди і щоденні повідомлення працюють
+    # ще до першого запиту до API
+    warm_schedule = restore_snapshot(cache, snapshots)
+    # Щоденні повідомлення планує DigestScheduler - опитування API для них не потрібне
+    poller = PollScheduler(interval_minutes * 60)
+    last_schedules = store.load_schedules()
+    warnings.restore_fired(store.load_warnings())
+    sent_digests = store.load_digests()
+    
+    SCHEDULE_AGE.set_function(lambda: clock.monotonic() - cache.fetched_at if cache.fetched_at else None)
+    DELIVERY_PENDING.set_function(delivery.pending_count)
+    metrics_server = None
+    lag_task = None
+    renders = RenderCache(render_schedule_variant)
+    live = None
+    if LIVE_MESSAGES:
+        from live_messages import LiveMessages
+        live = LiveMessages(delivery, renders, store)
+        live.restore(store.load_live_messages())
+    digest_scheduler = DigestScheduler(
+        lambda kind, c, date, keys: send_digest(delivery, cache, registry, renders, kind, c, date, keys),
+        morning=(morning_hour, 0),
+        evening=(evening_hour, 0),
+        timezone_name=DIGEST_TIMEZONE,
+        store=store
+    )
+    digest_scheduler.restore(sent_digests, store.load_chat_settings())
+    commands = None
+    if COMMANDS_ENABLED:
+        from commands import BotCommands
+        commands = BotCommands(bot, cache, registry, delivery, renders, region, queue,
+                               long_poll_timeout=LONG_POLL_TIMEOUT, digests=digest_scheduler)
+    receiver = None
+    me_task = None
+    profiler = Profiler()
     
     try:
-        # Перевіряємо з'єднання
-        bot_info = await bot.get_me()
-        logger.info(f'✅ Бот підключено: @{bot_info.username}')
-        
-        # Якщо Chat ID не вказано, намагаємось отримати автоматично
-        if chat_id is None:
+        profiler.start()
+        if METRICS_PORT:
+            metrics_server = await serve_metrics(METRICS_HOST, METRICS_PORT, debug=profiler.handle_request)
+            lag_task = asyncio.ensure_future(monitor_event_loop_lag())
+
+        # Перевіряємо з'єднання у фоні - старт не чекає на мережу
+        me_task = asyncio.ensure_future(bot.get_me())
+        me_task.add_done_callback(log_bot_connected)
+        
+        if chat_id:
+            for single_chat_id in str(chat_id).split(','):
+                if single_chat_id.strip():
+                    registry.subscribe(single_chat_id.strip(), region, queue)
+        
+        if warm_schedule is not None:
+            warnings.reschedule(warm_schedule, registry.keys())
+        delivery.start()
+        warnings.start()
+        if warm_schedule is not None:
+            digest_scheduler.sync(registry.chats())
+            digest_scheduler.start()
+            logger.info(f'♨️ Попередження і щоденні повідомлення готові за '
+                        f'{(time.monotonic() - STARTED_AT) * 1000:.0f} мс від запуску')
+        
+        # Архів потрібен лише адаптивному опитуванню і для запису нових версій -
+        # відкриваємо його вже після теплого старту
+        from schedule_archive import ScheduleArchive, ARCHIVE_DB_FILE
+        archive = ScheduleArchive(ARCHIVE_DB_FILE)
+        poller.seed_hours(archive.changes_by_hour())
+        
+        if COMMANDS_ENABLED:
+            receiver = await start_updates(bot, commands)
+        
+        # Якщо жодного чату немає, намагаємось отримати Chat ID автоматично
+        if not len(registry) and COMMANDS_ENABLED:
+            bot_info = await me_task
+            logger.info('\n📱 Chat ID не вказано.')
+            logger.info(f'💬 Знайдіть бота @{bot_info.username} і надішліть йому /start')
+            logger.info('⏳ Очікую підписку...')
+            await commands.subscribed.wait()
+            logger.info(f'💬 Підписано чатів: {len(registry)}\n')
+        elif not len(registry):
+            bot_info = await me_task
             logger.info('\n📱 Chat ID не вказано.')
             logger.info('💬 Відправте будь-яке повідомлення вашому боту в Telegram!')
             logger.info(f'   Знайдіть бота: @{bot_info.username}')
@@ -385,83 +774,73 @@ async def monitor_and_send(bot_token, chat_id, region, queue, interval_minutes,
             logger.info('⏳ Очікую повідомлення...')
             
             # Чекаємо повідомлення
+            chat_id = None
             while chat_id is None:
                 chat_id = await get_chat_id_from_updates(bot)
                 if chat_id is None:
                     await asyncio.sleep(2)
             
+            registry.subscribe(chat_id, region, queue)
             logger.info(f'💬 Використовую Chat ID: {chat_id}\n')
         else:
-            logger.info(f'💬 Chat ID: {chat_id}')
+            logger.info(f'💬 Підписано чатів: {len(registry)}, груп: {len(registry.keys())}')
         
-        # Відправляємо стартове повідомлення
-        await bot.send_message(
-            chat_id=chat_id,
-            text=f'🤖 *Бот запущено!*\n\n'
-                 f'🌅 Щодня о {morning_hour}:00 - графік на сьогодні\n'
-                 f'🌙 Щодня о {evening_hour}:00 - графік на завтра\n'
-                 f'🔄 Кожні {interval_minutes} хвилин перевіряю зміни\n'
-                 f'📬 Повідомлення тільки при оновленні графіку\n'
-                 f'⚠️ Попередження за {warning_minutes} хв до відключення\n\n'
-                 f'📍 Київ, Група {queue}',
-            parse_mode='Markdown'
-        )
+        registry.save()
+        # Невірний токен - критична помилка, як і раніше
+        await me_task
+        
+        # Відправляємо стартове повідомлення тільки новим чатам
+        send_welcome(delivery, registry, store, sent_digests,
+                     interval_minutes, morning_hour, evening_hour, warning_minutes)
+        
+        digest_scheduler.sync(registry.chats())
+        digest_scheduler.start()
         
         # Основний цикл
+        monitor = MonitorLoop(cache, registry, delivery, renders, warnings, digest_scheduler, poller, last_schedules,
+                              region=region, store=store, live=live, archive=archive, snapshots=snapshots,
+                              warm_schedule=warm_schedule)
         while True:
-            logger.info('\n' + '─' * 60)
-            current_time = datetime.now()
-            current_date = current_time.date()
-            
-            # Перевіряємо, чи настав новий день
-            if hasattr(monitor_and_send, 'last_date'):
-                if monitor_and_send.last_date != current_date:
-                    morning_sent_today = False
-                    evening_sent_today = False
-                    monitor_and_send.last_date = current_date
-            else:
-                monitor_and_send.last_date = current_date
-            
-            # Перевіряємо, чи час для ранкового повідомлення (графік на сьогодні)
-            is_morning_time = current_time.hour == morning_hour and current_time.minute < interval_minutes
-            
-            # Перевіряємо, чи час для вечірнього повідомлення (графік на завтра)
-            is_evening_time = current_time.hour == evening_hour and current_time.minute < interval_minutes
-            
-            if is_morning_time and not morning_sent_today:
-                logger.info(f'🌅 Ранок! Відправляю графік на сьогодні о {morning_hour}:00')
-                schedule_hash = await send_schedule_update(bot, chat_id, region, queue, force=True)
-                if schedule_hash:
-                    send_schedule_update.last_schedule = schedule_hash
-                    morning_sent_today = True
-            elif is_evening_time and not evening_sent_today:
-                logger.info(f'🌙 Вечір! Відправляю графік на завтра о {evening_hour}:00')
-                await send_tomorrow_schedule(bot, chat_id, region, queue)
-                evening_sent_today = True
-            else:
-                # Звичайна перевірка на зміни
-                schedule_hash = await send_schedule_update(bot, chat_id, region, queue, force=False)
-                if schedule_hash:
-                    send_schedule_update.last_schedule = schedule_hash
-            
-            # Перевірка попереджень про майбутні відключення
-            await check_and_send_warnings(bot, chat_id, region, queue, warning_minutes)
-            
-            logger.info(f'⏳ Наступна перевірка через {interval_minutes} хвилин...')
-            logger.info('─' * 60)
-            
-            # Чекаємо інтервал
-            await asyncio.sleep(interval_minutes * 60)
+            with profiler.iteration():
+                iteration_started = time.monotonic()
+                logger.info('\n' + '─' * 60)
+                delay, reason = await monitor.iteration()
+                get_endpoint_pool().log_stats()
+                logger.info(f'⏳ Наступна перевірка через {delay / 60:.1f} хв ({reason})...')
+                logger.info('─' * 60)
+                
+                LOOP_ITERATION_SECONDS.observe(time.monotonic() - iteration_started)
+                
+            # Чекаємо до наступного опитування
+            sleep_started = time.monotonic()
+            await asyncio.sleep(delay)
+            LOOP_OVERSLEEP_SECONDS.observe(max(0.0, time.monotonic() - sleep_started - delay))
             
     except KeyboardInterrupt:
         logger.info('\n⛔ Зупинка бота...')
-        await bot.send_message(
-            chat_id=chat_id,
-            text='⛔ Бот зупинено'
-        )
+        send_to_chats(delivery, registry.chats(), '⛔ Бот зупинено', parse_mode=None)
     except Exception as e:
         logger.error(f'❌ Критична помилка: {e}')
         raise
+    finally:
+        if me_task is not None:
+            me_task.cancel()
+        if commands is not None:
+            await commands.stop()
+        if receiver is not None:
+            await receiver.stop()
+        if lag_task is not None:
+            lag_task.cancel()
+        if metrics_server is not None:
+            metrics_server.close()
+        profiler.stop()
+        await warnings.stop()
+        await digest_scheduler.stop()
+        await delivery.stop()
+        await close_async_client()
+        store.close()
+        if archive is not None:
+            archive.close()
 
 
 def main():
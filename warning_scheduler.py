@@ -0,0 +1,183 @@
+"""
+Планувальник попереджень про відключення
+
+Замість перевірки "чи є відключення в найближчі N хвилин" раз на цикл
+опитування, для кожного майбутнього початку відключення з останнього
+знімку реєструється точний час попередження. Задача спить до
+найближчого часу в купі і прокидається раніше, якщо графік змінився.
+"""
+
+import asyncio
+import heapq
+import logging
+from datetime import datetime, timedelta
+
+import clock
+from schedule_model import STATUS_OUTAGE
+from metrics import WARNING_LATENESS
+
+logger = logging.getLogger(__name__)
+
+# Найдовший сон між перевірками: захищає від зсуву системного годинника
+MAX_SLEEP_SECONDS = 30
+
+
+def iter_outage_starts(schedule, region, queue, since):
+    """Повертає datetime початків відключень групи, пізніших за since
+
+    Відключення, що продовжується з попереднього дня (00:00 після
+    відключення до 24:00), не вважається новим.
+    """
+    days = schedule.queue(region, queue)
+    if not days:
+        return
+
+    since_date = since.strftime('%Y-%m-%d')
+    for date, day in days.items():
+        if date < since_date or not day:
+            continue
+        try:
+            midnight = datetime.strptime(date, '%Y-%m-%d')
+        except ValueError:
+            continue
+
+        previous = days.get((midnight - timedelta(days=1)).strftime('%Y-%m-%d'))
+
+        for start in day.outage_starts:
+            if start == 0 and previous is not None and previous.statuses \
+                    and previous.statuses[-1] == STATUS_OUTAGE:
+                continue
+            outage_at = midnight + timedelta(minutes=start)
+            if outage_at > since:
+                yield outage_at
+
+
+class WarningScheduler:
+    """Купа (час попередження, ключ) з інкрементальним перепланування
+
+    Ключ попередження - (регіон, група, час початку відключення).
+    callback(region, queue, outage_at) викликається один раз для кожного
+    ключа за warning_minutes хвилин до відключення (або одразу, якщо
+    до відключення вже менше).
+    """
+
+    def __init__(self, callback, warning_minutes):
+        self.callback = callback
+        self.warning = timedelta(minutes=warning_minutes)
+
+        self._heap = []       # (fire_at, key)
+        self._entries = {}    # key -> fire_at (актуальні записи купи)
+        self._fired = {}      # key -> outage_at (вже відправлені)
+        self._wakeup = asyncio.Event()
+        self._task = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def restore_fired(self, keys):
+        """Відновлює множину вже відправлених попереджень (після перезапуску)"""
+        for key in keys:
+            self._fired[key] = key[2]
+            self._entries.pop(key, None)
+
+    def reschedule(self, schedule, keys):
+        """Синхронізує заплановані попередження з новим знімком графіку
+
+        Нові відключення додаються в купу, зниклі - видаляються, незмінені
+        залишаються як є. Повертає (додано, видалено).
+        """
+        now = clock.now()
+        desired = {}
+        for region, queue in keys:
+            for outage_at in iter_outage_starts(schedule, region, queue, now):
+                key = (region, queue, outage_at)
+                if key not in self._fired:
+                    desired[key] = outage_at - self.warning
+
+        removed = [key for key in self._entries if key not in desired]
+        for key in removed:
+            del self._entries[key]
+
+        added = 0
+        earliest = self._heap[0][0] if self._heap else None
+        for key, fire_at in desired.items():
+            if self._entries.get(key) == fire_at:
+                continue
+            self._entries[key] = fire_at
+            heapq.heappush(self._heap, (fire_at, key))
+            added += 1
+
+        # Застарілі записи купи видаляються ліниво; будимо задачу, якщо з'явився ранніший час
+        if added and (earliest is None or self._heap[0][0] < earliest):
+            self._wakeup.set()
+
+        # Забуваємо про відправлені попередження для минулих відключень
+        self._fired = {
+            key: outage_at for key, outage_at in self._fired.items()
+            if outage_at > now - timedelta(days=1)
+        }
+
+        if added or removed:
+            logger.info(f'⏰ Попередження: +{added} / -{len(removed)}, заплановано {len(self._entries)}')
+        return added, len(removed)
+
+    def next_fire_time(self):
+        """Найближчий запланований час попередження (або None)"""
+        self._drop_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def _drop_stale(self):
+        while self._heap:
+            fire_at, key = self._heap[0]
+            if self._entries.get(key) == fire_at:
+                return
+            heapq.heappop(self._heap)
+
+    async def _run(self):
+        while True:
+            self._drop_stale()
+
+            if not self._heap:
+                await self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+
+            fire_at, key = self._heap[0]
+            delay = (fire_at - clock.now()).total_seconds()
+
+            if delay <= 0:
+                heapq.heappop(self._heap)
+                del self._entries[key]
+                await self._fire(key)
+                continue
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=min(delay, MAX_SLEEP_SECONDS))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    async def _fire(self, key):
+        region, queue, outage_at = key
+        self._fired[key] = outage_at
+        lateness = (clock.now() - (outage_at - self.warning)).total_seconds()
+        WARNING_LATENESS.observe(max(0.0, lateness))
+
+        # Відключення вже почалося (наприклад, бот був зупинений) - не попереджаємо
+        if outage_at <= clock.now():
+            return
+
+        try:
+            await self.callback(region, queue, outage_at)
+        except Exception as e:
+            logger.error(f'❌ Помилка відправки попередження: {e}')
@@ -0,0 +1,139 @@
+"""
+Отримання оновлень Telegram через webhook
+
+Невеликий HTTP сервер (mini_http) приймає POST від Telegram, перевіряє
+секретний токен (X-Telegram-Bot-Api-Secret-Token) і кладе оновлення в
+обмежену чергу. Відповідь 200 повертається одразу; якщо черга переповнена -
+503, і Telegram повторить доставку пізніше. Воркери забирають оновлення
+пачками та передають їх обробнику (BotCommands.handle_update).
+
+Telegram вимагає HTTPS: сервер зазвичай працює за reverse proxy
+(nginx, Caddy, Cloudflare Tunnel), а WEBHOOK_URL - публічна адреса.
+"""
+
+import asyncio
+import hmac
+import logging
+from collections import deque
+from urllib.parse import urlsplit
+
+from telegram import Update
+
+from mini_http import serve, Response
+from metrics import TELEGRAM_UPDATES, UPDATE_QUEUE_DEPTH
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = 'x-telegram-bot-api-secret-token'
+QUEUE_SIZE = 1000  # Скільки оновлень може чекати обробки
+WORKERS = 1  # Один воркер зберігає порядок оновлень (команди обробляються без I/O)
+BATCH_SIZE = 50  # Скільки оновлень воркер забирає з черги за раз
+MAX_CONNECTIONS = 40  # Паралельних з'єднань від Telegram
+SEEN_UPDATES = 10000  # Скільки останніх update_id пам'ятати (повторні доставки)
+ALLOWED_UPDATES = ['message', 'inline_query']
+
+
+class WebhookReceiver:
+    """Приймає оновлення Telegram через webhook і передає їх handle_update"""
+
+    def __init__(self, bot, handle_update, url, secret, host='0.0.0.0', port=8443,
+                 queue_size=QUEUE_SIZE, workers=WORKERS, batch_size=BATCH_SIZE):
+        self.bot = bot
+        self.handle_update = handle_update
+        self.url = url
+        self.path = urlsplit(url).path or '/'
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.batch_size = batch_size
+
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self._seen = set()
+        self._seen_order = deque()
+        self._server = None
+        self._tasks = []
+
+        UPDATE_QUEUE_DEPTH.set_function(self.queue.qsize)
+
+    async def start(self):
+        """Запускає HTTP сервер і реєструє webhook у Telegram
+
+        Якщо реєстрація не вдалася, піднімає виняток (сервер зупиняється) -
+        тоді можна перейти на long polling.
+        """
+        self._server = await serve(self.on_request, self.host, self.port)
+        try:
+            await self.bot.set_webhook(
+                self.url,
+                secret_token=self.secret,
+                allowed_updates=ALLOWED_UPDATES,
+                max_connections=MAX_CONNECTIONS
+            )
+        except Exception:
+            self._server.close()
+            self._server = None
+            raise
+
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+        logger.info(f'🪝 Webhook: {self.url} (сервер {self.host}:{self.port}{self.path})')
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            self._server = None
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def on_request(self, request):
+        if request.method != 'POST' or request.path != self.path:
+            return Response(404, 'not found', 'text/plain')
+
+        token = request.headers.get(SECRET_HEADER, '')
+        if not hmac.compare_digest(token.encode(), self.secret.encode()):
+            TELEGRAM_UPDATES.inc(source='webhook', result='unauthorized')
+            return Response(401, 'unauthorized', 'text/plain')
+
+        try:
+            data = request.json()
+        except (ValueError, UnicodeDecodeError):
+            TELEGRAM_UPDATES.inc(source='webhook', result='invalid')
+            return Response(400, 'bad request', 'text/plain')
+
+        try:
+            self.queue.put_nowait(data)
+        except asyncio.QueueFull:
+            # Telegram повторить доставку - це природний backpressure
+            TELEGRAM_UPDATES.inc(source='webhook', result='queue_full')
+            return Response(503, 'busy', 'text/plain')
+
+        TELEGRAM_UPDATES.inc(source='webhook', result='accepted')
+        return Response(200, '', 'text/plain')
+
+    def _is_duplicate(self, update_id):
+        """Telegram може доставити оновлення повторно (наприклад, після тайм-ауту)"""
+        if update_id in self._seen:
+            return True
+        self._seen.add(update_id)
+        self._seen_order.append(update_id)
+        if len(self._seen_order) > SEEN_UPDATES:
+            self._seen.discard(self._seen_order.popleft())
+        return False
+
+    async def _worker(self):
+        while True:
+            batch = [await self.queue.get()]
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+
+            for data in batch:
+                try:
+                    update = Update.de_json(data, self.bot)
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.warning(f'⚠️ Некоректне оновлення: {e}')
+                    continue
+                if update is None or self._is_duplicate(update.update_id):
+                    continue
+                await self.handle_update(update)